@@ -0,0 +1,136 @@
+import os
+import sys
+import json
+import zlib
+from typing import Any, Dict, List, Optional, Tuple
+
+from dotspark_storage import store_path, safe_key
+from dotspark_records import Match
+from dotspark_circuit import guarded, CircuitOpenError
+
+# Full conversation texts are kept out of the searched vectors' metadata; only the
+# matches that make it into a prompt are ever read back. The durable copy is a
+# Pinecone record per memory in the user's texts namespace (never queried, only
+# fetched by id), clipped to the metadata size limit. The local files under
+# DOTSPARK_DATA_DIR are a cache of it: container disks do not survive redeploys.
+try:
+    import zstandard
+    _ZSTD_COMPRESSOR = zstandard.ZstdCompressor(level=3)
+    _ZSTD_DECOMPRESSOR = zstandard.ZstdDecompressor()
+except ImportError:  # zlib fallback keeps the store working without the optional package
+    zstandard = None
+
+_ZSTD, _ZLIB = b"z", b"d"   # one-byte codec tag at the start of each blob
+BLOB_FIELDS = ("user_input", "ai_response")
+TEXTS_NAMESPACE_SUFFIX = os.getenv("DOTSPARK_TEXTS_NAMESPACE_SUFFIX", "-texts")
+TEXT_METADATA_MAX_BYTES = int(os.getenv("DOTSPARK_TEXT_METADATA_MAX_BYTES", "38000"))  # Pinecone caps metadata at 40KB
+
+def _blob_path(user_id: str, vector_id: str) -> str:
+    return store_path(os.path.join("blobs", safe_key(user_id)), vector_id, ".bin")
+
+def encode(payload: Dict[str, Any]) -> bytes:
+    raw = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+    if zstandard is not None:
+        return _ZSTD + _ZSTD_COMPRESSOR.compress(raw)
+    return _ZLIB + zlib.compress(raw, 6)
+
+def decode(data: bytes) -> Optional[Dict[str, Any]]:
+    codec, body = data[:1], data[1:]
+    if codec == _ZSTD:
+        if zstandard is None:
+            print("Blob is zstd-compressed but zstandard is not installed", file=sys.stderr)
+            return None
+        return json.loads(_ZSTD_DECOMPRESSOR.decompress(body))
+    if codec == _ZLIB:
+        return json.loads(zlib.decompress(body))
+    return None
+
+def put_blob(user_id: str, vector_id: str, payload: Dict[str, Any]):
+    path = _blob_path(user_id, vector_id)
+    tmp_path = f"{path}.tmp"
+    try:
+        with open(tmp_path, "wb") as f:
+            f.write(encode(payload))
+        os.replace(tmp_path, path)
+    except Exception as e:
+        print(f"Blob write failed for {vector_id}: {e}", file=sys.stderr)
+
+def get_blob(user_id: str, vector_id: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(_blob_path(user_id, vector_id), "rb") as f:
+            return decode(f.read())
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        print(f"Blob read failed for {vector_id}: {e}", file=sys.stderr)
+        return None
+
+def split_payload(metadata: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """(slim metadata for the vector index, large text fields for the blob store)"""
+    slim = {k: v for k, v in metadata.items() if k not in BLOB_FIELDS}
+    blob = {k: metadata[k] for k in BLOB_FIELDS if k in metadata}
+    return slim, blob
+
+def texts_namespace(user_id: str) -> str:
+    return f"{user_id}{TEXTS_NAMESPACE_SUFFIX}"
+
+def clip_texts(texts: Dict[str, Any], max_bytes: int = TEXT_METADATA_MAX_BYTES) -> Dict[str, Any]:
+    """Text fields cut (at UTF-8 boundaries) to fit one metadata record; shorter
+    fields are kept whole and leave their unused share to the longer ones"""
+    fields = sorted((f for f in BLOB_FIELDS if isinstance(texts.get(f), str)), key=lambda f: len(texts[f]))
+    clipped: Dict[str, Any] = {}
+    remaining = max_bytes
+    for position, field in enumerate(fields):
+        raw = texts[field].encode("utf-8")
+        share = remaining // (len(fields) - position)
+        clipped[field] = raw[:share].decode("utf-8", "ignore")
+        remaining -= len(clipped[field].encode("utf-8"))
+        if len(raw) > share:
+            clipped["truncated"] = True
+    return clipped
+
+def text_record(vector_id: str, values: List[float], texts: Dict[str, Any]) -> Dict[str, Any]:
+    """The durable copy of a memory's texts, upserted to texts_namespace(user_id)"""
+    return {"id": vector_id, "values": values, "metadata": clip_texts(texts)}
+
+def fetch_texts(index, user_id: str, vector_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    """Texts of the given memories from the durable copy, written through to the local cache"""
+    if index is None or not vector_ids:
+        return {}
+    fetched = guarded("pinecone", lambda: index.fetch(ids=list(vector_ids), namespace=texts_namespace(user_id))).vectors
+    found = {}
+    for vector_id in vector_ids:
+        if vector_id in fetched:
+            texts = {k: v for k, v in (fetched[vector_id].metadata or {}).items() if k in BLOB_FIELDS}
+            put_blob(user_id, vector_id, texts)
+            found[vector_id] = texts
+    return found
+
+def hydrate(user_id: str, items: List[Match], index=None) -> List[Match]:
+    """Fill the full texts back into matches' content (in place): from the local
+    cache, else from the durable copy when an index is given. Memories written
+    before metadata was slimmed still carry them and are left untouched"""
+    texts: Dict[str, Dict[str, Any]] = {}
+    missing = []
+    for item in items:
+        content = item.content
+        if content.user_input is not None and content.ai_response is not None:
+            continue
+        blob = get_blob(user_id, item.id)
+        if blob:
+            texts[item.id] = blob
+        else:
+            missing.append(item.id)
+    if missing and index is not None:
+        try:
+            texts.update(fetch_texts(index, user_id, missing))
+        except CircuitOpenError as e:
+            print(f"Skipping text fetch: {e}", file=sys.stderr)
+        except Exception as e:
+            print(f"Text fetch failed: {e}", file=sys.stderr)
+    for item in items:
+        blob = texts.get(item.id)
+        if blob:
+            item.content.user_input = blob.get("user_input", item.content.user_input)
+            item.content.ai_response = blob.get("ai_response", item.content.ai_response)
+    return items
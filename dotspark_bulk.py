@@ -0,0 +1,160 @@
+import os
+
+# Bulk jobs draw provider capacity at the lowest priority unless told otherwise, and
+# queue for it as long as their turn budget allows instead of giving up after the
+# interactive 30s (read by dotspark_deadline and dotspark_rate_limit at import time)
+os.environ.setdefault("DOTSPARK_PRIORITY", "bulk")
+os.environ.setdefault("DOTSPARK_RATE_LIMIT_MAX_WAIT",
+                      str(float(os.getenv("DOTSPARK_BULK_DEADLINE_MS", "600000")) / 1000.0))
+# Concurrent items share one process here, so their embeddings can be batched
+# (read by dotspark_embeddings at import time)
+os.environ.setdefault("DOTSPARK_EMBED_BATCH_WINDOW_MS", "5")
+
+import sys
+import json
+import time
+import asyncio
+import argparse
+from typing import Any, Callable, Dict, Optional, Set, TextIO
+
+# Bulk organize configuration
+BULK_CONCURRENCY = int(os.getenv("DOTSPARK_BULK_CONCURRENCY", "8"))
+TEXT_FIELDS = ("thought", "text", "input", "user_input")
+
+def record_text(record: Dict[str, Any]) -> str:
+    for field in TEXT_FIELDS:
+        value = record.get(field)
+        if isinstance(value, str) and value.strip():
+            return value
+    return ""
+
+def load_completed(path: Optional[str]) -> Set[str]:
+    """Ids already finished successfully in a previous run's output (for --resume)"""
+    completed: Set[str] = set()
+    if not path or not os.path.exists(path):
+        return completed
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                result = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # Partial last line from an interrupted run
+            if result.get("status") == "ok":
+                completed.add(str(result.get("id")))
+    return completed
+
+def organize_record(record: Dict[str, Any], model: str) -> Dict[str, Any]:
+    from organize_thoughts_fixed import organize_thoughts, parse_organized_response
+
+    raw = organize_thoughts(record_text(record), str(record.get("user_id", "default")), record.get("model", model))
+    parsed = parse_organized_response(raw)
+    if "error" in parsed:
+        return {"status": "error", "error": parsed["error"], "raw_response": raw}
+    return {"status": "ok", "structured_output": parsed}
+
+def agent_record(record: Dict[str, Any], model: str) -> Dict[str, Any]:
+    from dotspark_intelligence_agent_v2 import run_dotspark_thought_partner
+
+    response = run_dotspark_thought_partner(str(record.get("user_id", "default")), record_text(record), "organize")
+    error = response.get("intelligence_layers", {}).get("error")
+    if error:
+        return {"status": "error", "error": error}
+    return {"status": "ok", "structured_response": response["structured_response"],
+            "intelligence_layers": response["intelligence_layers"]}
+
+MODE_HANDLERS: Dict[str, Callable[[Dict[str, Any], str], Dict[str, Any]]] = {
+    "organize": organize_record,   # organize_thoughts_fixed.organize_thoughts
+    "agent": agent_record,         # v2 thought partner, including memory write
+}
+
+async def run_bulk(source: TextIO, out: TextIO, mode: str = "organize", model: str = "gpt-4",
+                   concurrency: int = BULK_CONCURRENCY, skip_ids: Set[str] = frozenset()) -> Dict[str, int]:
+    """Stream JSONL records from `source`, process up to `concurrency` at once and
+    write one JSONL result per record to `out` in completion order"""
+    handler = MODE_HANDLERS[mode]
+    counts = {"ok": 0, "error": 0, "invalid": 0, "skipped": 0}
+    slots = asyncio.Semaphore(concurrency)
+    tasks: Set[asyncio.Task] = set()
+
+    def emit(result: Dict[str, Any]):
+        counts[result["status"]] += 1
+        out.write(json.dumps(result) + "\n")
+        out.flush()
+
+    async def process(item_id: str, record: Dict[str, Any]):
+        started = time.time()
+        try:
+            result = await asyncio.to_thread(handler, record, model)
+        except Exception as e:
+            result = {"status": "error", "error": str(e)}
+        finally:
+            slots.release()
+        emit({"id": item_id, **result, "elapsed": round(time.time() - started, 3)})
+
+    line_number = 0
+    while True:
+        # Only read ahead once a slot frees up, so memory stays bounded on huge inputs
+        await slots.acquire()
+        line = await asyncio.to_thread(source.readline)
+        if not line:
+            slots.release()
+            break
+        line_number += 1
+        if not line.strip():
+            slots.release()
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError as e:
+            slots.release()
+            emit({"id": str(line_number), "status": "invalid", "error": f"Invalid JSON: {e}"})
+            continue
+        item_id = str(record.get("id", line_number))
+        if item_id in skip_ids:
+            slots.release()
+            counts["skipped"] += 1
+            continue
+        if not record_text(record):
+            slots.release()
+            emit({"id": item_id, "status": "invalid", "error": f"Record has none of {', '.join(TEXT_FIELDS)}"})
+            continue
+        task = asyncio.create_task(process(item_id, record))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+
+    if tasks:
+        await asyncio.gather(*tasks)
+    return counts
+
+def main():
+    parser = argparse.ArgumentParser(description="Organize a backlog of thoughts from JSONL")
+    parser.add_argument("mode", choices=sorted(MODE_HANDLERS))
+    parser.add_argument("--input", help="JSONL file of {id, user_id, thought} records (default: stdin)")
+    parser.add_argument("--output", help="JSONL results file (default: stdout)")
+    parser.add_argument("--model", default="gpt-4", help="organize model_type: gpt-4 or deepseek")
+    parser.add_argument("--concurrency", type=int, default=BULK_CONCURRENCY)
+    parser.add_argument("--resume", action="store_true", help="skip ids already completed in --output and append to it")
+    args = parser.parse_args()
+
+    if args.resume and not args.output:
+        parser.error("--resume needs --output to find completed items")
+
+    # The agents print diagnostics to stdout; keep the results stream clean
+    results_stream = sys.stdout
+    sys.stdout = sys.stderr
+
+    skip_ids = load_completed(args.output) if args.resume else set()
+    source = open(args.input, "r", encoding="utf-8") if args.input else sys.stdin
+    out = open(args.output, "a" if args.resume else "w", encoding="utf-8") if args.output else results_stream
+    started = time.time()
+    try:
+        counts = asyncio.run(run_bulk(source, out, args.mode, args.model, max(1, args.concurrency), skip_ids))
+    finally:
+        if args.input:
+            source.close()
+        if args.output:
+            out.close()
+    print(json.dumps({"summary": counts, "elapsed": round(time.time() - started, 2)}), file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
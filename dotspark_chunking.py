@@ -0,0 +1,143 @@
+import os
+import re
+import json
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from dotspark_storage import read_stats, record_stats
+from dotspark_embeddings import embed, embed_many
+from dotspark_vectors import as_unit_matrix
+
+# Chunked embedding for long inputs (journal entries, voice transcripts). Texts past
+# CHUNK_MIN_CHARS are cut into sentence-aware sliding windows that are embedded in
+# parallel batches; the whole text is represented by the mean of its chunk vectors
+# and each chunk is stored as its own vector pointing back at the parent.
+CHUNK_MIN_CHARS = int(os.getenv("DOTSPARK_CHUNK_MIN_CHARS", "2000"))      # shorter texts are embedded whole
+CHUNK_MAX_CHARS = int(os.getenv("DOTSPARK_CHUNK_MAX_CHARS", "1000"))      # window size
+CHUNK_OVERLAP_SENTENCES = int(os.getenv("DOTSPARK_CHUNK_OVERLAP_SENTENCES", "1"))
+MAX_CHUNKS = int(os.getenv("DOTSPARK_MAX_CHUNKS", "32"))                  # windows widen past this
+CHUNK_QUERY_OVERFETCH = 2     # chunks of one parent compete for top_k slots until aggregated
+CHUNK_SUMMARY_CHARS = 300     # passage kept in chunk metadata; full texts live in the blob store
+CHUNK_FIELDS = ("parent_id", "chunk_index", "chunk_count")
+
+# Sentence ends, or line breaks (transcripts and notes are often unpunctuated)
+_SENTENCE_END = re.compile(r"(?<=[.!?…])\s+|\s*\n+\s*")
+
+def split_sentences(text: str) -> List[str]:
+    return [sentence.strip() for sentence in _SENTENCE_END.split(text or "") if sentence.strip()]
+
+def _split_words(sentence: str, max_chars: int) -> List[str]:
+    """A run-on 'sentence' longer than a window, cut at word boundaries"""
+    pieces, current = [], ""
+    for word in sentence.split():
+        if current and len(current) + 1 + len(word) > max_chars:
+            pieces.append(current)
+            current = ""
+        current = f"{current} {word}" if current else word
+    if current:
+        pieces.append(current)
+    return pieces
+
+def sliding_windows(text: str, max_chars: int = CHUNK_MAX_CHARS,
+                    overlap: int = CHUNK_OVERLAP_SENTENCES) -> List[str]:
+    """Pack whole sentences into windows of at most max_chars; each window starts with
+    the last `overlap` sentences of the previous one so no passage loses its lead-in"""
+    sentences = [piece for sentence in split_sentences(text) for piece in _split_words(sentence, max_chars)]
+    windows: List[str] = []
+    current: List[str] = []
+    size = 0
+    for sentence in sentences:
+        if current and size + 1 + len(sentence) > max_chars:
+            windows.append(" ".join(current))
+            carried = current[-overlap:] if overlap > 0 else []
+            # Never carry so much that the next sentence cannot fit
+            while carried and sum(len(s) + 1 for s in carried) + len(sentence) > max_chars:
+                carried = carried[1:]
+            current, size = list(carried), sum(len(s) + 1 for s in carried)
+        current.append(sentence)
+        size += len(sentence) + 1
+    if current:
+        windows.append(" ".join(current))
+    return windows
+
+def chunk_text(text: str) -> List[str]:
+    """Windows for a long text, or [text] when it is short enough to embed whole"""
+    text = (text or "").strip()
+    if len(text) < CHUNK_MIN_CHARS:
+        return [text]
+    max_chars = max(CHUNK_MAX_CHARS, len(text) // MAX_CHUNKS + 1)
+    return sliding_windows(text, max_chars) or [text]
+
+@dataclass(slots=True)
+class ChunkedEmbedding:
+    vector: List[float]                  # the whole text: its own embedding, or the mean of its chunks
+    chunks: List[str] = field(default_factory=list)               # empty when embedded whole
+    chunk_vectors: List[List[float]] = field(default_factory=list)
+
+def mean_vector(vectors: List[List[float]]) -> List[float]:
+    centroid = as_unit_matrix(vectors).mean(axis=0)
+    norm = float(np.linalg.norm(centroid))
+    return (centroid / norm if norm else centroid).tolist()
+
+def embed_chunked(client, text: str, model: str, timeout: Optional[float] = None) -> ChunkedEmbedding:
+    """Embedding for a text of any length; long texts never go out as one oversized request"""
+    chunks = chunk_text(text)
+    if len(chunks) == 1:
+        return ChunkedEmbedding(embed(client, chunks[0], model, timeout=timeout))
+    chunk_vectors = embed_many(client, chunks, model, timeout=timeout)
+    record_stats("chunking", chunked_texts=1, chunks=len(chunks), chars=len(text))
+    return ChunkedEmbedding(mean_vector(chunk_vectors), chunks, chunk_vectors)
+
+def embed_text(client, text: str, model: str, timeout: Optional[float] = None) -> List[float]:
+    return embed_chunked(client, text, model, timeout).vector
+
+def chunk_records(parent_id: str, chunked: ChunkedEmbedding, metadata: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Vector records for a parent's chunks: the parent's small fields, the chunk's own
+    passage as summary, and a link back to the parent"""
+    records = []
+    for position, (chunk, values) in enumerate(zip(chunked.chunks, chunked.chunk_vectors)):
+        chunk_metadata = dict(metadata)
+        chunk_metadata.update(summary=chunk[:CHUNK_SUMMARY_CHARS], parent_id=parent_id,
+                              chunk_index=position, chunk_count=len(chunked.chunks))
+        records.append({"id": f"{parent_id}#c{position}", "values": values, "metadata": chunk_metadata})
+    return records
+
+def is_chunk(metadata: Optional[Dict[str, Any]]) -> bool:
+    return bool(metadata) and "parent_id" in metadata
+
+def aggregate_chunks(matches: List[Dict[str, Any]], top_k: int) -> List[Dict[str, Any]]:
+    """Collapse chunk hits onto their parent memory (max score over the parent and its
+    chunks); the best-scoring chunk's passage becomes the parent's summary"""
+    best: Dict[str, Dict[str, Any]] = {}
+    hits: Dict[str, int] = {}
+    for match in matches:
+        metadata = match.get("metadata") or {}
+        parent_id = metadata.get("parent_id") or match["id"]
+        hits[parent_id] = hits.get(parent_id, 0) + 1
+        if parent_id not in best or match["score"] > best[parent_id]["score"]:
+            parent_metadata = {k: v for k, v in metadata.items() if k not in CHUNK_FIELDS}
+            best[parent_id] = {"id": parent_id, "score": match["score"], "metadata": parent_metadata}
+    for parent_id, match in best.items():
+        if hits[parent_id] > 1:
+            match["metadata"]["matched_chunks"] = hits[parent_id]
+    return sorted(best.values(), key=lambda match: -match["score"])[:top_k]
+
+def chunking_stats() -> Dict[str, Any]:
+    stats = read_stats("chunking")
+    texts = stats.get("chunked_texts", 0)
+    stats["avg_chunks"] = round(stats.get("chunks", 0) / texts, 2) if texts else 0.0
+    stats["avg_chars"] = round(stats.get("chars", 0) / texts, 1) if texts else 0.0
+    return stats
+
+# CLI: show the windows for a file (python dotspark_chunking.py notes.txt) or print chunking metrics
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) > 1:
+        with open(sys.argv[1], encoding="utf-8") as f:
+            for position, window in enumerate(chunk_text(f.read())):
+                print(f"--- chunk {position} ({len(window)} chars)\n{window}")
+    else:
+        print(json.dumps(chunking_stats(), indent=2))
@@ -0,0 +1,117 @@
+import os
+import sys
+import json
+import time
+from typing import Any, Callable, Dict, Optional
+
+from dotspark_storage import store_path, read_json, write_json_atomic, file_lock, read_stats, record_stats
+from dotspark_rate_limit import RateLimitTimeout, ProviderRateLimited
+
+# Per-dependency circuit breakers shared by every agent process on the host.
+# A breaker opens when the failure rate over the rolling window crosses the
+# threshold, fails fast while open, and lets a single probe through once the
+# cool-down has passed (half-open) to decide whether to close again.
+BREAKER_WINDOW_SECONDS = float(os.getenv("DOTSPARK_BREAKER_WINDOW_SECONDS", "60"))
+BREAKER_MIN_CALLS = int(os.getenv("DOTSPARK_BREAKER_MIN_CALLS", "5"))
+BREAKER_FAILURE_RATE = float(os.getenv("DOTSPARK_BREAKER_FAILURE_RATE", "0.5"))
+BREAKER_OPEN_SECONDS = float(os.getenv("DOTSPARK_BREAKER_OPEN_SECONDS", "30"))
+BREAKER_PROBE_LEASE_SECONDS = 15.0   # a probe that never reports back frees the slot after this
+MAX_WINDOW_OUTCOMES = 100
+
+BREAKERS = ("pinecone", "openai_embeddings", "openai_chat", "deepseek_chat")
+
+class CircuitOpenError(Exception):
+    """The dependency's breaker is open; callers take their fallback immediately"""
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"{name} circuit open; retry after {retry_after:.0f}s")
+        self.name = name
+        self.retry_after = retry_after
+
+def _path(name: str) -> str:
+    return store_path("circuit", name, ".json")
+
+def _state(breaker: Dict[str, Any], now: float) -> str:
+    if breaker.get("state") == "open" and now - breaker.get("opened_at", 0) >= BREAKER_OPEN_SECONDS:
+        return "half_open"
+    return breaker.get("state", "closed")
+
+def allow(name: str) -> bool:
+    """True if a call may go out now (closed, or the single half-open probe)"""
+    breaker = read_json(_path(name), {})
+    now = time.time()
+    state = _state(breaker, now)
+    if state == "closed":
+        return True
+    if state == "open":
+        return False
+    with file_lock(_path(name)):
+        breaker = read_json(_path(name), {})
+        if _state(breaker, now) != "half_open" or breaker.get("probe_until", 0) > now:
+            return _state(breaker, now) == "closed"
+        breaker["probe_until"] = now + BREAKER_PROBE_LEASE_SECONDS
+        write_json_atomic(_path(name), breaker)
+    return True
+
+def record(name: str, ok: bool):
+    """Add one outcome to the rolling window and open/close the breaker accordingly"""
+    now = time.time()
+    try:
+        with file_lock(_path(name)):
+            breaker = read_json(_path(name), {})
+            state = _state(breaker, now)
+            if state == "half_open":
+                # The probe decides: close with a clean window, or stay open for another cool-down
+                breaker = {"state": "closed", "outcomes": []} if ok else {"state": "open", "opened_at": now, "outcomes": []}
+                record_stats("circuit", name, **({"closed": 1} if ok else {"reopened": 1}))
+            else:
+                outcomes = [o for o in breaker.get("outcomes", []) if o[0] >= now - BREAKER_WINDOW_SECONDS]
+                outcomes = (outcomes + [[now, 1 if ok else 0]])[-MAX_WINDOW_OUTCOMES:]
+                breaker["outcomes"] = outcomes
+                failures = sum(1 for o in outcomes if not o[1])
+                if state == "closed" and len(outcomes) >= BREAKER_MIN_CALLS and failures / len(outcomes) >= BREAKER_FAILURE_RATE:
+                    breaker.update(state="open", opened_at=now, outcomes=[])
+                    record_stats("circuit", name, opened=1)
+            write_json_atomic(_path(name), breaker)
+        record_stats("circuit", name, calls=1, failures=0 if ok else 1)
+    except Exception as e:
+        print(f"Circuit breaker update failed: {e}", file=sys.stderr)
+
+def _is_dependency_failure(error: Exception) -> bool:
+    # Our own queueing and provider 429s mean the dependency is up, just busy
+    if isinstance(error, (RateLimitTimeout, ProviderRateLimited)):
+        return False
+    return getattr(error, "status_code", None) != 429
+
+def guarded(name: str, call: Callable[[], Any], is_failure: Optional[Callable[[Any], bool]] = None) -> Any:
+    """Run `call` behind the named breaker; raises CircuitOpenError without calling while open.
+
+    `is_failure` flags results that did not raise but still mean the dependency
+    is unhealthy (e.g. an HTTP 5xx response object).
+    """
+    if not allow(name):
+        record_stats("circuit", name, short_circuited=1)
+        breaker = read_json(_path(name), {})
+        raise CircuitOpenError(name, max(0.0, breaker.get("opened_at", 0) + BREAKER_OPEN_SECONDS - time.time()))
+    try:
+        result = call()
+    except Exception as e:
+        if _is_dependency_failure(e):
+            record(name, False)
+        raise
+    record(name, not (is_failure and is_failure(result)))
+    return result
+
+def breaker_states() -> Dict[str, str]:
+    now = time.time()
+    return {name: _state(read_json(_path(name), {}), now) for name in BREAKERS}
+
+def breaker_stats() -> Dict[str, Any]:
+    stats = read_stats("circuit")
+    for name, state in breaker_states().items():
+        stats.setdefault(name, {})["state"] = state
+    return stats
+
+# CLI for breaker metrics
+if __name__ == "__main__":
+    print(json.dumps(breaker_stats(), indent=2))
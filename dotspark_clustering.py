@@ -0,0 +1,253 @@
+import os
+import sys
+import time
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+from dotspark_storage import store_path, read_json, write_json_atomic, write_npz_atomic, file_lock
+from dotspark_vectors import (as_unit_matrix, to_epoch, iter_namespace_vectors, iter_user_structure_vectors,
+                              fetch_user_structure_vectors, STRUCTURE_KINDS, STRUCTURE_NAMESPACE)
+from dotspark_patterns import extract_themes, month_key, trend_label, MAX_MONTHS
+
+# Streaming mini-batch k-means configuration
+MAX_CLUSTERS = int(os.getenv("DOTSPARK_MAX_CLUSTERS", "24"))
+NEW_CLUSTER_SIMILARITY = float(os.getenv("DOTSPARK_NEW_CLUSTER_SIMILARITY", "0.8"))
+REBUILD_BATCH_SIZE = 256
+MAX_TERMS_PER_CLUSTER = 50
+
+def _kind(metadata: Dict[str, Any]) -> str:
+    """Dot/Wheel/Chakra vectors by their contentType; everything else is a conversation memory"""
+    kind = str(metadata.get("contentType") or "").lower()
+    return kind if kind in STRUCTURE_KINDS else "conversation"
+
+class ThoughtClusters:
+    """Per-user streaming clustering of Dot/Wheel/Chakra embeddings.
+
+    Centroids are updated with mini-batch k-means steps (per-centre learning rate
+    1/count); a vector that is not similar enough to any centre starts a new
+    cluster until MAX_CLUSTERS is reached. Only the published summary is read at
+    request time.
+    """
+
+    def __init__(self, user_id: str):
+        self.user_id = user_id
+        self.matrix_path = store_path("clusters", user_id, ".npz")
+        self.stats_path = store_path("clusters", user_id, ".json")
+        self.centroids = np.zeros((0, 0), dtype=np.float32)
+        self.counts = np.zeros(0, dtype=np.int64)
+        self.stats: List[Dict[str, Any]] = []
+
+    @classmethod
+    def load(cls, user_id: str) -> "ThoughtClusters":
+        model = cls(user_id)
+        if os.path.exists(model.matrix_path):
+            try:
+                with np.load(model.matrix_path, allow_pickle=False) as data:
+                    model.centroids = data["centroids"].astype(np.float32)
+                    model.counts = data["counts"].astype(np.int64)
+                model.stats = read_json(model.stats_path, {}).get("clusters_state", [])
+                if len(model.stats) != len(model.counts):
+                    return cls(user_id)
+            except Exception as e:
+                print(f"Cluster model load failed for {user_id}: {e}", file=sys.stderr)
+                return cls(user_id)
+        return model
+
+    def save(self):
+        write_npz_atomic(self.matrix_path, centroids=self.centroids, counts=self.counts)
+        write_json_atomic(self.stats_path, {"clusters_state": self.stats, "summary": self.summary()})
+
+    def _spawn(self, vector: np.ndarray):
+        if self.centroids.size == 0:
+            self.centroids = vector.reshape(1, -1).copy()
+        else:
+            self.centroids = np.vstack([self.centroids, vector])
+        self.counts = np.append(self.counts, 0)
+        self.stats.append({"kinds": {}, "months": {}, "terms": {}, "last_seen": 0})
+
+    def partial_fit(self, vectors: List[List[float]], metadata: List[Dict[str, Any]]):
+        X = as_unit_matrix(vectors)
+        if X.shape[0] == 0:
+            return
+        if self.centroids.size and self.centroids.shape[1] != X.shape[1]:
+            self.__init__(self.user_id)
+        if self.centroids.size == 0:
+            self._spawn(X[0])
+
+        # Assign the whole batch at once, then open new clusters for poorly matched rows
+        similarities = X @ self.centroids.T
+        labels = similarities.argmax(axis=1)
+        best = similarities[np.arange(len(X)), labels]
+        existing = len(self.counts)
+        for row in np.flatnonzero(best < NEW_CLUSTER_SIMILARITY):
+            if len(self.counts) >= MAX_CLUSTERS:
+                break
+            fresh = self.centroids[existing:] @ X[row]
+            if fresh.size and fresh.max() >= NEW_CLUSTER_SIMILARITY:
+                labels[row] = existing + int(fresh.argmax())
+                continue
+            self._spawn(X[row])
+            labels[row] = len(self.counts) - 1
+
+        # Mini-batch centroid update: each centre moves toward its batch mean
+        k, dim = self.centroids.shape
+        sums = np.zeros((k, dim), dtype=np.float64)
+        np.add.at(sums, labels, X)
+        batch_counts = np.bincount(labels, minlength=k)
+        touched = batch_counts > 0
+        self.counts = self.counts + batch_counts
+        eta = (batch_counts[touched] / self.counts[touched])[:, None]
+        batch_means = sums[touched] / batch_counts[touched][:, None]
+        updated = (1.0 - eta) * self.centroids[touched] + eta * batch_means
+        self.centroids[touched] = as_unit_matrix(updated)
+
+        now = time.time()
+        for label, meta in zip(labels, metadata):
+            self._record(self.stats[label], meta, now)
+
+    @staticmethod
+    def _record(stats: Dict[str, Any], metadata: Dict[str, Any], now: float):
+        kind = _kind(metadata)
+        stats["kinds"][kind] = stats["kinds"].get(kind, 0) + 1
+        timestamp = to_epoch(metadata.get("timestamp"), now)
+        month = month_key(timestamp)
+        stats["months"][month] = stats["months"].get(month, 0) + 1
+        for stale in sorted(stats["months"])[:-MAX_MONTHS]:
+            del stats["months"][stale]
+        stats["last_seen"] = max(stats["last_seen"], timestamp)
+        text = " ".join(str(metadata.get(f, "")) for f in ("summary", "heading", "category"))
+        terms = stats["terms"]
+        for term in extract_themes(text):
+            terms[term] = terms.get(term, 0) + 1
+        if len(terms) > 2 * MAX_TERMS_PER_CLUSTER:
+            stats["terms"] = dict(sorted(terms.items(), key=lambda kv: -kv[1])[:MAX_TERMS_PER_CLUSTER])
+
+    def summary(self) -> Dict[str, Any]:
+        now_key = month_key(time.time())
+        clusters = []
+        for cluster_id in np.argsort(-self.counts):
+            stats = self.stats[cluster_id]
+            top_terms = sorted(stats["terms"].items(), key=lambda kv: -kv[1])[:3]
+            clusters.append({
+                "cluster": int(cluster_id),
+                "label": " / ".join(t for t, _ in top_terms) or f"cluster {int(cluster_id)}",
+                "size": int(self.counts[cluster_id]),
+                "kinds": stats["kinds"],
+                "trend": trend_label({m: {"all": n} for m, n in stats["months"].items()}, "all", now_key),
+                "last_seen": stats["last_seen"]
+            })
+
+        # Gap detection: recurring themes that never made it into a wheel or chakra.
+        # Only meaningful once the user's wheels/chakras have been clustered at all
+        # (users clustered before structures were folded in need one rebuild)
+        has_structure = any(c["kinds"].get("wheel") or c["kinds"].get("chakra") for c in clusters)
+        gaps = [
+            {"cluster": c["cluster"], "label": c["label"], "gap": "unstructured"}
+            for c in clusters
+            if has_structure and c["size"] >= 3 and not (c["kinds"].get("wheel") or c["kinds"].get("chakra"))
+        ]
+        gaps += [
+            {"cluster": c["cluster"], "label": c["label"], "gap": "fading"}
+            for c in clusters if c["size"] >= 3 and c["trend"] in ("declining", "dormant")
+        ]
+        return {"total": int(self.counts.sum()), "clusters": clusters, "gaps": gaps, "updated_at": time.time()}
+
+def update_user_clusters(user_id: str, vectors: List[List[float]], metadata: List[Dict[str, Any]]):
+    """Fold newly written vectors into the user's clusters and republish the summary"""
+    try:
+        with file_lock(store_path("clusters", user_id, ".npz")):
+            model = ThoughtClusters.load(user_id)
+            model.partial_fit(vectors, metadata)
+            model.save()
+    except Exception as e:
+        print(f"Cluster update failed: {e}", file=sys.stderr)
+
+def _pending_path(user_id: str) -> str:
+    # Appended to by queueStructureVector (server/vector-generation.ts) on every Dot/Wheel/Chakra save
+    return store_path("structures", user_id, ".pending")
+
+def drain_new_structures(user_id: str, index,
+                         namespace: str = STRUCTURE_NAMESPACE) -> Tuple[List[List[float]], List[Dict[str, Any]]]:
+    """Fold the Dot/Wheel/Chakra vectors Node saved since the last drain into the
+    user's clusters; returns them (values, metadata) for other per-user state"""
+    path = _pending_path(user_id)
+    if index is None or not os.path.exists(path):
+        return [], []
+    draining = f"{path}.{os.getpid()}.draining"
+    try:
+        # Node appends to a fresh file from here on; a concurrent drain finds nothing
+        os.replace(path, draining)
+    except FileNotFoundError:
+        return [], []
+    with open(draining, "r", encoding="utf-8") as f:
+        vector_ids = list(dict.fromkeys(line.strip() for line in f if line.strip()))
+    try:
+        _, values, metadata = fetch_user_structure_vectors(index, user_id, vector_ids, namespace)
+    except Exception as e:
+        print(f"Structure fetch failed, requeueing {len(vector_ids)}: {e}", file=sys.stderr)
+        with open(path, "a", encoding="utf-8") as f:
+            f.writelines(f"{vector_id}\n" for vector_id in vector_ids)
+        return [], []
+    finally:
+        os.remove(draining)
+    if values:
+        update_user_clusters(user_id, values, metadata)
+    return values, metadata
+
+def rebuild_user_clusters(user_id: str, index, namespace: str = None,
+                          structure_namespace: str = STRUCTURE_NAMESPACE) -> Dict[str, Any]:
+    """Batch job: recluster a user's full set of stored embeddings from scratch: the
+    conversation memories in their own namespace plus their Dot/Wheel/Chakra vectors
+    from the shared structure namespace"""
+    rng = np.random.default_rng()
+    model = ThoughtClusters(user_id)
+    pending_vectors, pending_meta = [], []
+
+    def flush():
+        order = rng.permutation(len(pending_vectors))
+        model.partial_fit([pending_vectors[i] for i in order], [pending_meta[i] for i in order])
+        pending_vectors.clear()
+        pending_meta.clear()
+
+    sources = (iter_namespace_vectors(index, namespace or user_id),
+               iter_user_structure_vectors(index, user_id, structure_namespace))
+    for _, values, metadata in (batch for source in sources for batch in source):
+        pending_vectors.extend(values)
+        pending_meta.extend(metadata)
+        if len(pending_vectors) >= REBUILD_BATCH_SIZE:
+            flush()
+    if pending_vectors:
+        flush()
+
+    with file_lock(model.matrix_path):
+        model.save()
+    return model.summary()
+
+def load_cluster_summary(user_id: str) -> Dict[str, Any]:
+    """Published cluster labels, sizes, trends and gaps (empty dict if never clustered)"""
+    return read_json(store_path("clusters", user_id, ".json"), {}).get("summary", {})
+
+def format_cluster_overview(summary: Dict[str, Any], limit: int = 3) -> str:
+    if not summary or not summary.get("clusters"):
+        return ""
+    themes = ", ".join(
+        f"{c['label']} ({c['size']} thoughts, {c['trend']})" for c in summary["clusters"][:limit]
+    )
+    overview = f"THEME CLUSTERS: {themes}"
+    if summary.get("gaps"):
+        overview += "\nGAPS: " + ", ".join(f"{g['label']} ({g['gap']})" for g in summary["gaps"][:limit])
+    return overview
+
+# CLI for the batch rebuild job
+if __name__ == "__main__":
+    import json
+
+    if len(sys.argv) < 3 or sys.argv[1] != "rebuild":
+        print("Usage: python dotspark_clustering.py rebuild <user_id> [namespace]")
+        sys.exit(1)
+
+    from pinecone import Pinecone
+    pinecone_index = Pinecone(api_key=os.getenv("PINECONE_API_KEY")).Index("dotspark-vectors")
+    result = rebuild_user_clusters(sys.argv[2], pinecone_index, sys.argv[3] if len(sys.argv) > 3 else None)
+    print(json.dumps(result, indent=2))
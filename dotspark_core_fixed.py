@@ -4,6 +4,15 @@ from openai import OpenAI
 from pinecone import Pinecone, ServerlessSpec
 import requests
 
+from dotspark_vectors import mmr_select
+from dotspark_query_cache import cached_query
+from dotspark_rate_limit import (rate_limited, estimate_tokens, retry_after_header, ProviderRateLimited,
+                                 COMPLETION_TOKEN_RESERVE, RATE_LIMIT_MAX_WAIT)
+from dotspark_chunking import embed_text
+from dotspark_deadline import Deadline, RETRIEVAL_BUDGET_SHARE
+from dotspark_circuit import guarded
+from dotspark_records import SavedDot
+
 # Load environment variables
 load_dotenv()
 
@@ -37,6 +46,11 @@ except Exception as e:
 DEEPSEEK_API_KEY = os.getenv("DEEPSEEK_API_KEY")
 DEEPSEEK_API_URL = "https://api.deepseek.com/chat/completions"
 
+# Context diversification (MMR) settings
+MAX_CONTEXT_DOTS = 10
+MMR_LAMBDA = float(os.getenv("DOTSPARK_MMR_LAMBDA", "0.7"))
+MMR_GROUP_QUOTA = int(os.getenv("DOTSPARK_MMR_GROUP_QUOTA", "3"))
+
 # === System Prompt with Dot-Wheel-Chakra Hierarchy ===
 def get_system_prompt():
     return """
@@ -62,17 +76,13 @@ Be non-mechanical. Think like a human. Challenge and mirror, not just respond.
 # === Get OpenAI Embedding ===
 def get_openai_embedding(text):
     try:
-        response = openai_client.embeddings.create(
-            input=[text],
-            model="text-embedding-3-small"
-        )
-        return response.data[0].embedding
+        return embed_text(openai_client, text, "text-embedding-3-small")
     except Exception as e:
         print(f"Embedding error: {e}")
         return None
 
 # === Fetch Relevant Dots from Pinecone ===
-def fetch_diverse_dots(user_input, user_id, top_k=15):
+def fetch_diverse_dots(user_input, user_id, top_k=15, max_dots=MAX_CONTEXT_DOTS):
     if not index:
         print("Pinecone index not available")
         return []
@@ -81,40 +91,53 @@ def fetch_diverse_dots(user_input, user_id, top_k=15):
     if not query_vector:
         return []
         
+    def query_and_diversify():
+        results = guarded("pinecone", lambda: index.query(vector=query_vector, top_k=top_k, include_metadata=True, include_values=True))
+
+        matches = [
+            match for match in results.get('matches', [])
+            if str(match.get('metadata', {}).get('user_id')) == str(user_id) and match.get('values')
+        ]
+        if not matches:
+            return []
+
+        # Maximal marginal relevance over the match vectors: paraphrased near-duplicates
+        # are dropped and no single wheel/chakra can fill every context slot
+        groups = [
+            match['metadata'].get('wheel_id') or match['metadata'].get('chakra') or None
+            for match in matches
+        ]
+        picks = mmr_select(
+            query_vector,
+            [match['values'] for match in matches],
+            k=max_dots,
+            lambda_=MMR_LAMBDA,
+            groups=groups,
+            group_quota=MMR_GROUP_QUOTA
+        )
+
+        # Plain dicts here: this is what the query cache stores
+        return [SavedDot.from_metadata(matches[i].get('metadata', {})).to_dict() for i in picks]
+
     try:
-        results = index.query(vector=query_vector, top_k=top_k, include_metadata=True)
-
-        seen = set()
-        unique_dots = []
-
-        for match in results.get('matches', []):
-            meta = match.get('metadata', {})
-            if str(meta.get('user_id')) == str(user_id):
-                key = f"{meta.get('summary')}|{meta.get('emotion')}|{meta.get('wheel_id')}"
-                if key not in seen:
-                    unique_dots.append({
-                        'summary': meta.get('summary', ''),
-                        'content': meta.get('content', ''),
-                        'emotion': meta.get('emotion', ''),
-                        'wheel': meta.get('wheel_id', ''),
-                        'chakra': meta.get('chakra', ''),
-                        'timestamp': meta.get('timestamp', '')
-                    })
-                    seen.add(key)
-            if len(unique_dots) >= 10:
-                break
-
-        return unique_dots
+        # Consecutive turns with near-identical queries reuse the last result until
+        # the user's vectors change (generation bump on every upsert)
+        return [SavedDot(**dot) for dot in cached_query(str(user_id), f"diverse:{top_k}:{max_dots}", query_vector, query_and_diversify)]
     except Exception as e:
         print(f"Pinecone query error: {e}")
         return []
 
 # === Build Full Prompt ===
-def build_prompt(user_input, user_id):
-    related_dots = fetch_diverse_dots(user_input, user_id)
+def build_prompt(user_input, user_id, deadline=None):
+    deadline = deadline or Deadline()
+    # Past its share of the budget, answer without related dots
+    related_dots = deadline.run(
+        "retrieval", lambda: fetch_diverse_dots(user_input, user_id),
+        deadline.share(RETRIEVAL_BUDGET_SHARE), []
+    )
 
     dots_section = "\n".join([
-        f"- [{dot['timestamp']}] {dot['summary']} (Wheel: {dot['wheel']}, Chakra: {dot['chakra']}, Emotion: {dot['emotion']})"
+        f"- [{dot.timestamp}] {dot.summary} (Wheel: {dot.wheel}, Chakra: {dot.chakra}, Emotion: {dot.emotion})"
         for dot in related_dots
     ]) if related_dots else "No related dots found in your history."
 
@@ -134,7 +157,7 @@ Please reflect, connect, or challenge meaningfully.
     return full_prompt
 
 # === DeepSeek Chat API Integration ===
-def call_deepseek_api(messages):
+def call_deepseek_api(messages, timeout=None):
     if not DEEPSEEK_API_KEY:
         return "DeepSeek API key not configured"
         
@@ -149,7 +172,18 @@ def call_deepseek_api(messages):
     }
 
     try:
-        response = requests.post(DEEPSEEK_API_URL, headers=headers, json=payload)
+        def post():
+            res = requests.post(DEEPSEEK_API_URL, headers=headers, json=payload, timeout=timeout)
+            if res.status_code == 429:
+                raise ProviderRateLimited(retry_after_header(res.headers))
+            return res
+
+        max_wait = timeout if timeout is not None else RATE_LIMIT_MAX_WAIT
+        response = guarded(
+            "deepseek_chat",
+            lambda: rate_limited("deepseek", "deepseek-chat", estimate_tokens(messages, COMPLETION_TOKEN_RESERVE), post, max_wait),
+            is_failure=lambda res: res.status_code >= 500
+        )
         if response.status_code == 200:
             return response.json()['choices'][0]['message']['content']
         else:
@@ -158,8 +192,9 @@ def call_deepseek_api(messages):
         return f"DeepSeek API Connection Error: {e}"
 
 # === Unified Model Runner ===
-def get_response_from_model(user_input, user_id, model_type="gpt-4"):
-    prompt = build_prompt(user_input, user_id)
+def get_response_from_model(user_input, user_id, model_type="gpt-4", deadline=None):
+    deadline = deadline or Deadline()
+    prompt = build_prompt(user_input, user_id, deadline)
     system_prompt = get_system_prompt()
 
     messages = [
@@ -169,16 +204,19 @@ def get_response_from_model(user_input, user_id, model_type="gpt-4"):
 
     if model_type == "gpt-4":
         try:
-            response = openai_client.chat.completions.create(
-                model="gpt-4",
-                messages=messages
-            )
+            # The model call gets whatever budget retrieval left
+            timeout = deadline.timeout()
+            response = guarded("openai_chat", lambda: rate_limited(
+                "openai", "gpt-4", estimate_tokens(messages, COMPLETION_TOKEN_RESERVE),
+                lambda: openai_client.with_options(timeout=timeout).chat.completions.create(model="gpt-4", messages=messages),
+                timeout
+            ))
             return response.choices[0].message.content
         except Exception as e:
             return f"OpenAI API Error: {e}"
 
     elif model_type == "deepseek":
-        return call_deepseek_api(messages)
+        return call_deepseek_api(messages, timeout=deadline.timeout())
 
     else:
         return "Unsupported model."
@@ -0,0 +1,71 @@
+import os
+import sys
+import time
+import threading
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from typing import Any, Callable, List
+
+# Per-turn budget. The Node agent layer passes what is left of the request budget
+# after admission (DOTSPARK_DEADLINE_MS); standalone runs use the default. Bulk
+# processes (DOTSPARK_PRIORITY=bulk) yield to interactive traffic by queueing, so
+# they get their own long budget instead of dropping items once a wait passes 25s.
+BULK_BUDGET_SECONDS = float(os.getenv("DOTSPARK_BULK_DEADLINE_MS", "600000")) / 1000.0
+TURN_BUDGET_SECONDS = (BULK_BUDGET_SECONDS if os.getenv("DOTSPARK_PRIORITY") == "bulk"
+                       else float(os.getenv("DOTSPARK_DEADLINE_MS", "25000")) / 1000.0)
+RETRIEVAL_BUDGET_SHARE = float(os.getenv("DOTSPARK_RETRIEVAL_BUDGET_SHARE", "0.3"))
+MEMORY_WRITE_MIN_SECONDS = float(os.getenv("DOTSPARK_MEMORY_WRITE_MIN_SECONDS", "1.0"))
+
+class Deadline:
+    """Wall-clock budget for one turn, shared by embedding, retrieval, model call and memory write"""
+
+    def __init__(self, budget_seconds: float = TURN_BUDGET_SECONDS):
+        self.budget = budget_seconds
+        self.started = time.monotonic()
+        self.degraded_stages: List[str] = []
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+    def remaining(self) -> float:
+        return max(0.0, self.budget - self.elapsed())
+
+    def expired(self) -> bool:
+        return self.remaining() <= 0.0
+
+    def share(self, fraction: float) -> float:
+        """A stage's slice of the whole budget, capped by what is actually left"""
+        return min(self.remaining(), self.budget * fraction)
+
+    def timeout(self) -> float:
+        """Remaining budget as a client timeout (never 0, which some clients read as 'no timeout')"""
+        return max(0.1, self.remaining())
+
+    def degrade(self, stage: str, reason: str = ""):
+        if stage not in self.degraded_stages:
+            self.degraded_stages.append(stage)
+        # stderr: the agent's stdout carries only the JSON result Node parses
+        print(f"Stage '{stage}' degraded{': ' + reason if reason else ''}", file=sys.stderr)
+
+    def run(self, stage: str, fn: Callable[[], Any], budget: float, fallback: Any) -> Any:
+        """Run `fn` with at most `budget` seconds; past that, degrade the stage and return `fallback`.
+
+        The abandoned call keeps running on a daemon thread and is dropped at exit,
+        so only read-mostly stages (retrieval) should be wrapped this way.
+        """
+        if budget <= 0:
+            self.degrade(stage, "no budget left")
+            return fallback
+        future: Future = Future()
+
+        def target():
+            try:
+                future.set_result(fn())
+            except Exception as e:
+                future.set_exception(e)
+
+        threading.Thread(target=target, name=f"stage-{stage}", daemon=True).start()
+        try:
+            return future.result(timeout=budget)
+        except FutureTimeout:
+            self.degrade(stage, f"exceeded {budget:.2f}s")
+            return fallback
@@ -0,0 +1,146 @@
+import os
+import json
+import time
+import threading
+from concurrent.futures import Future
+from typing import Any, Dict, List, Optional, Tuple
+
+from dotspark_storage import read_stats, update_stats
+from dotspark_rate_limit import rate_limited, estimate_tokens, RATE_LIMIT_MAX_WAIT
+from dotspark_circuit import guarded
+
+# Micro-batching configuration: concurrent embed() calls in one process are collected
+# for up to EMBED_BATCH_WINDOW_MS (or EMBED_BATCH_MAX_ITEMS) and sent as one request.
+# The queue is per process and the server spawns one agent process per request, so
+# there is nothing to wait for there: the window defaults to 0 (embed() goes straight
+# out; embed_many still sends a request's texts as one batch). Long-running
+# multi-threaded jobs (dotspark_bulk) turn the window on.
+EMBED_BATCH_WINDOW_MS = float(os.getenv("DOTSPARK_EMBED_BATCH_WINDOW_MS", "0"))    # 0 disables the wait
+EMBED_BATCH_MAX_ITEMS = int(os.getenv("DOTSPARK_EMBED_BATCH_MAX_ITEMS", "64"))
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64)
+
+def _size_bucket(size: int) -> str:
+    for bound in BATCH_SIZE_BUCKETS:
+        if size <= bound:
+            return f"<={bound}"
+    return f">{BATCH_SIZE_BUCKETS[-1]}"
+
+def _request_embeddings(client, model: str, texts: List[str],
+                        max_wait: float = RATE_LIMIT_MAX_WAIT) -> List[List[float]]:
+    response = guarded("openai_embeddings", lambda: rate_limited(
+        "openai", model, estimate_tokens(texts),
+        lambda: client.embeddings.create(input=texts, model=model),
+        max_wait
+    ))
+    return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+class EmbeddingBatcher:
+    """Collects embedding requests from concurrent threads into batched API calls"""
+
+    def __init__(self, client, model: str, window_ms: float = EMBED_BATCH_WINDOW_MS,
+                 max_items: int = EMBED_BATCH_MAX_ITEMS):
+        self.client = client
+        self.model = model
+        self.window = window_ms / 1000.0
+        self.max_items = max(1, max_items)
+        self._pending: List[Tuple[str, Future, float]] = []
+        self._condition = threading.Condition()
+        self._worker = None
+
+    def submit(self, text: str) -> Future:
+        future: Future = Future()
+        with self._condition:
+            self._pending.append((text, future, time.monotonic()))
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name=f"embed-batcher-{self.model}", daemon=True)
+                self._worker.start()
+            self._condition.notify()
+        return future
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._pending:
+                    self._condition.wait()
+                deadline = self._pending[0][2] + self.window
+                while len(self._pending) < self.max_items:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+                batch = self._pending[:self.max_items]
+                del self._pending[:self.max_items]
+            self._flush(batch)
+
+    def _flush(self, batch: List[Tuple[str, Future, float]]):
+        sent_at = time.monotonic()
+        try:
+            vectors = _request_embeddings(self.client, self.model, [text for text, _, _ in batch])
+            for (_, future, _), vector in zip(batch, vectors):
+                future.set_result(vector)
+        except Exception as e:
+            for _, future, _ in batch:
+                future.set_exception(e)
+        _record_batch(self.model, len(batch), [sent_at - enqueued for _, _, enqueued in batch])
+
+_batchers: Dict[Tuple[int, str], EmbeddingBatcher] = {}
+_batchers_lock = threading.Lock()
+
+def _batcher(client, model: str) -> EmbeddingBatcher:
+    key = (id(client), model)
+    with _batchers_lock:
+        if key not in _batchers:
+            _batchers[key] = EmbeddingBatcher(client, model)
+        return _batchers[key]
+
+def embed(client, text: str, model: str, timeout: Optional[float] = None) -> List[float]:
+    """Embedding for one text, batched with whatever else this process is embedding right now.
+
+    `timeout` (seconds) bounds the wait for the caller; raises TimeoutError past it.
+    """
+    if EMBED_BATCH_WINDOW_MS <= 0:
+        if timeout is None:
+            return _request_embeddings(client, model, [text])[0]
+        return _request_embeddings(client.with_options(timeout=timeout), model, [text], timeout)[0]
+    return _batcher(client, model).submit(text).result(timeout=timeout)
+
+def embed_many(client, texts: List[str], model: str, timeout: Optional[float] = None) -> List[List[float]]:
+    """Embeddings for several texts, sent in batches of up to EMBED_BATCH_MAX_ITEMS.
+
+    `timeout` (seconds) bounds the wait for all of them; raises TimeoutError past it.
+    """
+    if EMBED_BATCH_WINDOW_MS <= 0:
+        if timeout is not None:
+            client = client.with_options(timeout=timeout)
+        return [vector for start in range(0, len(texts), EMBED_BATCH_MAX_ITEMS)
+                for vector in _request_embeddings(client, model, texts[start:start + EMBED_BATCH_MAX_ITEMS],
+                                                  RATE_LIMIT_MAX_WAIT if timeout is None else timeout)]
+    batcher = _batcher(client, model)
+    futures = [batcher.submit(text) for text in texts]
+    if timeout is None:
+        return [future.result() for future in futures]
+    deadline = time.monotonic() + timeout
+    return [future.result(timeout=max(0.0, deadline - time.monotonic())) for future in futures]
+
+def _record_batch(model: str, size: int, waits: List[float]):
+    def apply(stats: Dict[str, Any]):
+        entry = stats.setdefault(model, {"batches": 0, "items": 0, "added_latency_ms_total": 0.0,
+                                         "added_latency_ms_max": 0.0, "batch_sizes": {}})
+        entry["batches"] += 1
+        entry["items"] += size
+        entry["added_latency_ms_total"] = round(entry["added_latency_ms_total"] + sum(waits) * 1000, 3)
+        entry["added_latency_ms_max"] = round(max(entry["added_latency_ms_max"], max(waits) * 1000), 3)
+        bucket = _size_bucket(size)
+        entry["batch_sizes"][bucket] = entry["batch_sizes"].get(bucket, 0) + 1
+    update_stats("embeddings", apply)
+
+def embedding_stats() -> Dict[str, Any]:
+    stats = read_stats("embeddings")
+    for entry in stats.values():
+        entry["avg_batch_size"] = round(entry["items"] / entry["batches"], 2) if entry["batches"] else 0.0
+        entry["avg_added_latency_ms"] = round(entry["added_latency_ms_total"] / entry["items"], 3) if entry["items"] else 0.0
+    return stats
+
+# CLI for batching metrics
+if __name__ == "__main__":
+    print(json.dumps(embedding_stats(), indent=2))
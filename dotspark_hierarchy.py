@@ -0,0 +1,90 @@
+import os
+from typing import Any, Dict, List, Optional
+
+# Branch selection for Chakra -> Wheel -> Dot retrieval
+BRANCH_CANDIDATES = int(os.getenv("DOTSPARK_BRANCH_CANDIDATES", "8"))
+TOP_CHAKRAS = int(os.getenv("DOTSPARK_TOP_CHAKRAS", "2"))
+TOP_WHEELS = int(os.getenv("DOTSPARK_TOP_WHEELS", "3"))
+
+def _as_id(value: Any) -> Optional[int]:
+    """Pinecone returns numeric metadata as floats; normalize ids to ints"""
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return None
+
+def _user_value(user_id: str) -> Any:
+    # Dot/Wheel/Chakra vectors carry the numeric database user id
+    user = _as_id(user_id)
+    return user if user is not None else user_id
+
+def _node(kind: str, metadata: Dict[str, Any], score: float = None) -> Dict[str, Any]:
+    node = {"type": kind, "id": _as_id(metadata.get("contentId")), "heading": metadata.get("heading", "")}
+    if score is not None:
+        node["score"] = float(score)
+    return node
+
+def hierarchical_search(index, query_vector: List[float], user_id: str, top_k: int = 5,
+                        namespace: str = None) -> List[Dict[str, Any]]:
+    """Match the query against the user's few Chakra/Wheel vectors first, then search
+    only the Dots under the best branches. Each dot carries its Wheel/Chakra lineage.
+    """
+    scope = {"namespace": namespace} if namespace else {}
+    user = _user_value(user_id)
+
+    branch_results = index.query(
+        vector=query_vector,
+        top_k=BRANCH_CANDIDATES,
+        include_metadata=True,
+        filter={"userId": {"$eq": user}, "contentType": {"$in": ["chakra", "wheel"]}},
+        **scope
+    )
+    chakras: Dict[int, Dict[str, Any]] = {}
+    wheels: Dict[int, Dict[str, Any]] = {}
+    for match in branch_results["matches"]:
+        meta = match["metadata"] or {}
+        node = _node(meta.get("contentType"), meta, match["score"])
+        if node["id"] is None:
+            continue
+        if node["type"] == "chakra":
+            chakras[node["id"]] = node
+        elif node["type"] == "wheel":
+            node["chakra_id"] = _as_id(meta.get("chakraId"))
+            wheels[node["id"]] = node
+
+    best_chakras = sorted(chakras, key=lambda c: -chakras[c]["score"])[:TOP_CHAKRAS]
+    best_wheels = sorted(wheels, key=lambda w: -wheels[w]["score"])[:TOP_WHEELS]
+    best_wheels += [w for w, node in wheels.items() if node["chakra_id"] in best_chakras and w not in best_wheels]
+
+    dot_filter: Dict[str, Any] = {"userId": {"$eq": user}, "contentType": {"$eq": "dot"}}
+    branches = []
+    if best_wheels:
+        branches.append({"wheelId": {"$in": best_wheels}})
+    if best_chakras:
+        branches.append({"chakraId": {"$in": best_chakras}})
+    if branches:
+        dot_filter["$or"] = branches
+
+    dot_results = index.query(vector=query_vector, top_k=top_k, include_metadata=True, filter=dot_filter, **scope)
+
+    dots = []
+    for match in dot_results["matches"]:
+        meta = match["metadata"] or {}
+        wheel = wheels.get(_as_id(meta.get("wheelId")))
+        chakra = chakras.get(_as_id(meta.get("chakraId")) or (wheel or {}).get("chakra_id"))
+        dots.append({
+            "id": match["id"],
+            "score": float(match["score"]),
+            "metadata": meta,
+            "lineage": {
+                "chakra": {k: v for k, v in chakra.items() if k != "score"} if chakra else None,
+                "wheel": {k: v for k, v in wheel.items() if k not in ("score", "chakra_id")} if wheel else None
+            }
+        })
+    return dots
+
+def lineage_path(lineage: Optional[Dict[str, Any]]) -> str:
+    """'Chakra › Wheel' label for prompt rendering ('' when the dot is unattached)"""
+    if not lineage:
+        return ""
+    return " › ".join(node["heading"] for node in (lineage.get("chakra"), lineage.get("wheel")) if node and node.get("heading"))
@@ -1,19 +1,56 @@
 import os
+import sys
 import openai
 import requests
 import json
 import time
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional
+
+from dotspark_memory_tiers import tiered_search, remember_hot
+from dotspark_patterns import record_memory, load_pattern_summary, format_pattern_analysis, category_from_response
+from dotspark_clustering import (update_user_clusters, load_cluster_summary, format_cluster_overview,
+                                 drain_new_structures)
+from dotspark_sparks import load_spark_candidates, format_spark_candidates
+from dotspark_lexical import index_document, lexical_search, reciprocal_rank_fusion
+from dotspark_query_cache import cached_query, bump_generation, cache_stats
+from dotspark_hierarchy import hierarchical_search, lineage_path
+from dotspark_linkage import record_linkages, expand_context
+from dotspark_rate_limit import rate_limited, estimate_tokens, retry_after_header, ProviderRateLimited, RATE_LIMIT_MAX_WAIT
+from dotspark_deadline import Deadline, RETRIEVAL_BUDGET_SHARE, MEMORY_WRITE_MIN_SECONDS
+from dotspark_circuit import guarded, breaker_states, CircuitOpenError
+from dotspark_blob_store import split_payload, put_blob, hydrate, text_record, texts_namespace
+from dotspark_records import Match
+from dotspark_router import route_turn, canned_reply, record_route
+from dotspark_tiering import select_model, ModelChoice, REASONING_MODEL_PREFIXES
+from dotspark_sessions import get_session, record_turn
+from dotspark_chunking import embed_chunked, embed_text, chunk_records, aggregate_chunks, CHUNK_QUERY_OVERFETCH
+from dotspark_profile import (record_profile, load_profile_section, load_profile_vector, profile_allows_remote,
+                              structure_fields)
+from dotspark_structured import parse_organized, parse_structured, structured_output_params, ENVELOPE_SCHEMAS
 
 # Setup environment variables
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 DEEPSEEK_API_KEY = os.getenv("DEEPSEEK_API_KEY")
 PINECONE_API_KEY = os.getenv("PINECONE_API_KEY")
 
-# Model selection
-MODEL = os.getenv("MODEL", "gpt-4")  # Options: 'gpt-4' or 'deepseek-chat'
+# Model selection: MODEL ('gpt-4' or 'deepseek-chat') is the large tier; each turn
+# picks its model and output profile in dotspark_tiering.select_model
+
+# Retrieval mode: 'hybrid' (vector + BM25), 'vector' or 'lexical' (no embeddings call)
+RETRIEVAL_MODE = os.getenv("DOTSPARK_RETRIEVAL_MODE", "hybrid")
+# Also search the user's Dot/Wheel/Chakra vectors branch-first (Chakra -> Wheel -> Dot)
+HIERARCHICAL_RETRIEVAL = os.getenv("DOTSPARK_HIERARCHICAL_RETRIEVAL", "0") == "1"
+# Set by the Node admission controller under load: skip retrieval and memory writes
+DEGRADED_MODE = os.getenv("DOTSPARK_DEGRADED", "0") == "1"
+# System prompt for turns the intent router sends down the chat-only pipeline
+CHAT_PROMPT = (
+    "You are DotSpark, a cognitive partner that helps users capture and connect their thoughts "
+    "as Dots (insights), Wheels (goals) and Chakras (life purposes). Keep every field brief and conversational."
+)
+# Excerpt of an earlier answer quoted for highly relevant matches (hydrated from the blob store)
+PRIOR_RESPONSE_CHARS = 200
 
-# Init clients
+# Init clients (diagnostics go to stderr; stdout carries only the JSON result Node parses)
 openai_client = None
 index = None
 
@@ -21,7 +58,7 @@ if OPENAI_API_KEY:
     try:
         openai_client = openai.OpenAI(api_key=OPENAI_API_KEY)
     except Exception as e:
-        print(f"OpenAI initialization failed: {e}")
+        print(f"OpenAI initialization failed: {e}", file=sys.stderr)
 
 if PINECONE_API_KEY:
     try:
@@ -29,71 +66,179 @@ if PINECONE_API_KEY:
         pc = Pinecone(api_key=PINECONE_API_KEY)
         index = pc.Index("dotspark-vectors")
     except ImportError:
-        print("Pinecone package not available")
+        print("Pinecone package not available", file=sys.stderr)
     except Exception as e:
-        print(f"Pinecone initialization failed: {e}")
+        print(f"Pinecone initialization failed: {e}", file=sys.stderr)
 
-def fetch_user_context(user_id: str, user_input: str, top_k: int = 5):
-    if not index or not openai_client:
+def remote_or_empty(fetch):
+    """Remote results, or none while the Pinecone breaker is open (the hot tier still answers)"""
+    try:
+        return fetch()
+    except CircuitOpenError as e:
+        print(f"Skipping Pinecone query: {e}", file=sys.stderr)
         return []
+
+def fetch_user_context(user_id: str, user_input: str, top_k: int = 5, mode: str = RETRIEVAL_MODE,
+                       profile_vector=None) -> List[Match]:
+    # Exact-term recall (names, projects, tickers) from the local BM25 index
+    lexical_context = []
+    if mode in ("hybrid", "lexical"):
+        lexical_context = [Match.from_metadata(hit["id"], hit["metadata"], tier="local", match="lexical")
+                           for hit in lexical_search(user_id, user_input, top_k)]
+    if mode == "lexical" or not openai_client:
+        return lexical_context + expand_context(user_id, lexical_context)
+
+    query_vector = None
+    remote_allowed = False
     try:
         # Generate embedding for current user input for semantic search
-        embedding_response = openai_client.embeddings.create(
-            input=user_input,
-            model="text-embedding-ada-002"
-        )
-        query_vector = embedding_response.data[0].embedding
-        
-        # Semantic search in user's personal knowledge base
-        results = index.query(
-            namespace=user_id,
-            vector=query_vector,
-            top_k=top_k,
-            include_metadata=True
+        # Long inputs (pasted journals, voice transcripts) are embedded as chunks and averaged
+        query_vector = embed_text(openai_client, user_input, "text-embedding-ada-002")
+
+        def query_remote():
+            # Semantic search in user's personal knowledge base (cold tier)
+            if not index:
+                return []
+            results = guarded("pinecone", lambda: index.query(
+                namespace=user_id,
+                vector=query_vector,
+                top_k=top_k * CHUNK_QUERY_OVERFETCH,
+                include_metadata=True
+            ))
+            # Chunks of long memories are folded back onto their parent memory
+            return aggregate_chunks([
+                {"id": match["id"], "score": match["score"], "metadata": match["metadata"] or {}}
+                for match in results["matches"]
+            ], top_k)
+
+        # Recent memories are answered from the local hot tier; only high-relevance
+        # matches are kept, ranked by similarity blended with recency. Remote results
+        # are cached per namespace generation and quantized query vector
+        # Off-profile queries (far from the user's profile embedding) stay on the local tiers
+        remote_allowed = profile_allows_remote(profile_vector, query_vector)
+        vector_context = tiered_search(
+            user_id, query_vector,
+            lambda: remote_or_empty(lambda: cached_query(user_id, f"context:{top_k}", query_vector, query_remote))
+            if remote_allowed else [],
+            top_k=top_k, min_similarity=0.7
         )
-        
-        # Return relevant context with similarity scores
-        context = []
-        for match in results["matches"]:
-            if match["score"] > 0.7:  # Only high-relevance matches
-                context.append({
-                    "content": match["metadata"],
-                    "relevance": match["score"],
-                    "type": match["metadata"].get("type", "thought")
-                })
-        
-        return context
     except Exception as e:
-        print("Enhanced Pinecone fetch failed:", e)
-        return []
+        print("Enhanced Pinecone fetch failed:", e, file=sys.stderr)
+        vector_context = []
+
+    structure_context = []
+    if HIERARCHICAL_RETRIEVAL and index and query_vector is not None and remote_allowed:
+        try:
+            structure_context = [Match.from_metadata(
+                dot["id"], dot["metadata"], dot["score"], "structure", type="dot", lineage=dot["lineage"]
+            ) for dot in cached_query(
+                user_id, f"hierarchy:{top_k}", query_vector,
+                lambda: guarded("pinecone", lambda: hierarchical_search(index, query_vector, user_id, top_k))
+            ) if dot["score"] > 0.7]
+        except Exception as e:
+            print("Hierarchical fetch failed:", e, file=sys.stderr)
+
+    ranked_lists = [results for results in (vector_context, structure_context, lexical_context) if results]
+    if len(ranked_lists) > 1:
+        context = reciprocal_rank_fusion(ranked_lists, top_k)
+    else:
+        context = ranked_lists[0] if ranked_lists else []
+    # Bounded 1-2 hop expansion along recorded dot/wheel/chakra linkages (local, no vector queries)
+    return context + expand_context(user_id, context)
+
+# Output format the prompt asks for, per output profile envelope (see dotspark_tiering)
+OUTPUT_FORMATS = {
+    "full": """ENHANCED OUTPUT FORMAT (a JSON object):
+
+{
+  "dot": {
+    "summary": "Sharp insight (max 220 chars)",
+    "context": "What triggered this + connections to past thoughts (max 300 chars)", 
+    "pulse": "one-word emotion"
+  },
+  "wheel": {
+    "heading": "Goal/project name",
+    "summary": "Tactical approach + relevant past experiences (max 300 chars)",
+    "timeline": "short-term"
+  },
+  "chakra": {
+    "heading": "Life purpose/identity",
+    "purpose": "Core meaning + alignment with user patterns (max 300 chars)", 
+    "timeline": "long-term"
+  },
+  "intelligence_insights": [
+    "Pattern: User shows consistent interest in...",
+    "Connection: This relates to previous thought about...",
+    "Growth: Consider exploring the relationship between..."
+  ],
+  "semantic_linkages": ["Direct connections to past thoughts"],
+  "coaching_questions": ["What would happen if...", "How does this connect to..."]
+}
+""",
+    "core": """ENHANCED OUTPUT FORMAT (a JSON object):
+
+{
+  "dot": {"summary": "Sharp insight (max 220 chars)", "context": "What triggered this (max 300 chars)", "pulse": "one-word emotion"},
+  "wheel": {"heading": "Goal/project name", "summary": "Tactical approach (max 300 chars)", "timeline": "short-term"},
+  "chakra": {"heading": "Life purpose/identity", "purpose": "Core meaning (max 300 chars)", "timeline": "long-term"},
+  "semantic_linkages": ["Direct connections to past thoughts"]
+}
+""",
+}
 
-def build_enhanced_prompt(user_input: str, semantic_context: list) -> str:
+def build_enhanced_prompt(user_input: str, semantic_context: List[Match], pattern_summary: dict = None,
+                          cluster_summary: dict = None, spark_candidates: list = None,
+                          envelope: str = "full", profile_section: str = "") -> str:
     # Build rich contextual information from vector database
     relevant_context = ""
     patterns_detected = []
     user_preferences = {}
     
     for item in semantic_context:
-        content = item.get("content", {})
-        relevance = item.get("relevance", 0)
+        content = item.content
+        relevance = item.relevance
+        summary = content.summary
+        lineage = lineage_path(item.lineage)
+        if lineage:
+            summary = f"{summary} [{lineage}]"
         
-        if relevance > 0.85:  # Highly relevant
-            relevant_context += f"• HIGHLY RELEVANT ({relevance:.2f}): {content.get('summary', '')}\n"
-            if content.get('category'):
-                patterns_detected.append(content['category'])
+        if item.match == "lexical":  # Exact keyword recall without a vector match
+            relevant_context += f"• KEYWORD MATCH: {summary}\n"
+        elif item.match == "linked":  # Neighbour of a retrieved thought in the linkage graph
+            relevant_context += f"• LINKED ({item.type}): {summary}\n"
+        elif relevance > 0.85:  # Highly relevant
+            relevant_context += f"• HIGHLY RELEVANT ({relevance:.2f}): {summary}\n"
+            if content.ai_response:
+                relevant_context += f"  Earlier response: {content.ai_response[:PRIOR_RESPONSE_CHARS]}\n"
+            if content.category:
+                patterns_detected.append(content.category)
         elif relevance > 0.7:  # Moderately relevant
-            relevant_context += f"• RELEVANT ({relevance:.2f}): {content.get('summary', '')}\n"
+            relevant_context += f"• RELEVANT ({relevance:.2f}): {summary}\n"
 
-    # Detect user thinking patterns
-    pattern_analysis = ""
-    if patterns_detected:
+    # Whole-history patterns come from the precomputed per-user pattern index;
+    # fall back to the categories of the retrieved matches for users without one
+    pattern_analysis = format_pattern_analysis(pattern_summary)
+    if not pattern_analysis and patterns_detected:
         unique_patterns = list(set(patterns_detected))
         pattern_analysis = f"DETECTED PATTERNS: User frequently thinks about {', '.join(unique_patterns[:3])}"
 
+    # Theme clusters and gaps are published by the offline/incremental clustering engine
+    cluster_overview = format_cluster_overview(cluster_summary)
+    if cluster_overview:
+        pattern_analysis = f"{pattern_analysis}\n{cluster_overview}".strip()
+
+    # Unconnected-but-similar pairs found by the batch spark job
+    sparks = format_spark_candidates(spark_candidates)
+    if sparks:
+        pattern_analysis = f"{pattern_analysis}\n{sparks}".strip()
+
+    # Stable user traits, pre-rendered by the profile store
+    profile_block = f"{profile_section}\n\n" if profile_section else ""
+
     prompt = f"""
 You are DotSpark, an advanced cognitive intelligence system with access to the user's complete thought history via vector database semantic search.
 
-CONTEXT INTELLIGENCE:
+{profile_block}CONTEXT INTELLIGENCE:
 {relevant_context}
 
 PATTERN ANALYSIS:
@@ -107,32 +252,7 @@ COGNITIVE COACHING FRAMEWORK:
 - Ask probing questions when thoughts need deeper exploration
 - Connect current thinking to user's established knowledge base
 
-ENHANCED OUTPUT FORMAT (when structured response is natural):
-
-{{
-  "dot": {{
-    "summary": "Sharp insight (max 220 chars)",
-    "context": "What triggered this + connections to past thoughts (max 300 chars)", 
-    "pulse": "one-word emotion"
-  }},
-  "wheel": {{
-    "heading": "Goal/project name",
-    "summary": "Tactical approach + relevant past experiences (max 300 chars)",
-    "timeline": "short-term"
-  }},
-  "chakra": {{
-    "heading": "Life purpose/identity",
-    "purpose": "Core meaning + alignment with user patterns (max 300 chars)", 
-    "timeline": "long-term"
-  }},
-  "intelligence_insights": [
-    "Pattern: User shows consistent interest in...",
-    "Connection: This relates to previous thought about...",
-    "Growth: Consider exploring the relationship between..."
-  ],
-  "semantic_linkages": ["Direct connections to past thoughts"],
-  "coaching_questions": ["What would happen if...", "How does this connect to..."]
-}}
+{OUTPUT_FORMATS[envelope].strip()}
 
 CURRENT USER INPUT: "{user_input}"
 
@@ -140,27 +260,62 @@ Respond as a sophisticated cognitive partner who knows the user's thinking histo
 """
     return prompt.strip()
 
-def call_model(messages: list) -> str:
+def openai_output_params(choice: ModelChoice) -> Dict[str, Any]:
+    # Reasoning models (gpt-5, o-series) take max_completion_tokens and reject temperature/stop
+    if choice.model.startswith(REASONING_MODEL_PREFIXES):
+        return {"max_completion_tokens": choice.profile.max_tokens}
+    return {"temperature": 0.7, "max_tokens": choice.profile.max_tokens, "stop": list(choice.profile.stop)}
+
+def structured_params(choice: ModelChoice) -> Dict[str, Any]:
+    # Envelopes that ask for organized JSON get schema/JSON-mode output where the provider supports it
+    schema = ENVELOPE_SCHEMAS.get(choice.profile.envelope)
+    return structured_output_params(choice.provider, choice.model, schema) if schema else {}
+
+def call_model(messages: list, choice: ModelChoice, timeout: float = None) -> str:
+    # `timeout` bounds both the rate-limiter queue and the provider request
+    max_wait = timeout if timeout is not None else RATE_LIMIT_MAX_WAIT
+    profile = choice.profile
     try:
-        if MODEL == "gpt-4" and openai_client:
-            response = openai_client.chat.completions.create(
-                model="gpt-4",
-                messages=messages,
-                temperature=0.7
-            )
+        if choice.provider == "openai" and openai_client:
+            client = openai_client.with_options(timeout=timeout) if timeout is not None else openai_client
+            response = guarded("openai_chat", lambda: rate_limited(
+                "openai", choice.model, estimate_tokens(messages, profile.max_tokens),
+                lambda: client.chat.completions.create(
+                    model=choice.model,
+                    messages=messages,
+                    **openai_output_params(choice),
+                    **structured_params(choice)
+                ),
+                max_wait
+            ))
             return response.choices[0].message.content
 
-        elif MODEL == "deepseek-chat" and DEEPSEEK_API_KEY:
+        elif choice.provider == "deepseek" and DEEPSEEK_API_KEY:
             headers = {
                 "Authorization": f"Bearer {DEEPSEEK_API_KEY}",
                 "Content-Type": "application/json"
             }
             body = {
-                "model": "deepseek-chat",
+                "model": choice.model,
                 "messages": messages,
-                "temperature": 0.7
+                "temperature": 0.7,
+                "max_tokens": profile.max_tokens,
+                "stop": list(profile.stop),
+                **structured_params(choice)
             }
-            res = requests.post("https://api.deepseek.com/v1/chat/completions", json=body, headers=headers)
+
+            def post():
+                res = requests.post("https://api.deepseek.com/v1/chat/completions", json=body, headers=headers,
+                                    timeout=timeout)
+                if res.status_code == 429:
+                    raise ProviderRateLimited(retry_after_header(res.headers))
+                return res
+
+            res = guarded(
+                "deepseek_chat",
+                lambda: rate_limited("deepseek", choice.model, estimate_tokens(messages, profile.max_tokens), post, max_wait),
+                is_failure=lambda res: res.status_code >= 500
+            )
             if res.status_code == 200:
                 return res.json()['choices'][0]['message']['content']
             else:
@@ -170,61 +325,167 @@ def call_model(messages: list) -> str:
     except Exception as e:
         return f"Error calling model: {str(e)}"
 
-def store_conversation_memory(user_id: str, user_input: str, ai_response: str):
-    """Store conversation in vector database for future context"""
-    if not index or not openai_client:
-        return
+def store_conversation_memory(user_id: str, user_input: str, ai_response: str, timeout: float = None) -> Optional[str]:
+    """Store conversation in vector database for future context; the memory's vector id, or None if nothing was stored"""
+    if not openai_client:
+        return None
     
     try:
         # Create embedding for the conversation exchange
         text_to_embed = f"User: {user_input}\nDotSpark: {ai_response}"
         
-        embedding_response = openai_client.embeddings.create(
-            input=text_to_embed,
-            model="text-embedding-ada-002"
-        )
+        # Long exchanges are embedded as sentence-aware chunks in parallel batches;
+        # the memory's own vector is then the mean of its chunk vectors
+        chunked = embed_chunked(openai_client, text_to_embed, "text-embedding-ada-002", timeout=timeout)
+        values = chunked.vector
+        vector_id = f"{user_id}_conv_{int(time.time())}"
+        metadata = {
+            "user_input": user_input,
+            "ai_response": ai_response,
+            "timestamp": time.time(),
+            "type": "conversation",
+            "summary": user_input[:200]  # First 200 chars as summary
+        }
+        category = category_from_response(ai_response)
+        if category:
+            metadata["category"] = category
+        # Small Dot/Wheel/Chakra fields for the cognitive profile (and its rebuild job)
+        thought = parse_organized(ai_response)
+        if thought is not None:
+            for field, value in (("pulse", thought.dot and thought.dot.pulse),
+                                 ("wheel", thought.wheel and thought.wheel.heading),
+                                 ("chakra", thought.chakra and thought.chakra.heading)):
+                if isinstance(value, str) and value.strip():
+                    metadata[field] = value.strip()[:80]
+        # The searched vectors only carry the summary and small filterable fields;
+        # the full texts go to the texts namespace (durable) and the local blob cache
+        slim, texts = split_payload(metadata)
+        put_blob(user_id, vector_id, texts)
         
-        # Store in vector database
-        index.upsert(
-            vectors=[{
-                "id": f"{user_id}_conv_{int(time.time())}",
-                "values": embedding_response.data[0].embedding,
-                "metadata": {
-                    "user_input": user_input,
-                    "ai_response": ai_response,
-                    "timestamp": time.time(),
-                    "type": "conversation",
-                    "summary": user_input[:200]  # First 200 chars as summary
-                }
-            }],
-            namespace=user_id
-        )
+        # Store in vector database (while Pinecone's breaker is open the memory
+        # still lands in the local tiers below)
+        if index:
+            try:
+                guarded("pinecone", lambda: index.upsert(
+                    vectors=[{
+                        "id": vector_id,
+                        "values": values,
+                        "metadata": slim
+                    }, *chunk_records(vector_id, chunked, slim)],
+                    namespace=user_id
+                ))
+                bump_generation(user_id)
+                guarded("pinecone", lambda: index.upsert(vectors=[text_record(vector_id, values, texts)],
+                                                         namespace=texts_namespace(user_id)))
+            except CircuitOpenError as e:
+                print(f"Skipping Pinecone upsert: {e}", file=sys.stderr)
+
+        # Keep a local copy in the hot tier for fast recent-context recall
+        remember_hot(user_id, vector_id, values, slim)
+        record_memory(user_id, slim)
+        index_document(user_id, vector_id, metadata)  # BM25 still indexes the full texts
+        update_user_clusters(user_id, [values], [slim])
+        record_profile(user_id, values, slim)
+        record_linkages(user_id, vector_id, metadata["summary"], ai_response)
+        return vector_id
     except Exception as e:
-        print(f"Failed to store conversation memory: {e}")
+        print(f"Failed to store conversation memory: {e}", file=sys.stderr)
+        return None
 
-def run_dotspark_thought_partner(user_id: str, user_input: str, mode: str = "organize") -> Dict[str, Any]:
+def absorb_new_structures(user_id: str):
+    """Fold the Dots/Wheels/Chakras saved through Node since the user's last turn into
+    their clusters and profile, so both stay current without a rebuild"""
+    try:
+        values, metadata = drain_new_structures(user_id, index)
+    except Exception as e:
+        print(f"Failed to absorb new structures: {e}", file=sys.stderr)
+        return
+    for vector, meta in zip(values, metadata):
+        record_profile(user_id, vector, structure_fields(meta))
+
+def run_dotspark_thought_partner(user_id: str, user_input: str, mode: str = "organize",
+                                 session_id: str = None) -> Dict[str, Any]:
     import time
     start_time = time.time()
+    deadline = Deadline()
+    
+    # Immediate history comes from the session window, not from vector search. It is
+    # loaded before routing: a bare "ok" right after a reply may be answering it
+    session = get_session(user_id, session_id) if session_id else None
+
+    # Trivial turns ("hi", "thanks", "what is a wheel?") skip retrieval and the memory write
+    decision = route_turn(user_input, mode, replying=session is not None and session.is_recent())
+    choice = select_model(user_input, mode, decision)
     
     try:
-        # Fetch semantic context using vector search
-        semantic_context = fetch_user_context(user_id, user_input)
-        
-        # Build enhanced prompt with full intelligence layers
-        prompt = build_enhanced_prompt(user_input, semantic_context)
+        followup = session is not None and session.is_followup(user_input)
+
+        semantic_context, pattern_summary, cluster_summary, spark_candidates = [], {}, {}, []
+        # Stable traits come from the cached profile section instead of being re-derived from matches
+        profile_section = load_profile_section(user_id) if decision.route != "canned" else ""
+        if decision.route == "full":
+            # Fetch semantic context using vector search; past its share of the budget
+            # the turn proceeds without context
+            semantic_context = [] if DEGRADED_MODE or followup else deadline.run(
+                "retrieval", lambda: fetch_user_context(user_id, user_input, profile_vector=load_profile_vector(user_id)),
+                deadline.share(RETRIEVAL_BUDGET_SHARE), []
+            )
+            if session is not None:
+                in_window = session.memory_ids()
+                semantic_context = [c for c in semantic_context if c.id not in in_window]
+            pattern_summary = load_pattern_summary(user_id)
+            cluster_summary = load_cluster_summary(user_id)
+            spark_candidates = load_spark_candidates(user_id)
+            # Only the matches the prompt quotes at length read their full texts back
+            hydrate(user_id, [c for c in semantic_context if c.relevance > 0.85 and c.match is None], index)
+            
+            # Build enhanced prompt with full intelligence layers
+            prompt = build_enhanced_prompt(user_input, semantic_context, pattern_summary, cluster_summary,
+                                           spark_candidates, choice.profile.envelope, profile_section)
+        else:
+            # Still the JSON envelope: a short "yes, save it" needs structured output for Node to save
+            prompt = "\n\n".join(part for part in (CHAT_PROMPT, profile_section,
+                                                    OUTPUT_FORMATS[choice.profile.envelope].strip()) if part)
 
         messages = [
             {"role": "system", "content": prompt},
+            *(session.context_messages() if session is not None else []),
             {"role": "user", "content": user_input}
         ]
 
-        # Get AI response using selected model
-        ai_result = call_model(messages)
+        # Get AI response using selected model, within whatever budget is left
+        if decision.route == "canned":
+            ai_result = canned_reply(decision.intent)
+        elif deadline.expired():
+            deadline.degrade("model", "no budget left")
+            ai_result = "I need a moment longer to think this through. Could you send that again?"
+        else:
+            ai_result = call_model(messages, choice, timeout=deadline.timeout())
+            if deadline.expired():
+                deadline.degrade("model", "timed out")
+            elif choice.profile.envelope in ENVELOPE_SCHEMAS:
+                # Repaired/clamped locally and re-serialized, so Node's JSON.parse and the
+                # memory write see well-formed JSON even from a truncated or fenced answer
+                thought = parse_structured(ai_result, source="agent", linkage_field="semantic_linkages")
+                if thought is not None:
+                    ai_result = json.dumps(thought.to_dict())
         
         # Store this conversation for future context
-        store_conversation_memory(user_id, user_input, ai_result)
+        memory_id = None
+        if decision.route == "full" and not DEGRADED_MODE and "model" not in deadline.degraded_stages:
+            if deadline.remaining() < MEMORY_WRITE_MIN_SECONDS:
+                deadline.degrade("memory_write", "no budget left")
+            else:
+                memory_id = store_conversation_memory(user_id, user_input, ai_result, timeout=deadline.timeout())
+                if memory_id is None and deadline.expired():
+                    deadline.degrade("memory_write", "timed out")
+            if deadline.remaining() >= MEMORY_WRITE_MIN_SECONDS:
+                absorb_new_structures(user_id)
+        if session is not None and "model" not in deadline.degraded_stages:
+            record_turn(session, user_input, ai_result, memory_id)
         
         processing_time = time.time() - start_time
+        record_route(decision, processing_time)
         
         # Enhanced response with full intelligence metadata
         response = {
@@ -234,14 +495,36 @@ def run_dotspark_thought_partner(user_id: str, user_input: str, mode: str = "org
             "intelligence_layers": {
                 "vector_database_used": len(semantic_context) > 0,
                 "semantic_matches": len(semantic_context),
-                "context_relevance_scores": [item.get("relevance", 0) for item in semantic_context],
-                "model_used": MODEL,
+                "context_relevance_scores": [item.relevance for item in semantic_context],
+                "hot_tier_matches": len([c for c in semantic_context if c.tier == "hot"]),
+                "lexical_matches": len([c for c in semantic_context if c.match == "lexical"]),
+                "structured_matches": len([c for c in semantic_context if c.lineage]),
+                "linked_matches": len([c for c in semantic_context if c.match == "linked"]),
+                "retrieval_mode": RETRIEVAL_MODE,
+                "query_cache_hit_rate": cache_stats().get("hit_rate", 0.0),
+                "model_used": "canned" if decision.route == "canned" else choice.model,
+                "model_choice": choice.to_dict(),
                 "pinecone_integration": True if index else False,
-                "memory_stored": True
+                "memory_stored": memory_id is not None,
+                "degraded": DEGRADED_MODE,
+                "degraded_stages": deadline.degraded_stages,
+                "circuit_breakers": breaker_states(),
+                "deadline_budget_seconds": deadline.budget,
+                "route": decision.to_dict(),
+                "profile_section_used": bool(profile_section),
+                "session": {
+                    "window_turns": len(session.turns),
+                    "summarized_turns": session.summarized_turns,
+                    "followup_without_retrieval": followup and decision.route == "full"
+                } if session is not None else None
             },
             "context_metadata": {
-                "relevant_thoughts": len([c for c in semantic_context if c.get("relevance", 0) > 0.8]),
-                "pattern_recognition": len(set([c.get("content", {}).get("category") for c in semantic_context if c.get("content", {}).get("category")])),
+                "relevant_thoughts": len([c for c in semantic_context if c.relevance > 0.8]),
+                "pattern_recognition": pattern_summary.get("distinct_categories") or len(set([c.content.category for c in semantic_context if c.content.category])),
+                "patterns_from_history": pattern_summary.get("total_memories", 0),
+                "thought_clusters": len(cluster_summary.get("clusters", [])),
+                "cognitive_gaps": len(cluster_summary.get("gaps", [])),
+                "spark_candidates": len(spark_candidates),
                 "personalization_level": "high" if semantic_context else "low"
             },
             "timestamp": "2025-01-26",
@@ -272,8 +555,9 @@ if __name__ == "__main__":
         mode = sys.argv[1]  # 'chat' or 'organize'
         user_id = sys.argv[2]
         user_input = sys.argv[3]
+        session_id = sys.argv[4] if len(sys.argv) >= 5 else None
         
-        response = run_dotspark_thought_partner(user_id, user_input, mode)
+        response = run_dotspark_thought_partner(user_id, user_input, mode, session_id)
         print(json.dumps(response, indent=2))
     else:
         # Example test
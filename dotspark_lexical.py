@@ -0,0 +1,130 @@
+import os
+import sys
+import re
+import math
+from typing import Any, Dict, List
+
+from dotspark_storage import store_path, read_json, write_json_atomic, file_lock
+from dotspark_vectors import iter_namespace_vectors
+from dotspark_records import Match
+from dotspark_blob_store import BLOB_FIELDS, fetch_texts
+
+# BM25 parameters and fusion constant
+BM25_K1 = 1.2
+BM25_B = 0.75
+RRF_K = 60
+
+# Metadata fields whose text is searchable, and the slim subset kept for prompt rendering
+TEXT_FIELDS = ("summary", "context", "content", "heading", "purpose", "user_input", "ai_response")
+KEPT_FIELDS = ("summary", "type", "category", "timestamp", "wheel_id", "chakra")
+
+_TOKEN = re.compile(r"[a-z0-9][a-z0-9_$.-]*[a-z0-9]|[a-z0-9]")
+_STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "but", "by", "for", "i", "if", "in", "is", "it",
+    "me", "my", "of", "on", "or", "so", "that", "the", "this", "to", "was", "we", "with", "you"
+}
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in _TOKEN.findall((text or "").lower()) if t not in _STOPWORDS]
+
+def _empty_index() -> Dict[str, Any]:
+    return {"docs": {}, "postings": {}, "total_length": 0}
+
+def _remove(lexical_index: Dict[str, Any], doc_id: str):
+    doc = lexical_index["docs"].pop(doc_id, None)
+    if not doc:
+        return
+    lexical_index["total_length"] -= doc["length"]
+    for term in doc["terms"]:
+        postings = lexical_index["postings"].get(term, {})
+        postings.pop(doc_id, None)
+        if not postings:
+            lexical_index["postings"].pop(term, None)
+
+def _add(lexical_index: Dict[str, Any], doc_id: str, metadata: Dict[str, Any]):
+    _remove(lexical_index, doc_id)
+    tokens = tokenize(" ".join(str(metadata.get(f, "")) for f in TEXT_FIELDS))
+    if not tokens:
+        return
+    counts: Dict[str, int] = {}
+    for token in tokens:
+        counts[token] = counts.get(token, 0) + 1
+    for term, tf in counts.items():
+        lexical_index["postings"].setdefault(term, {})[doc_id] = tf
+    lexical_index["docs"][doc_id] = {
+        "length": len(tokens),
+        "terms": list(counts),
+        "metadata": {f: metadata[f] for f in KEPT_FIELDS if metadata.get(f) not in (None, "")}
+    }
+    lexical_index["total_length"] += len(tokens)
+
+def index_document(user_id: str, doc_id: str, metadata: Dict[str, Any]):
+    """Add (or replace) one memory in the user's inverted index"""
+    path = store_path("lexical", user_id, ".json")
+    try:
+        with file_lock(path):
+            lexical_index = read_json(path, None) or _empty_index()
+            _add(lexical_index, doc_id, metadata)
+            write_json_atomic(path, lexical_index)
+    except Exception as e:
+        print(f"Lexical index update failed: {e}", file=sys.stderr)
+
+def lexical_search(user_id: str, query: str, top_k: int = 5) -> List[Dict[str, Any]]:
+    """BM25 ranking over the user's indexed memories; no embeddings involved"""
+    lexical_index = read_json(store_path("lexical", user_id, ".json"), None)
+    if not lexical_index or not lexical_index["docs"]:
+        return []
+    docs = lexical_index["docs"]
+    doc_count = len(docs)
+    avg_length = lexical_index["total_length"] / doc_count
+
+    scores: Dict[str, float] = {}
+    for term in set(tokenize(query)):
+        postings = lexical_index["postings"].get(term)
+        if not postings:
+            continue
+        idf = math.log(1 + (doc_count - len(postings) + 0.5) / (len(postings) + 0.5))
+        for doc_id, tf in postings.items():
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * docs[doc_id]["length"] / avg_length)
+            scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (BM25_K1 + 1) / (tf + norm)
+
+    ranked = sorted(scores.items(), key=lambda kv: -kv[1])[:top_k]
+    return [{"id": doc_id, "score": score, "metadata": docs[doc_id]["metadata"]} for doc_id, score in ranked]
+
+def reciprocal_rank_fusion(ranked_lists: List[List[Match]], top_k: int, k: int = RRF_K) -> List[Match]:
+    """Fuse ranked result lists by summed 1 / (k + rank); an id keeps the match from the first list it appears in"""
+    fused: Dict[str, float] = {}
+    items: Dict[str, Match] = {}
+    for results in ranked_lists:
+        for rank, item in enumerate(results, start=1):
+            fused[item.id] = fused.get(item.id, 0.0) + 1.0 / (k + rank)
+            items.setdefault(item.id, item)
+    order = sorted(fused, key=lambda doc_id: -fused[doc_id])[:top_k]
+    for doc_id in order:
+        items[doc_id].rrf_score = round(fused[doc_id], 5)
+    return [items[doc_id] for doc_id in order]
+
+def rebuild_lexical_index(user_id: str, index, namespace: str = None) -> int:
+    """Batch job: rebuild a user's inverted index from everything stored in Pinecone,
+    with the full texts of slimmed memories read back from their durable copy"""
+    lexical_index = _empty_index()
+    for ids, _, metadata in iter_namespace_vectors(index, namespace or user_id):
+        slimmed = [doc_id for doc_id, meta in zip(ids, metadata) if not any(f in meta for f in BLOB_FIELDS)]
+        texts = fetch_texts(index, user_id, slimmed)
+        for doc_id, meta in zip(ids, metadata):
+            _add(lexical_index, doc_id, {**meta, **texts.get(doc_id, {})})
+    path = store_path("lexical", user_id, ".json")
+    with file_lock(path):
+        write_json_atomic(path, lexical_index)
+    return len(lexical_index["docs"])
+
+# CLI for the rebuild job
+if __name__ == "__main__":
+    if len(sys.argv) < 3 or sys.argv[1] != "rebuild":
+        print("Usage: python dotspark_lexical.py rebuild <user_id> [namespace]")
+        sys.exit(1)
+
+    from pinecone import Pinecone
+    pinecone_index = Pinecone(api_key=os.getenv("PINECONE_API_KEY")).Index("dotspark-vectors")
+    count = rebuild_lexical_index(sys.argv[2], pinecone_index, sys.argv[3] if len(sys.argv) > 3 else None)
+    print(f"Indexed {count} documents for {sys.argv[2]}")
@@ -0,0 +1,196 @@
+import os
+import re
+import sys
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+from dotspark_storage import store_path, file_lock, write_npz_atomic
+from dotspark_structured import parse_organized
+from dotspark_lexical import lexical_search
+from dotspark_records import Match, Memory
+
+# Neighbour expansion configuration
+LINK_HOPS = int(os.getenv("DOTSPARK_LINK_HOPS", "1"))            # 0 disables, max 2
+LINK_EXPANSION_LIMIT = int(os.getenv("DOTSPARK_LINK_EXPANSION_LIMIT", "3"))
+HOP_DECAY = 0.5
+LEXICAL_LINK_MIN_SCORE = 1.5    # BM25 score needed to resolve a free-text linkage to a past memory
+
+LINKAGE_FIELDS = ("suggested_linkages", "semantic_linkages", "linkages")
+# Only the quoted form the organize prompt emits (wheel: 'Heading'); prose such as
+# "this wheel of thought..." falls through to lexical resolution
+_STRUCTURE_REF = re.compile(r"\b(dot|wheel|chakra)\s*:\s*['\"“‘]([^'\"”’]+)['\"”’]", re.IGNORECASE)
+
+def structure_key(kind: str, heading: str) -> str:
+    return f"{kind.lower()}:{heading.strip().lower()}"
+
+class LinkageGraph:
+    """Undirected, weighted dot/wheel/chakra link graph for one user.
+
+    Nodes and edges live in flat numpy arrays (keys, src, dst, weight); a CSR view
+    is built on load so neighbour expansion is a few array slices.
+    """
+
+    def __init__(self, user_id: str):
+        self.path = store_path("links", user_id, ".npz")
+        self.keys: List[str] = []
+        self.labels: List[str] = []
+        self.kinds: List[str] = []
+        self.src = np.zeros(0, dtype=np.int32)
+        self.dst = np.zeros(0, dtype=np.int32)
+        self.weight = np.zeros(0, dtype=np.float32)
+        self._positions: Dict[str, int] = {}
+        self._edges: Dict[Tuple[int, int], int] = {}
+        self._csr = None
+
+    @classmethod
+    def load(cls, user_id: str) -> "LinkageGraph":
+        graph = cls(user_id)
+        if os.path.exists(graph.path):
+            try:
+                with np.load(graph.path, allow_pickle=False) as data:
+                    graph.keys = [str(k) for k in data["keys"]]
+                    graph.labels = [str(v) for v in data["labels"]]
+                    graph.kinds = [str(v) for v in data["kinds"]]
+                    graph.src = data["src"].astype(np.int32)
+                    graph.dst = data["dst"].astype(np.int32)
+                    graph.weight = data["weight"].astype(np.float32)
+            except Exception as e:
+                print(f"Linkage graph load failed for {user_id}: {e}", file=sys.stderr)
+                return cls(user_id)
+        graph._positions = {key: i for i, key in enumerate(graph.keys)}
+        graph._edges = {(int(a), int(b)): i for i, (a, b) in enumerate(zip(graph.src, graph.dst))}
+        return graph
+
+    def save(self):
+        write_npz_atomic(self.path, keys=np.array(self.keys, dtype=str), labels=np.array(self.labels, dtype=str),
+                         kinds=np.array(self.kinds, dtype=str), src=self.src, dst=self.dst, weight=self.weight)
+
+    def node(self, key: str, kind: str, label: str) -> int:
+        position = self._positions.get(key)
+        if position is None:
+            position = len(self.keys)
+            self.keys.append(key)
+            self.labels.append(label[:200])
+            self.kinds.append(kind)
+            self._positions[key] = position
+        elif label and not self.labels[position]:
+            self.labels[position] = label[:200]
+        return position
+
+    def link(self, a: int, b: int, weight: float = 1.0):
+        if a == b:
+            return
+        pair = (min(a, b), max(a, b))
+        edge = self._edges.get(pair)
+        if edge is None:
+            self._edges[pair] = len(self.src)
+            self.src = np.append(self.src, np.int32(pair[0]))
+            self.dst = np.append(self.dst, np.int32(pair[1]))
+            self.weight = np.append(self.weight, np.float32(weight))
+        else:
+            self.weight[edge] += weight
+        self._csr = None
+
+    def _adjacency(self):
+        if self._csr is None:
+            sources = np.concatenate([self.src, self.dst])
+            order = np.argsort(sources, kind="stable")
+            targets = np.concatenate([self.dst, self.src])[order]
+            weights = np.concatenate([self.weight, self.weight])[order]
+            indptr = np.searchsorted(sources[order], np.arange(len(self.keys) + 1))
+            self._csr = (indptr, targets, weights)
+        return self._csr
+
+    def expand(self, seed_keys: List[str], hops: int = 1, limit: int = 3) -> List[Dict[str, Any]]:
+        """Best-scoring nodes within `hops` of the seeds (seeds themselves excluded)"""
+        seeds = np.array([self._positions[k] for k in seed_keys if k in self._positions], dtype=np.int64)
+        if seeds.size == 0 or len(self.src) == 0 or hops <= 0:
+            return []
+        indptr, targets, weights = self._adjacency()
+        scores = np.zeros(len(self.keys), dtype=np.float32)
+        reached_at = np.full(len(self.keys), -1, dtype=np.int64)
+        visited = np.zeros(len(self.keys), dtype=bool)
+        visited[seeds] = True
+        frontier = seeds
+        for hop in range(1, min(hops, 2) + 1):
+            if frontier.size == 0:
+                break
+            spans = [np.arange(indptr[n], indptr[n + 1]) for n in frontier]
+            edges = np.concatenate(spans) if spans else np.zeros(0, dtype=np.int64)
+            np.add.at(scores, targets[edges], weights[edges] * HOP_DECAY ** (hop - 1))
+            reached = np.unique(targets[edges])
+            fresh = reached[~visited[reached]]
+            reached_at[fresh] = hop
+            visited[fresh] = True
+            frontier = fresh
+        candidates = np.flatnonzero(reached_at > 0)
+        best = candidates[np.argsort(-scores[candidates], kind="stable")][:limit]
+        return [{
+            "id": self.keys[i],
+            "kind": self.kinds[i],
+            "label": self.labels[i],
+            "score": float(scores[i]),
+            "hops": int(reached_at[i])
+        } for i in best]
+
+def _linkage_targets(user_id: str, memory_id: str, parsed: Dict[str, Any]) -> List[Tuple[str, str, str]]:
+    """(key, kind, label) nodes a structured response links the new memory to"""
+    targets = []
+    for field in LINKAGE_FIELDS:
+        for text in parsed.get(field) or []:
+            if not isinstance(text, str) or not text.strip():
+                continue
+            reference = _STRUCTURE_REF.search(text)
+            if reference and reference.group(2).strip():
+                kind, heading = reference.group(1).lower(), reference.group(2).strip()
+                targets.append((structure_key(kind, heading), kind, heading))
+                continue
+            # Free-text linkage ("relates to your thought about...") -> closest past memory
+            for hit in lexical_search(user_id, text, 2):
+                if hit["id"] != memory_id and hit["score"] >= LEXICAL_LINK_MIN_SCORE:
+                    targets.append((hit["id"], hit["metadata"].get("type", "memory"), hit["metadata"].get("summary", "")))
+                    break
+    return targets
+
+def record_linkages(user_id: str, memory_id: str, summary: str, ai_response: str):
+    """Extract links from a structured model response and add them to the user's graph"""
+    thought = parse_organized(ai_response)
+    if thought is None:
+        return
+    try:
+        with file_lock(store_path("links", user_id, ".npz")):
+            graph = LinkageGraph.load(user_id)
+            memory = graph.node(memory_id, "memory", summary)
+
+            # Hierarchy implied by the response itself: memory -> wheel -> chakra
+            wheel_heading = thought.wheel.heading if thought.wheel else None
+            chakra_heading = thought.chakra.heading if thought.chakra else None
+            wheel_node = chakra_node = None
+            if isinstance(wheel_heading, str) and wheel_heading:
+                wheel_node = graph.node(structure_key("wheel", wheel_heading), "wheel", wheel_heading)
+                graph.link(memory, wheel_node)
+            if isinstance(chakra_heading, str) and chakra_heading:
+                chakra_node = graph.node(structure_key("chakra", chakra_heading), "chakra", chakra_heading)
+                graph.link(wheel_node if wheel_node is not None else memory, chakra_node)
+
+            for key, kind, label in _linkage_targets(user_id, memory_id, thought.extra or {}):
+                graph.link(memory, graph.node(key, kind, label))
+            graph.save()
+    except Exception as e:
+        print(f"Linkage graph update failed: {e}", file=sys.stderr)
+
+def expand_context(user_id: str, context: List[Match], hops: int = LINK_HOPS,
+                   limit: int = LINK_EXPANSION_LIMIT) -> List[Match]:
+    """Context items for graph neighbours of retrieved results (no extra vector queries)"""
+    if hops <= 0 or not context:
+        return []
+    seen = {item.id for item in context}
+    neighbours = LinkageGraph.load(user_id).expand([item.id for item in context if item.id], hops, limit + len(seen))
+    return [Match(n["id"], Memory(n["label"], n["kind"]), type=n["kind"], tier="graph", match="linked", hops=n["hops"])
+            for n in neighbours if n["id"] not in seen][:limit]
+
+def load_linked_pairs(user_id: str) -> List[Tuple[str, str]]:
+    """All linked (key, key) pairs, e.g. to keep the spark job from re-proposing them"""
+    graph = LinkageGraph.load(user_id)
+    return [(graph.keys[a], graph.keys[b]) for a, b in zip(graph.src, graph.dst)]
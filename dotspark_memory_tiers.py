@@ -0,0 +1,138 @@
+import os
+import sys
+import json
+import time
+from typing import Any, Callable, Dict, List
+
+import numpy as np
+
+from dotspark_storage import store_path, file_lock, write_npz_atomic
+from dotspark_vectors import as_unit_matrix, blend_scores, to_epoch
+from dotspark_records import Match, Memory
+
+# Tiering / recency configuration
+HOT_TIER_DAYS = float(os.getenv("DOTSPARK_HOT_TIER_DAYS", "14"))
+HOT_TIER_MAX_ITEMS = int(os.getenv("DOTSPARK_HOT_TIER_MAX_ITEMS", "500"))
+RECENCY_HALF_LIFE_DAYS = float(os.getenv("DOTSPARK_RECENCY_HALF_LIFE_DAYS", "90"))
+RECENCY_WEIGHT = float(os.getenv("DOTSPARK_RECENCY_WEIGHT", "0.3"))
+
+class HotMemoryTier:
+    """Recent memories for one user, kept as a local float32 matrix.
+
+    Everything in the hot tier is also upserted to Pinecone, so eviction only
+    drops the local copy; older memories are served by the remote (cold) index.
+    """
+
+    def __init__(self, user_id: str):
+        self.user_id = user_id
+        self.path = store_path("hot", user_id, ".npz")
+        self.ids: List[str] = []
+        self.vectors = np.zeros((0, 0), dtype=np.float32)
+        self.timestamps = np.zeros(0, dtype=np.float64)
+        self.metadata: List[Memory] = []
+
+    @classmethod
+    def load(cls, user_id: str) -> "HotMemoryTier":
+        tier = cls(user_id)
+        if os.path.exists(tier.path):
+            try:
+                with np.load(tier.path, allow_pickle=False) as data:
+                    tier.ids = [str(i) for i in data["ids"]]
+                    tier.vectors = data["vectors"].astype(np.float32)
+                    tier.timestamps = data["timestamps"].astype(np.float64)
+                    tier.metadata = [Memory.from_metadata(json.loads(m)) for m in data["metadata"]]
+            except Exception as e:
+                print(f"Hot tier load failed for {user_id}: {e}", file=sys.stderr)
+                return cls(user_id)
+        return tier
+
+    def save(self):
+        write_npz_atomic(
+            self.path,
+            ids=np.array(self.ids, dtype=str),
+            vectors=self.vectors,
+            timestamps=self.timestamps,
+            metadata=np.array([json.dumps(m.to_dict()) for m in self.metadata], dtype=str),
+        )
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def add(self, vector_id: str, vector: List[float], metadata: Dict[str, Any], now: float = None):
+        now = time.time() if now is None else now
+        row = as_unit_matrix(vector)
+        if len(self) == 0 or self.vectors.shape[1] != row.shape[1]:
+            self.ids, self.metadata = [], []
+            self.vectors = np.zeros((0, row.shape[1]), dtype=np.float32)
+            self.timestamps = np.zeros(0, dtype=np.float64)
+        self.ids.append(vector_id)
+        self.metadata.append(Memory.from_metadata(metadata))
+        self.vectors = np.vstack([self.vectors, row])
+        self.timestamps = np.append(self.timestamps, to_epoch(metadata.get("timestamp"), now))
+        self.evict(now)
+
+    def evict(self, now: float = None):
+        """Demote memories older than the hot window, then cap the tier size"""
+        now = time.time() if now is None else now
+        keep = self.timestamps >= now - HOT_TIER_DAYS * 86400.0
+        if keep.sum() > HOT_TIER_MAX_ITEMS:
+            newest = np.argsort(self.timestamps)[-HOT_TIER_MAX_ITEMS:]
+            keep = np.zeros_like(keep)
+            keep[newest] = True
+        if keep.all():
+            return
+        idx = np.flatnonzero(keep)
+        self.ids = [self.ids[i] for i in idx]
+        self.metadata = [self.metadata[i] for i in idx]
+        self.vectors = self.vectors[idx]
+        self.timestamps = self.timestamps[idx]
+
+    def search(self, query_vector: List[float], top_k: int) -> List[Match]:
+        if len(self) == 0:
+            return []
+        query = as_unit_matrix(query_vector)[0]
+        if query.shape[0] != self.vectors.shape[1]:
+            return []
+        similarities = self.vectors @ query
+        top = np.argsort(-similarities)[:top_k]
+        return [Match(self.ids[i], self.metadata[i], float(similarities[i]), float(similarities[i]),
+                      self.metadata[i].type or "thought", "hot") for i in top]
+
+def remember_hot(user_id: str, vector_id: str, vector: List[float], metadata: Dict[str, Any]):
+    """Add a freshly written memory to the user's hot tier"""
+    try:
+        with file_lock(store_path("hot", user_id, ".npz")):
+            tier = HotMemoryTier.load(user_id)
+            tier.add(vector_id, vector, metadata)
+            tier.save()
+    except Exception as e:
+        print(f"Hot tier write failed: {e}", file=sys.stderr)
+
+def rank_by_recency(matches: List[Match], min_similarity: float, top_k: int,
+                    now: float = None) -> List[Match]:
+    """Gate on raw similarity, then order by similarity blended with recency decay
+    (`relevance` keeps the raw similarity, `score` is set to the blended one)"""
+    if not matches:
+        return []
+    now = time.time() if now is None else now
+    similarities = np.array([m.relevance for m in matches], dtype=np.float64)
+    timestamps = np.array([to_epoch(m.content.timestamp, now) for m in matches])
+    blended = blend_scores(similarities, timestamps, RECENCY_WEIGHT, RECENCY_HALF_LIFE_DAYS, now)
+    order = [i for i in np.argsort(-blended) if similarities[i] > min_similarity][:top_k]
+    for i in order:
+        matches[i].score = float(blended[i])
+    return [matches[i] for i in order]
+
+def tiered_search(user_id: str, query_vector: List[float], remote_query: Callable[[], List[Dict[str, Any]]],
+                  top_k: int = 5, min_similarity: float = 0.7) -> List[Match]:
+    """Serve from the hot tier when it has enough confident matches, else merge in the remote index"""
+    hot_matches = HotMemoryTier.load(user_id).search(query_vector, top_k)
+    confident = [m for m in hot_matches if m.relevance > min_similarity]
+    if len(confident) >= top_k:
+        return rank_by_recency(hot_matches, min_similarity, top_k)
+
+    candidates = {m.id: m for m in hot_matches}
+    for match in remote_query() or []:
+        if match["id"] not in candidates:
+            candidates[match["id"]] = Match.from_metadata(match["id"], match.get("metadata") or {}, float(match["score"]))
+    return rank_by_recency(list(candidates.values()), min_similarity, top_k)
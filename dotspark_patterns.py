@@ -0,0 +1,116 @@
+import re
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from dotspark_storage import store_path, read_json, write_json_atomic, file_lock
+from dotspark_vectors import to_epoch
+from dotspark_structured import extract_json_object
+
+MAX_THEMES = 300          # distinct theme terms kept per user
+MAX_MONTHS = 24           # monthly trend buckets kept per user
+TREND_WINDOW_MONTHS = 3   # recent window compared against the window before it
+
+_WORD = re.compile(r"[a-z][a-z'-]{3,}")
+_STOPWORDS = {
+    "about", "after", "again", "also", "been", "being", "could", "does", "doing", "from",
+    "have", "having", "into", "just", "like", "more", "most", "much", "need", "only",
+    "other", "really", "should", "some", "something", "than", "that", "their", "them",
+    "then", "there", "these", "they", "thing", "things", "think", "thinking", "this",
+    "those", "through", "very", "want", "what", "when", "where", "which", "while", "will",
+    "with", "would", "your", "yours", "because", "feel", "feeling", "were", "dotspark"
+}
+
+def _empty_index() -> Dict[str, Any]:
+    return {"total": 0, "categories": {}, "themes": {}, "months": {}, "summary": {}, "updated_at": 0}
+
+def month_key(timestamp: float) -> str:
+    return datetime.fromtimestamp(timestamp, tz=timezone.utc).strftime("%Y-%m")
+
+def extract_themes(text: str) -> List[str]:
+    return sorted({w for w in _WORD.findall((text or "").lower()) if w not in _STOPWORDS})
+
+def category_from_response(ai_response: str) -> Optional[str]:
+    """Pick the wheel (or chakra) heading out of a structured Dot/Wheel/Chakra response"""
+    parsed = extract_json_object(ai_response)
+    if not parsed:
+        return None
+    for layer in ("wheel", "chakra"):
+        section = parsed.get(layer)
+        if isinstance(section, dict) and section.get("heading"):
+            return str(section["heading"]).strip()[:80]
+    return None
+
+def trend_label(months: Dict[str, Dict[str, int]], category: str, now_key: str) -> str:
+    ordered = sorted(k for k in months if k <= now_key)
+    recent = ordered[-TREND_WINDOW_MONTHS:]
+    earlier = ordered[-2 * TREND_WINDOW_MONTHS:-TREND_WINDOW_MONTHS]
+    recent_count = sum(months[k].get(category, 0) for k in recent)
+    earlier_count = sum(months[k].get(category, 0) for k in earlier)
+    if earlier_count == 0:
+        return "emerging" if recent_count else "dormant"
+    if recent_count >= earlier_count * 1.25:
+        return "increasing"
+    if recent_count <= earlier_count * 0.75:
+        return "declining"
+    return "steady"
+
+def _summarize(pattern_index: Dict[str, Any], now: float) -> Dict[str, Any]:
+    categories = sorted(pattern_index["categories"].items(), key=lambda kv: -kv[1])[:5]
+    themes = sorted(pattern_index["themes"].items(), key=lambda kv: -kv[1])
+    now_key = month_key(now)
+    return {
+        "total_memories": pattern_index["total"],
+        "distinct_categories": len(pattern_index["categories"]),
+        "top_categories": [{"category": c, "count": n} for c, n in categories],
+        "recurring_themes": [t for t, n in themes if n > 1][:8],
+        "trends": {c: trend_label(pattern_index["months"], c, now_key) for c, _ in categories}
+    }
+
+def record_memory(user_id: str, metadata: Dict[str, Any]):
+    """Fold one memory write into the user's pattern index and refresh its cached summary"""
+    path = store_path("patterns", user_id, ".json")
+    try:
+        with file_lock(path):
+            pattern_index = read_json(path, None) or _empty_index()
+            now = time.time()
+            timestamp = to_epoch(metadata.get("timestamp"), now)
+            category = metadata.get("category")
+
+            pattern_index["total"] += 1
+            if category:
+                pattern_index["categories"][category] = pattern_index["categories"].get(category, 0) + 1
+                month = pattern_index["months"].setdefault(month_key(timestamp), {})
+                month[category] = month.get(category, 0) + 1
+                for stale in sorted(pattern_index["months"])[:-MAX_MONTHS]:
+                    del pattern_index["months"][stale]
+
+            themes = pattern_index["themes"]
+            for term in extract_themes(metadata.get("summary", "")):
+                themes[term] = themes.get(term, 0) + 1
+            if len(themes) > 2 * MAX_THEMES:
+                pattern_index["themes"] = dict(sorted(themes.items(), key=lambda kv: -kv[1])[:MAX_THEMES])
+
+            pattern_index["updated_at"] = now
+            pattern_index["summary"] = _summarize(pattern_index, now)
+            write_json_atomic(path, pattern_index)
+    except Exception as e:
+        print(f"Pattern index update failed: {e}", file=sys.stderr)
+
+def load_pattern_summary(user_id: str) -> Dict[str, Any]:
+    """Precomputed whole-history patterns for a user (empty dict if none recorded yet)"""
+    return (read_json(store_path("patterns", user_id, ".json"), None) or {}).get("summary", {})
+
+def format_pattern_analysis(summary: Dict[str, Any]) -> str:
+    if not summary or not summary.get("top_categories"):
+        return ""
+    trends = summary.get("trends", {})
+    categories = ", ".join(
+        f"{c['category']} ({c['count']}x, {trends.get(c['category'], 'steady')})"
+        for c in summary["top_categories"][:3]
+    )
+    analysis = f"DETECTED PATTERNS: Across {summary['total_memories']} saved thoughts, user frequently thinks about {categories}"
+    if summary.get("recurring_themes"):
+        analysis += f"\nRECURRING THEMES: {', '.join(summary['recurring_themes'])}"
+    return analysis
@@ -0,0 +1,171 @@
+import os
+import sys
+import json
+import time
+from typing import Any, Dict, Optional, Sequence
+
+import numpy as np
+
+from dotspark_storage import store_path, read_json, write_json_atomic, file_lock, read_stats, record_stats
+from dotspark_vectors import (as_unit_matrix, iter_namespace_vectors, iter_user_structure_vectors, to_epoch,
+                              STRUCTURE_NAMESPACE)
+
+# Per-user cognitive profile: stable traits (core chakras, active wheels, recurring
+# pulses) folded in one memory at a time, a pre-rendered prompt section, and a
+# profile embedding (running mean of the user's memory vectors).
+PROFILE_MIN_MEMORIES = int(os.getenv("DOTSPARK_PROFILE_MIN_MEMORIES", "10"))     # before this, no section/gate
+PROFILE_MIN_SIMILARITY = float(os.getenv("DOTSPARK_PROFILE_MIN_SIMILARITY", "0.70"))  # off-profile: skip the cold tier
+ACTIVE_WHEEL_DAYS = float(os.getenv("DOTSPARK_ACTIVE_WHEEL_DAYS", "30"))
+PROFILE_TOP = 3
+MAX_TRAITS = 100          # distinct headings/pulses kept per kind
+
+def _empty_profile() -> Dict[str, Any]:
+    return {"memories": 0, "chakras": {}, "wheels": {}, "pulses": {}, "section": "", "updated_at": 0}
+
+def _vector_path(user_id: str) -> str:
+    return store_path("profiles", user_id, ".npy")
+
+def _bump(traits: Dict[str, Dict[str, float]], name: Any, timestamp: float):
+    if not isinstance(name, str) or not name.strip():
+        return
+    name = name.strip()[:80]
+    trait = traits.setdefault(name, {"count": 0, "last": 0.0})
+    trait["count"] += 1
+    trait["last"] = max(trait["last"], timestamp)
+    if len(traits) > 2 * MAX_TRAITS:
+        for stale in sorted(traits, key=lambda k: (traits[k]["count"], traits[k]["last"]))[:len(traits) - MAX_TRAITS]:
+            del traits[stale]
+
+def render_section(profile: Dict[str, Any], now: float = None) -> str:
+    """Compact prompt section; rendered once per profile update, not per turn"""
+    now = time.time() if now is None else now
+    chakras = sorted(profile["chakras"].items(), key=lambda kv: -kv[1]["count"])[:PROFILE_TOP]
+    active = [kv for kv in profile["wheels"].items() if kv[1]["last"] >= now - ACTIVE_WHEEL_DAYS * 86400.0]
+    wheels = sorted(active, key=lambda kv: (-kv[1]["count"], -kv[1]["last"]))[:PROFILE_TOP]
+    pulses = sorted(profile["pulses"].items(), key=lambda kv: -kv[1]["count"])[:PROFILE_TOP]
+    lines = [f"COGNITIVE PROFILE ({profile['memories']} saved thoughts):"]
+    if chakras:
+        lines.append("- Core purposes: " + ", ".join(f"{name} ({t['count']}x)" for name, t in chakras))
+    if wheels:
+        lines.append("- Active goals: " + ", ".join(f"{name} ({t['count']}x)" for name, t in wheels))
+    if pulses:
+        lines.append("- Recurring pulses: " + ", ".join(name for name, _ in pulses))
+    return "\n".join(lines) if len(lines) > 1 else ""
+
+def _fold(profile: Dict[str, Any], metadata: Dict[str, Any], now: float):
+    timestamp = to_epoch(metadata.get("timestamp"), now)
+    profile["memories"] += 1
+    _bump(profile["chakras"], metadata.get("chakra"), timestamp)
+    _bump(profile["wheels"], metadata.get("wheel"), timestamp)
+    pulse = metadata.get("pulse")
+    _bump(profile["pulses"], pulse.lower() if isinstance(pulse, str) else None, timestamp)
+
+def structure_fields(metadata: Dict[str, Any]) -> Dict[str, Any]:
+    """Profile fields of a Dot/Wheel/Chakra vector saved by Node (contentType + heading/pulse)"""
+    kind = metadata.get("contentType")
+    fields = {"timestamp": metadata.get("createdAt")}
+    if kind == "dot":
+        fields["pulse"] = metadata.get("pulse")
+    elif kind in ("wheel", "chakra"):
+        fields[kind] = metadata.get("heading")
+    return fields
+
+def _save_vector(user_id: str, vector: np.ndarray):
+    path = _vector_path(user_id)
+    tmp_path = f"{path}.tmp.npy"
+    np.save(tmp_path, vector.astype(np.float32))
+    os.replace(tmp_path, path)
+
+def record_profile(user_id: str, vector: Sequence[float], metadata: Dict[str, Any]):
+    """Fold one memory (its embedding and Dot/Wheel/Chakra fields) into the user's profile"""
+    path = store_path("profiles", user_id, ".json")
+    try:
+        with file_lock(path):
+            profile = read_json(path, None) or _empty_profile()
+            now = time.time()
+            _fold(profile, metadata, now)
+            row = as_unit_matrix(vector)[0]
+            current = _load_vector(user_id)
+            if current is None or current.shape != row.shape:
+                current = np.zeros_like(row)
+            # Running mean of unit vectors, independent of write order
+            _save_vector(user_id, current + (row - current) / profile["memories"])
+            profile["section"] = render_section(profile, now)
+            profile["updated_at"] = now
+            write_json_atomic(path, profile)
+    except Exception as e:
+        print(f"Profile update failed: {e}", file=sys.stderr)
+
+def _load_vector(user_id: str) -> Optional[np.ndarray]:
+    try:
+        return np.load(_vector_path(user_id))
+    except (FileNotFoundError, ValueError, OSError):
+        return None
+
+def _mature(user_id: str) -> Optional[Dict[str, Any]]:
+    profile = read_json(store_path("profiles", user_id, ".json"), None)
+    return profile if profile and profile["memories"] >= PROFILE_MIN_MEMORIES else None
+
+def load_profile_section(user_id: str) -> str:
+    profile = _mature(user_id)
+    return profile["section"] if profile else ""
+
+def load_profile_vector(user_id: str) -> Optional[np.ndarray]:
+    return _load_vector(user_id) if _mature(user_id) else None
+
+def profile_allows_remote(profile_vector: Optional[np.ndarray], query_vector: Sequence[float]) -> bool:
+    """Retrieval pre-filter: a query far from everything the user has thought about
+    is answered from local tiers only, without the remote (cold) vector query"""
+    if profile_vector is None:
+        return True
+    query = as_unit_matrix(query_vector)[0]
+    if query.shape != profile_vector.shape:
+        return True
+    norm = float(np.linalg.norm(profile_vector))
+    similarity = float(query @ profile_vector) / norm if norm else 0.0
+    allowed = similarity >= PROFILE_MIN_SIMILARITY
+    record_stats("profiles", gated_queries=1, remote_skipped=0 if allowed else 1)
+    return allowed
+
+def rebuild_profile(user_id: str, index, namespace: str = None,
+                    structure_namespace: str = STRUCTURE_NAMESPACE) -> int:
+    """Batch job: rebuild a user's profile from the memories stored in Pinecone, plus
+    the Dots, Wheels and Chakras Node saved to the shared structure namespace"""
+    profile = _empty_profile()
+    now = time.time()
+    total: Optional[np.ndarray] = None
+    sources = ((iter_namespace_vectors(index, namespace or user_id), dict),
+               (iter_user_structure_vectors(index, user_id, structure_namespace), structure_fields))
+    for batches, fields in sources:
+        for _, values, metadata in batches:
+            for vector, meta in zip(values, metadata):
+                _fold(profile, fields(meta), now)
+                row = as_unit_matrix(vector)[0]
+                total = row if total is None else total + row
+    path = store_path("profiles", user_id, ".json")
+    with file_lock(path):
+        if total is not None:
+            _save_vector(user_id, total / profile["memories"])
+        profile["section"] = render_section(profile, now)
+        profile["updated_at"] = now
+        write_json_atomic(path, profile)
+    return profile["memories"]
+
+def profile_stats() -> Dict[str, Any]:
+    stats = read_stats("profiles")
+    gated = stats.get("gated_queries", 0)
+    stats["remote_skip_rate"] = round(stats.get("remote_skipped", 0) / gated, 4) if gated else 0.0
+    return stats
+
+# CLI for the rebuild job and gate metrics
+if __name__ == "__main__":
+    if len(sys.argv) >= 3 and sys.argv[1] == "rebuild":
+        from pinecone import Pinecone
+        pinecone_index = Pinecone(api_key=os.getenv("PINECONE_API_KEY")).Index("dotspark-vectors")
+        count = rebuild_profile(sys.argv[2], pinecone_index, sys.argv[3] if len(sys.argv) > 3 else None)
+        print(f"Profiled {count} memories for {sys.argv[2]}")
+    elif len(sys.argv) == 1:
+        print(json.dumps(profile_stats(), indent=2))
+    else:
+        print("Usage: python dotspark_profile.py [rebuild <user_id> [namespace]]")
+        sys.exit(1)
@@ -0,0 +1,149 @@
+import os
+import sys
+import json
+import time
+import hashlib
+from typing import Any, Callable, Dict, Optional, Sequence
+
+import numpy as np
+
+from dotspark_storage import store_path, read_json, write_json_atomic, write_npz_atomic, file_lock, read_stats, record_stats
+from dotspark_vectors import as_unit_matrix
+
+# Result cache configuration
+CACHE_ENABLED = os.getenv("DOTSPARK_QUERY_CACHE", "1") != "0"
+CACHE_MAX_ENTRIES = int(os.getenv("DOTSPARK_QUERY_CACHE_MAX_ENTRIES", "64"))   # per namespace
+CACHE_SIMILARITY = float(os.getenv("DOTSPARK_QUERY_CACHE_SIMILARITY", "0.985"))
+
+# === Namespace generations ===
+# Every upsert into a namespace (conversation memory here, dot saves in
+# server/vector-db.ts) replaces its generation token; cached results recorded
+# under an older token are never served again.
+
+def current_generation(namespace: str) -> int:
+    return int(read_json(store_path("generations", namespace, ".json"), {}).get("generation", 0))
+
+def bump_generation(namespace: str):
+    try:
+        write_json_atomic(store_path("generations", namespace, ".json"), {"generation": time.time_ns()})
+    except Exception as e:
+        print(f"Generation bump failed: {e}", file=sys.stderr)
+
+# === Quantized query cache ===
+
+def quantize(query_vector: Sequence[float]) -> np.ndarray:
+    """int8 copy of the unit query vector; consecutive similar turns land on (nearly) the same code"""
+    return np.round(as_unit_matrix(query_vector)[0] * 127).astype(np.int8)
+
+class _CacheFile:
+    def __init__(self, namespace: str):
+        self.path = store_path("query_cache", namespace, ".npz")
+        self.reset()
+
+    def reset(self):
+        self.codes = np.zeros((0, 0), dtype=np.int8)
+        self.keys: list = []
+        self.generations = np.zeros(0, dtype=np.int64)
+        self.last_used = np.zeros(0, dtype=np.float64)
+        self.results: list = []
+
+    def load(self) -> "_CacheFile":
+        if os.path.exists(self.path):
+            try:
+                with np.load(self.path, allow_pickle=False) as data:
+                    self.codes = data["codes"]
+                    self.keys = [str(k) for k in data["keys"]]
+                    self.generations = data["generations"]
+                    self.last_used = data["last_used"]
+                    self.results = [str(r) for r in data["results"]]
+            except Exception as e:
+                print(f"Query cache load failed: {e}", file=sys.stderr)
+                self.reset()
+        return self
+
+    def save(self):
+        write_npz_atomic(self.path, codes=self.codes, keys=np.array(self.keys, dtype=str),
+                         generations=self.generations, last_used=self.last_used,
+                         results=np.array(self.results, dtype=str))
+
+    def find(self, scope: str, code: np.ndarray, generation: int) -> Optional[int]:
+        if not self.keys or self.codes.shape[1] != code.shape[0]:
+            return None
+        exact = f"{scope}:{hashlib.sha1(code.tobytes()).hexdigest()}"
+        live = self.generations == generation
+        for i, key in enumerate(self.keys):
+            if live[i] and key == exact:
+                return i
+        same_scope = live & np.array([k.startswith(f"{scope}:") for k in self.keys])
+        if not same_scope.any():
+            return None
+        codes = self.codes.astype(np.float32)
+        similarity = (codes @ code.astype(np.float32)) / (
+            np.linalg.norm(codes, axis=1) * np.linalg.norm(code.astype(np.float32)) + 1e-9)
+        similarity[~same_scope] = -1.0
+        best = int(similarity.argmax())
+        return best if similarity[best] >= CACHE_SIMILARITY else None
+
+    def put(self, scope: str, code: np.ndarray, generation: int, result: Any) -> int:
+        """Insert an entry, dropping stale generations and the least recently used overflow"""
+        if self.keys and self.codes.shape[1] != code.shape[0]:
+            self.reset()
+        keep = np.flatnonzero(self.generations == generation)
+        evicted = len(self.keys) - len(keep)
+        if len(keep) >= CACHE_MAX_ENTRIES:
+            overflow = len(keep) - CACHE_MAX_ENTRIES + 1
+            keep = keep[np.argsort(self.last_used[keep])[overflow:]]
+            evicted += overflow
+        keep = np.sort(keep)
+        self.keys = [self.keys[i] for i in keep] + [f"{scope}:{hashlib.sha1(code.tobytes()).hexdigest()}"]
+        self.results = [self.results[i] for i in keep] + [json.dumps(result)]
+        self.codes = np.vstack([self.codes[keep].reshape(len(keep), code.shape[0]), code[None, :]])
+        self.generations = np.append(self.generations[keep], generation)
+        self.last_used = np.append(self.last_used[keep], time.time())
+        return evicted
+
+def cache_stats() -> Dict[str, Any]:
+    stats = read_stats("query_cache")
+    lookups = stats.get("hits", 0) + stats.get("misses", 0)
+    stats["hit_rate"] = round(stats.get("hits", 0) / lookups, 4) if lookups else 0.0
+    return stats
+
+def cached_query(namespace: str, scope: str, query_vector: Sequence[float], compute: Callable[[], Any]) -> Any:
+    """Return a cached result for a (near-)identical query against an unchanged namespace, else compute it"""
+    if not CACHE_ENABLED:
+        return compute()
+    code = quantize(query_vector)
+    generation = current_generation(namespace)
+    cache_path = store_path("query_cache", namespace, ".npz")
+
+    try:
+        with file_lock(cache_path):
+            cache = _CacheFile(namespace).load()
+            hit = cache.find(scope, code, generation)
+            if hit is not None:
+                cache.last_used[hit] = time.time()
+                cache.save()
+                result = json.loads(cache.results[hit])
+            else:
+                result = None
+    except Exception as e:
+        print(f"Query cache lookup failed: {e}", file=sys.stderr)
+        hit, result = None, None
+    if hit is not None:
+        record_stats("query_cache", hits=1)
+        return result
+
+    result = compute()
+    try:
+        with file_lock(cache_path):
+            cache = _CacheFile(namespace).load()
+            evicted = cache.put(scope, code, generation, result)
+            cache.save()
+        record_stats("query_cache", misses=1, evictions=evicted)
+    except Exception as e:
+        print(f"Query cache store failed: {e}", file=sys.stderr)
+    return result
+
+# CLI for cache metrics
+if __name__ == "__main__":
+    print(json.dumps(cache_stats(), indent=2))
@@ -0,0 +1,208 @@
+import os
+import sys
+import json
+import time
+import random
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+from dotspark_storage import store_path, read_json, write_json_atomic, file_lock, read_stats, record_stats
+
+# Shared provider quotas (requests / tokens per minute) per provider + model.
+# Every worker process on the host draws from the same bucket files, so a burst
+# of spawned agents is paced instead of turning into 429s.
+RATE_LIMIT_ENABLED = os.getenv("DOTSPARK_RATE_LIMIT", "1") != "0"
+RATE_LIMIT_MAX_WAIT = float(os.getenv("DOTSPARK_RATE_LIMIT_MAX_WAIT", "30"))      # seconds queued before giving up
+RATE_LIMIT_BURST_SECONDS = float(os.getenv("DOTSPARK_RATE_LIMIT_BURST_SECONDS", "10"))
+RATE_LIMIT_RETRIES = int(os.getenv("DOTSPARK_RATE_LIMIT_RETRIES", "3"))
+COMPLETION_TOKEN_RESERVE = int(os.getenv("DOTSPARK_COMPLETION_TOKEN_RESERVE", "800"))  # refunded from real usage
+
+# Priority class of this process (set by the Node scheduler). Lower classes only draw
+# from a bucket while it stays above their headroom fraction, so bulk work backs off
+# as soon as interactive traffic starts consuming the shared budget.
+PRIORITY = os.getenv("DOTSPARK_PRIORITY", "standard")
+PRIORITY_HEADROOM = {
+    "interactive": 0.0,
+    "standard": float(os.getenv("DOTSPARK_STANDARD_HEADROOM", "0.1")),
+    "bulk": float(os.getenv("DOTSPARK_BULK_HEADROOM", "0.5")),
+}
+
+# (requests per minute, tokens per minute); override with DOTSPARK_RATE_LIMIT_<PROVIDER>_<MODEL>="rpm,tpm"
+DEFAULT_LIMITS: Dict[Tuple[str, str], Tuple[int, int]] = {
+    ("openai", "gpt-4"): (500, 10000),
+    ("openai", "gpt-4o-mini"): (5000, 2000000),
+    ("openai", "text-embedding-ada-002"): (3000, 1000000),
+    ("openai", "text-embedding-3-small"): (3000, 1000000),
+    ("deepseek", "deepseek-chat"): (600, 1000000),
+}
+FALLBACK_LIMITS = (500, 200000)
+
+class RateLimitTimeout(Exception):
+    """The shared bucket could not admit the call within RATE_LIMIT_MAX_WAIT"""
+
+    def __init__(self, provider: str, model: str, retry_after: float):
+        super().__init__(f"{provider}/{model} rate limit: retry after {retry_after:.1f}s")
+        self.retry_after = retry_after
+
+class ProviderRateLimited(Exception):
+    """Raised by call sites that talk HTTP directly (DeepSeek) when the provider answers 429"""
+
+    def __init__(self, retry_after: Optional[float] = None):
+        super().__init__("provider returned 429")
+        self.retry_after = retry_after
+
+def limits_for(provider: str, model: str) -> Tuple[int, int]:
+    override = os.getenv(f"DOTSPARK_RATE_LIMIT_{provider}_{model}".upper().replace("-", "_").replace(".", "_"))
+    if override:
+        rpm, tpm = (int(v) for v in override.split(","))
+        return rpm, tpm
+    return DEFAULT_LIMITS.get((provider, model), FALLBACK_LIMITS)
+
+def estimate_tokens(payload: Any, completion_tokens: int = 0) -> int:
+    """Cheap token estimate (~4 chars per token) for prompts, message lists or embedding inputs"""
+    if isinstance(payload, str):
+        text_length = len(payload)
+    elif isinstance(payload, dict):
+        text_length = len(str(payload.get("content", "")))
+    elif isinstance(payload, Iterable):
+        text_length = sum(len(item) if isinstance(item, str) else len(str(item.get("content", ""))) for item in payload)
+    else:
+        text_length = 0
+    return text_length // 4 + 1 + completion_tokens
+
+def _bucket_path(provider: str, model: str) -> str:
+    return store_path("ratelimit", f"{provider}_{model}", ".json")
+
+def _refill(bucket: Dict[str, float], rpm: int, tpm: int, now: float) -> Dict[str, float]:
+    request_capacity = max(1.0, rpm / 60.0 * RATE_LIMIT_BURST_SECONDS)
+    token_capacity = max(1.0, tpm / 60.0 * RATE_LIMIT_BURST_SECONDS)
+    elapsed = max(0.0, now - bucket.get("updated", now))
+    return {
+        "requests": min(request_capacity, bucket.get("requests", request_capacity) + elapsed * rpm / 60.0),
+        "tokens": min(token_capacity, bucket.get("tokens", token_capacity) + elapsed * tpm / 60.0),
+        "updated": now,
+        "request_capacity": request_capacity,
+        "token_capacity": token_capacity,
+        "blocked_until": bucket.get("blocked_until", 0.0),
+    }
+
+def _try_take(provider: str, model: str, tokens: int, priority: str = PRIORITY) -> float:
+    """Take one request + `tokens` from the shared bucket; returns 0.0 on success, else seconds to wait"""
+    rpm, tpm = limits_for(provider, model)
+    headroom = PRIORITY_HEADROOM.get(priority, 0.0)
+    path = _bucket_path(provider, model)
+    with file_lock(path):
+        now = time.time()
+        bucket = _refill(read_json(path, {}), rpm, tpm, now)
+        if bucket.get("blocked_until", 0) > now:
+            return bucket["blocked_until"] - now
+        # A single call larger than the burst capacity waits for a full bucket instead of forever
+        needed = min(float(tokens), bucket["token_capacity"] * (1.0 - headroom))
+        request_floor = 1.0 + headroom * bucket["request_capacity"]
+        token_floor = needed + headroom * bucket["token_capacity"]
+        if bucket["requests"] >= request_floor and bucket["tokens"] >= token_floor:
+            bucket["requests"] -= 1.0
+            bucket["tokens"] -= needed
+            write_json_atomic(path, bucket)
+            return 0.0
+        write_json_atomic(path, bucket)
+    return max((request_floor - bucket["requests"]) * 60.0 / rpm, (token_floor - bucket["tokens"]) * 60.0 / tpm, 0.01)
+
+def acquire(provider: str, model: str, tokens: int, max_wait: float = RATE_LIMIT_MAX_WAIT,
+            priority: str = PRIORITY) -> float:
+    """Block until the call fits the shared RPM/TPM budget; returns seconds spent queued"""
+    if not RATE_LIMIT_ENABLED:
+        return 0.0
+    started = time.time()
+    while True:
+        wait = _try_take(provider, model, tokens, priority)
+        if wait == 0.0:
+            waited = round(time.time() - started, 4)
+            record_stats("ratelimit", f"{provider}/{model}", calls=1, queued_seconds=waited,
+                          **{f"{priority}_calls": 1, f"{priority}_queued_seconds": waited})
+            return waited
+        if time.time() - started + wait > max_wait:
+            record_stats("ratelimit", f"{provider}/{model}", timeouts=1, **{f"{priority}_timeouts": 1})
+            raise RateLimitTimeout(provider, model, wait)
+        # Jitter so processes woken together don't stampede the lock
+        time.sleep(min(wait, 1.0) * random.uniform(1.0, 1.2))
+
+def settle(provider: str, model: str, estimated: int, actual: Optional[int], priority: str = PRIORITY):
+    """Return over-reserved tokens once the provider reports real usage"""
+    if not RATE_LIMIT_ENABLED or not actual or actual >= estimated:
+        return
+    path = _bucket_path(provider, model)
+    try:
+        with file_lock(path):
+            bucket = read_json(path, None)
+            if bucket:
+                capacity = bucket.get("token_capacity", bucket["tokens"])
+                # _try_take caps what it deducts at the burst capacity; never refund more than was taken
+                taken = min(float(estimated), capacity * (1.0 - PRIORITY_HEADROOM.get(priority, 0.0)))
+                if taken > actual:
+                    bucket["tokens"] = min(capacity, bucket["tokens"] + taken - actual)
+                    write_json_atomic(path, bucket)
+    except Exception as e:
+        print(f"Rate limit settle failed: {e}", file=sys.stderr)
+
+def penalize(provider: str, model: str, retry_after: Optional[float]):
+    """Provider said 429: hold every process off this bucket until retry-after"""
+    path = _bucket_path(provider, model)
+    try:
+        with file_lock(path):
+            bucket = read_json(path, {})
+            bucket["requests"] = 0.0
+            bucket["blocked_until"] = max(bucket.get("blocked_until", 0), time.time() + (retry_after or 1.0))
+            write_json_atomic(path, bucket)
+        record_stats("ratelimit", f"{provider}/{model}", provider_429s=1)
+    except Exception as e:
+        print(f"Rate limit penalize failed: {e}", file=sys.stderr)
+
+def retry_after_header(headers: Any) -> Optional[float]:
+    try:
+        value = headers.get("retry-after") if headers is not None else None
+        return float(value) if value else None
+    except (TypeError, ValueError):
+        return None
+
+def _retry_after(error: Exception) -> Optional[float]:
+    if isinstance(error, ProviderRateLimited):
+        return error.retry_after
+    return retry_after_header(getattr(getattr(error, "response", None), "headers", None))
+
+def _is_rate_limited(error: Exception) -> bool:
+    return isinstance(error, ProviderRateLimited) or getattr(error, "status_code", None) == 429
+
+def _usage_tokens(result: Any) -> Optional[int]:
+    """total_tokens from an SDK response object, an HTTP response (DeepSeek via requests)
+    or a raw JSON response body"""
+    if hasattr(result, "status_code") and callable(getattr(result, "json", None)):
+        try:
+            result = result.json()
+        except ValueError:
+            return None
+    if isinstance(result, dict):
+        return (result.get("usage") or {}).get("total_tokens")
+    usage = getattr(result, "usage", None)
+    return getattr(usage, "total_tokens", None) if usage is not None else None
+
+def rate_limited(provider: str, model: str, tokens: int, call: Callable[[], Any],
+                 max_wait: float = RATE_LIMIT_MAX_WAIT) -> Any:
+    """Run a provider call inside the shared budget, retrying 429s after the advertised delay"""
+    for attempt in range(RATE_LIMIT_RETRIES + 1):
+        acquire(provider, model, tokens, max_wait)
+        try:
+            result = call()
+        except Exception as e:
+            if not _is_rate_limited(e) or attempt == RATE_LIMIT_RETRIES:
+                raise
+            penalize(provider, model, _retry_after(e) or 2.0 ** attempt)
+            continue
+        settle(provider, model, tokens, _usage_tokens(result))
+        return result
+
+def rate_limit_stats() -> Dict[str, Any]:
+    return read_stats("ratelimit")
+
+# CLI for limiter metrics
+if __name__ == "__main__":
+    print(json.dumps(rate_limit_stats(), indent=2))
@@ -0,0 +1,83 @@
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+# Slotted records for what retrieval hands around inside one agent process.
+# They replace per-match dict-of-dicts; to_dict() is only called at the JSON
+# edges (stdout, local stores, the query cache).
+
+_MEMORY_FIELDS = ("summary", "type", "category", "timestamp", "user_input", "ai_response")
+_MEMORY_FIELD_SET = frozenset(_MEMORY_FIELDS)
+
+@dataclass(slots=True)
+class Memory:
+    """Metadata of one stored conversation/thought (v2 user namespace)"""
+    summary: str = ""
+    type: Optional[str] = None
+    category: Optional[str] = None
+    timestamp: Any = None
+    user_input: Optional[str] = None       # Only present once hydrated from the blob store
+    ai_response: Optional[str] = None
+    extra: Optional[Dict[str, Any]] = None  # Any other metadata fields, kept verbatim
+
+    @classmethod
+    def from_metadata(cls, metadata: Dict[str, Any]) -> "Memory":
+        get = metadata.get
+        extra = {k: v for k, v in metadata.items() if k not in _MEMORY_FIELD_SET}
+        return cls(get("summary") or "", get("type"), get("category"), get("timestamp"),
+                   get("user_input"), get("ai_response"), extra or None)
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = {field: value for field in _MEMORY_FIELDS if (value := getattr(self, field)) is not None}
+        if self.extra:
+            data.update(self.extra)
+        return data
+
+@dataclass(slots=True)
+class Match:
+    """One retrieved context item: vector, lexical, structure or linkage match"""
+    id: str
+    content: Memory
+    relevance: float = 0.0
+    score: float = 0.0
+    type: str = "thought"
+    tier: str = "cold"
+    match: Optional[str] = None   # 'lexical' / 'linked'; None for similarity matches
+    lineage: Optional[Dict[str, Any]] = None
+    hops: Optional[int] = None
+    rrf_score: Optional[float] = None
+
+    @classmethod
+    def from_metadata(cls, match_id: str, metadata: Dict[str, Any], relevance: float = 0.0,
+                      tier: str = "cold", **fields) -> "Match":
+        content = Memory.from_metadata(metadata)
+        fields.setdefault("type", content.type or "thought")
+        return cls(match_id, content, relevance, fields.pop("score", relevance), tier=tier, **fields)
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = {"id": self.id, "content": self.content.to_dict(), "relevance": self.relevance,
+                "score": self.score, "type": self.type, "tier": self.tier}
+        for field in ("match", "lineage", "hops", "rrf_score"):
+            value = getattr(self, field)
+            if value is not None:
+                data[field] = value
+        return data
+
+@dataclass(slots=True)
+class SavedDot:
+    """A saved dot from the shared index, as shown in core/organize prompts"""
+    summary: str = ""
+    content: str = ""
+    emotion: str = ""
+    wheel: Any = ""
+    chakra: Any = ""
+    timestamp: Any = ""
+
+    @classmethod
+    def from_metadata(cls, metadata: Dict[str, Any]) -> "SavedDot":
+        get = metadata.get
+        return cls(get("summary", ""), get("content", ""), get("emotion", ""),
+                   get("wheel_id", ""), get("chakra", ""), get("timestamp", ""))
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"summary": self.summary, "content": self.content, "emotion": self.emotion,
+                "wheel": self.wheel, "chakra": self.chakra, "timestamp": self.timestamp}
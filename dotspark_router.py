@@ -0,0 +1,187 @@
+import os
+import re
+import json
+import time
+import zlib
+from dataclasses import dataclass
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+from dotspark_storage import read_stats, update_stats
+
+# Local intent routing in front of the thought partner. Trivial turns skip the
+# embeddings call, Pinecone, the large structured prompt and the memory write.
+#   full   - retrieval + structured prompt + memory write (the default)
+#   chat   - short conversational prompt, no retrieval, no memory write
+#   canned - fixed reply, no model call at all
+INTENT_ROUTER_ENABLED = os.getenv("DOTSPARK_INTENT_ROUTER", "1") != "0"
+ROUTER_MIN_MARGIN = float(os.getenv("DOTSPARK_ROUTER_MIN_MARGIN", "0.08"))   # below this the model defers to 'full'
+FULL_MIN_WORDS = 25          # long turns are always treated as reflections
+FEATURE_DIMS = 2 ** 12
+
+ROUTE_OF_INTENT = {
+    "greeting": "canned", "thanks": "canned", "ack": "canned", "farewell": "canned",
+    "answer": "chat", "smalltalk": "chat", "meta": "chat",
+    "reflection": "full",
+}
+
+CANNED_REPLIES = {
+    "greeting": "Hi! What's on your mind? Share a thought and I'll help you connect it to what you've been thinking about.",
+    "thanks": "You're welcome! Whenever the next thought comes up, I'm here.",
+    "ack": "Got it. Share whatever you'd like to explore next.",
+    "farewell": "Take care! Your thoughts will be here when you come back.",
+}
+
+# Whole-message rules, checked before the lexical model
+_RULES: List[Tuple[str, re.Pattern]] = [
+    ("greeting", re.compile(r"^(hi+|hello+|hey+|yo|hiya|howdy|good (morning|afternoon|evening))( there| dotspark)?[!. ]*$")),
+    ("thanks", re.compile(r"^(thanks?( you)?( so much| a lot)?|thx|ty|cheers|much appreciated)[!. ]*$")),
+    ("ack", re.compile(r"^(ok(ay)?|k|cool|nice|great|got it|alright|lol)[!. ]*$")),
+    # Usually the answer to something the assistant just asked: never canned
+    ("answer", re.compile(r"^(yes|yeah|yep|yup|no|nope|nah|sure|right|maybe|exactly|not really|hmm+)[!. ]*$")),
+    ("farewell", re.compile(r"^(bye|goodbye|see (you|ya)|good ?night|later|talk (to you )?later)[!. ]*$")),
+]
+
+# Turns about the user's own thoughts, goals or history need their data: never 'chat'
+_PERSONAL = re.compile(r"\b(i|i'm|i've|i'd|i'll|me|my|mine|myself)\b")
+
+# Seed examples for the lexical model
+_EXAMPLES: Dict[str, List[str]] = {
+    "greeting": ["hi", "hello there", "hey dotspark", "good morning", "hey how's it going"],
+    "thanks": ["thanks", "thank you so much", "thanks that helps", "appreciate it", "great thanks"],
+    "ack": ["ok", "okay cool", "got it", "sounds good", "makes sense", "sure thing"],
+    "farewell": ["bye", "good night", "see you tomorrow", "talk later", "gotta go"],
+    "smalltalk": ["how are you", "how are you doing today", "know any good jokes", "what's up",
+                  "are you a bot", "do you like music"],
+    "meta": ["what can you do", "who are you", "what is dotspark", "how does this work",
+             "what is a dot", "what is a wheel", "what is a chakra", "explain dots wheels and chakras",
+             "how does saving a thought work"],
+    "reflection": ["I've been thinking about switching careers", "I want to build a side business",
+                   "I feel stuck in my job lately", "help me organize my thoughts about moving abroad",
+                   "my goal this year is to get healthier", "why do I keep procrastinating on my project",
+                   "I had an idea for a new app", "what did I say earlier about my startup",
+                   "how does this connect to my previous thoughts", "I'm worried about my relationship",
+                   "I realized I enjoy teaching more than coding", "what is my biggest goal",
+                   "what do you think about my wheel", "what are my chakras", "remind me what I wanted to do"],
+}
+
+_WORD = re.compile(r"[a-z0-9']+")
+
+def _normalize(text: str) -> str:
+    return " ".join((text or "").lower().split())
+
+def featurize(text: str) -> np.ndarray:
+    """Hashed word unigrams + character trigrams, L2-normalized (crc32, so stable across processes)"""
+    vector = np.zeros(FEATURE_DIMS, dtype=np.float32)
+    text = _normalize(text)
+    padded = f" {text} "
+    grams = _WORD.findall(text) + [padded[i:i + 3] for i in range(len(padded) - 2)]
+    for gram in grams:
+        vector[zlib.crc32(gram.encode("utf-8")) % FEATURE_DIMS] += 1.0
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+def _centroids() -> Tuple[List[str], np.ndarray]:
+    intents = list(_EXAMPLES)
+    rows = []
+    for intent in intents:
+        centroid = np.mean([featurize(example) for example in _EXAMPLES[intent]], axis=0)
+        rows.append(centroid / (np.linalg.norm(centroid) or 1.0))
+    return intents, np.vstack(rows)
+
+_INTENTS, _CENTROIDS = _centroids()
+
+@dataclass(slots=True)
+class RouteDecision:
+    route: str
+    intent: str
+    confidence: float
+    source: str          # 'rule', 'model', 'length' or 'default'
+    router_ms: float = 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"route": self.route, "intent": self.intent, "confidence": round(self.confidence, 3),
+                "source": self.source, "router_ms": round(self.router_ms, 3)}
+
+def _classify(text: str) -> RouteDecision:
+    normalized = _normalize(text)
+    if not normalized:
+        return RouteDecision("canned", "ack", 1.0, "rule")
+    if len(normalized.split()) >= FULL_MIN_WORDS:
+        return RouteDecision("full", "reflection", 1.0, "length")
+    stripped = normalized.rstrip("?!. ")
+    for intent, pattern in _RULES:
+        if pattern.match(stripped):
+            return RouteDecision(ROUTE_OF_INTENT[intent], intent, 1.0, "rule")
+    if _PERSONAL.search(stripped):
+        return RouteDecision("full", "reflection", 1.0, "rule")
+    scores = _CENTROIDS @ featurize(normalized)
+    best, runner_up = np.argsort(-scores)[:2]
+    margin = float(scores[best] - scores[runner_up])
+    intent = _INTENTS[best]
+    if margin < ROUTER_MIN_MARGIN:
+        # Unsure: the full pipeline is never wrong, only slower
+        return RouteDecision("full", "reflection", float(scores[best]), "default")
+    return RouteDecision(ROUTE_OF_INTENT[intent], intent, float(scores[best]), "model")
+
+def route_turn(user_input: str, mode: str = "organize", replying: bool = False) -> RouteDecision:
+    """Pick the pipeline for one turn; 'organize' turns that are not trivial always get the full pipeline.
+
+    `replying` means the assistant spoke moments ago in this session, so an
+    acknowledgement ("ok", "cool") may be answering it and goes to the model.
+    """
+    started = time.perf_counter()
+    if not INTENT_ROUTER_ENABLED:
+        decision = RouteDecision("full", "reflection", 1.0, "default")
+    else:
+        decision = _classify(user_input)
+        if replying and decision.intent == "ack":
+            decision.route = "chat"
+        if mode == "organize" and decision.route == "chat":
+            decision.route = "full"
+    decision.router_ms = (time.perf_counter() - started) * 1000
+    return decision
+
+def canned_reply(intent: str) -> str:
+    return CANNED_REPLIES.get(intent, CANNED_REPLIES["ack"])
+
+def record_route(decision: RouteDecision, elapsed_seconds: float):
+    """Count the decision and its turn latency; cheaper routes are credited with the
+    difference to the running average of full-pipeline turns"""
+    elapsed_ms = elapsed_seconds * 1000
+
+    def apply(stats: Dict[str, Any]):
+        routes = stats.setdefault("routes", {})
+        entry = routes.setdefault(decision.route, {"turns": 0, "latency_ms_total": 0.0, "saved_ms_total": 0.0})
+        full = routes.get("full", {})
+        if decision.route != "full" and full.get("turns"):
+            entry["saved_ms_total"] = round(
+                entry["saved_ms_total"] + max(0.0, full["latency_ms_total"] / full["turns"] - elapsed_ms), 3)
+        entry["turns"] += 1
+        entry["latency_ms_total"] = round(entry["latency_ms_total"] + elapsed_ms, 3)
+        intents = stats.setdefault("intents", {})
+        intents[decision.intent] = intents.get(decision.intent, 0) + 1
+        sources = stats.setdefault("sources", {})
+        sources[decision.source] = sources.get(decision.source, 0) + 1
+        stats["router_ms_total"] = round(stats.get("router_ms_total", 0.0) + decision.router_ms, 3)
+    update_stats("router", apply)
+
+def router_stats() -> Dict[str, Any]:
+    stats = read_stats("router")
+    routes = stats.get("routes", {})
+    turns = sum(entry["turns"] for entry in routes.values())
+    for entry in routes.values():
+        entry["share"] = round(entry["turns"] / turns, 4) if turns else 0.0
+        entry["avg_latency_ms"] = round(entry["latency_ms_total"] / entry["turns"], 3) if entry["turns"] else 0.0
+    stats["avg_router_ms"] = round(stats.get("router_ms_total", 0.0) / turns, 4) if turns else 0.0
+    return stats
+
+# CLI: route a message (python dotspark_router.py "thanks!") or print routing metrics
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) > 1:
+        print(json.dumps(route_turn(" ".join(sys.argv[1:]), "chat").to_dict(), indent=2))
+    else:
+        print(json.dumps(router_stats(), indent=2))
@@ -0,0 +1,171 @@
+import os
+import re
+import sys
+import json
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from dotspark_storage import store_path, read_json, write_json_atomic, file_lock, safe_key
+
+# Multi-turn session state. Recent turns are kept verbatim in a rolling window;
+# turns that fall out of it are folded into a running summary every few turns.
+# Sessions live in an in-process LRU and are spilled to DATA_DIR on eviction and
+# after every turn, so the next (separately spawned) agent process picks them up.
+SESSION_WINDOW_TURNS = int(os.getenv("DOTSPARK_SESSION_WINDOW_TURNS", "6"))
+SESSION_SUMMARY_EVERY = int(os.getenv("DOTSPARK_SESSION_SUMMARY_EVERY", "3"))
+SESSION_CACHE_SIZE = int(os.getenv("DOTSPARK_SESSION_CACHE_SIZE", "256"))
+SESSION_SUMMARY_MAX_CHARS = int(os.getenv("DOTSPARK_SESSION_SUMMARY_MAX_CHARS", "1500"))
+FOLLOWUP_MAX_WORDS = int(os.getenv("DOTSPARK_FOLLOWUP_MAX_WORDS", "8"))
+FOLLOWUP_WINDOW_SECONDS = float(os.getenv("DOTSPARK_FOLLOWUP_WINDOW_SECONDS", "900"))
+TURN_EXCERPT_CHARS = 160
+
+# Follow-up signals: a pronoun/connective pointing back at the last exchange. Turns
+# that ask about the user's history ("what did I say about X?") need retrieval even
+# when short, so recall cues override them.
+_ANAPHORA = re.compile(r"^(and|but|so|also|then|why|how come|what about|more)\b|"
+                       r"\b(it|its|that|this|those|these|them|they|there|he|she|him|her)\b")
+_RECALL = re.compile(r"\b(remember|earlier|before|previous(ly)?|last (time|week|month|year)|"
+                     r"did i|have i|i said|i wrote|i mentioned)\b")
+_QUESTION = re.compile(r"\?$|^(what|how|who|where|when|which|can|could|should|would|do|does|is|are)\b")
+
+@dataclass(slots=True)
+class Turn:
+    user: str
+    assistant: str
+    at: float
+    memory_id: Optional[str] = None   # vector id when the turn was also stored as a memory
+
+@dataclass(slots=True)
+class Session:
+    session_id: str
+    user_id: str
+    turns: List[Turn] = field(default_factory=list)
+    summary: str = ""
+    summarized_turns: int = 0
+    updated: float = 0.0
+    dirty: bool = False
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Session":
+        return cls(data["session_id"], data["user_id"], [Turn(**turn) for turn in data.get("turns", [])],
+                   data.get("summary", ""), data.get("summarized_turns", 0), data.get("updated", 0.0))
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"session_id": self.session_id, "user_id": self.user_id,
+                "turns": [{"user": t.user, "assistant": t.assistant, "at": t.at, "memory_id": t.memory_id}
+                          for t in self.turns],
+                "summary": self.summary, "summarized_turns": self.summarized_turns, "updated": self.updated}
+
+    def add_turn(self, user: str, assistant: str, memory_id: Optional[str] = None, now: float = None):
+        now = time.time() if now is None else now
+        self.turns.append(Turn(user, assistant, now, memory_id))
+        self.updated = now
+        self.dirty = True
+        # Fold in batches so the summary changes every few turns, not on every one
+        if len(self.turns) >= SESSION_WINDOW_TURNS + SESSION_SUMMARY_EVERY:
+            folded, self.turns = self.turns[:SESSION_SUMMARY_EVERY], self.turns[SESSION_SUMMARY_EVERY:]
+            self.summary = summarize_turns(self.summary, folded)
+            self.summarized_turns += len(folded)
+
+    def memory_ids(self) -> set:
+        return {t.memory_id for t in self.turns if t.memory_id}
+
+    def is_recent(self, now: float = None) -> bool:
+        """The assistant replied within the follow-up window, so the next turn may be answering it"""
+        now = time.time() if now is None else now
+        return bool(self.turns) and now - self.updated <= FOLLOWUP_WINDOW_SECONDS
+
+    def is_followup(self, user_input: str, now: float = None) -> bool:
+        """Short turn that points back at the last exchange (or answers its question):
+        the window answers it without a vector search"""
+        text = " ".join((user_input or "").lower().split())
+        if not self.is_recent(now) or len(text.split()) > FOLLOWUP_MAX_WORDS or _RECALL.search(text):
+            return False
+        # A new question of its own is not an answer to the assistant's
+        return bool(_ANAPHORA.search(text)) or (not _QUESTION.search(text)
+                                                and _asks_question(self.turns[-1].assistant))
+
+    def context_messages(self) -> List[Dict[str, str]]:
+        """Summary plus the recent window as chat messages, to go between the system prompt and the new turn"""
+        messages = []
+        if self.summary:
+            messages.append({"role": "system", "content": f"EARLIER IN THIS CONVERSATION:\n{self.summary}"})
+        for turn in self.turns:
+            messages.append({"role": "user", "content": turn.user})
+            messages.append({"role": "assistant", "content": turn.assistant})
+        return messages
+
+def _asks_question(reply: str) -> bool:
+    """The assistant ended on a question, or its structured reply carries coaching questions"""
+    reply = (reply or "").strip()
+    if reply.endswith("?"):
+        return True
+    if reply.startswith("{"):
+        try:
+            return bool(json.loads(reply).get("coaching_questions"))
+        except (ValueError, AttributeError):
+            return False
+    return False
+
+def _excerpt(text: str) -> str:
+    text = " ".join((text or "").split())
+    return text if len(text) <= TURN_EXCERPT_CHARS else text[:TURN_EXCERPT_CHARS - 1].rstrip() + "…"
+
+def summarize_turns(summary: str, turns: List[Turn]) -> str:
+    """Extend the running summary with one line per folded turn (local and model-free),
+    dropping the oldest lines past SESSION_SUMMARY_MAX_CHARS"""
+    lines = [line for line in summary.split("\n") if line]
+    lines += [f"- User: {_excerpt(t.user)} | DotSpark: {_excerpt(t.assistant)}" for t in turns]
+    while len(lines) > 1 and sum(len(line) + 1 for line in lines) > SESSION_SUMMARY_MAX_CHARS:
+        lines.pop(0)
+    return "\n".join(lines)
+
+# === In-process LRU with spill to local storage ===
+
+_sessions: "OrderedDict[Tuple[str, str], Session]" = OrderedDict()
+
+def _path(user_id: str, session_id: str) -> str:
+    return store_path(os.path.join("sessions", safe_key(user_id)), session_id, ".json")
+
+def save_session(session: Session):
+    try:
+        write_json_atomic(_path(session.user_id, session.session_id), session.to_dict())
+        session.dirty = False
+    except Exception as e:
+        print(f"Session spill failed for {session.session_id}: {e}", file=sys.stderr)
+
+def _evict():
+    while len(_sessions) > SESSION_CACHE_SIZE:
+        _, session = _sessions.popitem(last=False)
+        if session.dirty:
+            save_session(session)
+
+def get_session(user_id: str, session_id: str) -> Session:
+    """The session from the in-process cache, else from local storage, else a new one"""
+    key = (user_id, session_id)
+    session = _sessions.get(key)
+    if session is not None:
+        _sessions.move_to_end(key)
+        return session
+    data = read_json(_path(user_id, session_id), None)
+    session = Session.from_dict(data) if data else Session(session_id, user_id)
+    _sessions[key] = session
+    _evict()
+    return session
+
+def record_turn(session: Session, user: str, assistant: str, memory_id: Optional[str] = None):
+    """Append a turn and persist it; merges with turns another process wrote meanwhile"""
+    path = _path(session.user_id, session.session_id)
+    try:
+        with file_lock(path):
+            stored = read_json(path, None)
+            if stored and stored.get("updated", 0.0) > session.updated:
+                fresh = Session.from_dict(stored)
+                session.turns, session.summary = fresh.turns, fresh.summary
+                session.summarized_turns, session.updated = fresh.summarized_turns, fresh.updated
+            session.add_turn(user, assistant, memory_id)
+            save_session(session)
+    except Exception as e:
+        print(f"Session update failed for {session.session_id}: {e}", file=sys.stderr)
@@ -0,0 +1,219 @@
+import os
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from dotspark_storage import store_path, read_json, write_json_atomic, file_lock
+from dotspark_vectors import as_unit_matrix, iter_namespace_vectors, iter_user_structure_vectors, STRUCTURE_NAMESPACE
+from dotspark_linkage import structure_key
+
+# Spark (unconnected-but-similar pair) discovery configuration
+SPARK_BLOCK_SIZE = int(os.getenv("DOTSPARK_SPARK_BLOCK_SIZE", "1024"))
+SPARK_TOP_K = int(os.getenv("DOTSPARK_SPARK_TOP_K", "5"))
+SPARK_MIN_SIMILARITY = float(os.getenv("DOTSPARK_SPARK_MIN_SIMILARITY", "0.75"))
+MAX_STORED_SPARKS = 200
+
+def _structure_keys(metadata: List[Dict[str, Any]]) -> Tuple[np.ndarray, np.ndarray]:
+    """Integer-encode each item's own key and its parent key.
+
+    A dot inside wheel 7 gets parent "wheel:7"; the wheel itself owns "wheel:7".
+    Siblings (same parent) and parent/child pairs are already connected and are
+    never proposed as sparks. -1 means "none".
+    """
+    codes: Dict[str, int] = {}
+
+    def encode(key: Optional[str]) -> int:
+        return codes.setdefault(key, len(codes)) if key else -1
+
+    own, parent = [], []
+    for meta in metadata:
+        kind = str(meta.get("contentType") or meta.get("type") or "dot").lower()
+        content_id = meta.get("contentId", meta.get("id"))
+        wheel_id = meta.get("wheel_id", meta.get("wheelId"))
+        chakra_id = meta.get("chakra_id", meta.get("chakraId"))
+        own.append(encode(f"{kind}:{content_id}" if content_id not in (None, "") else None))
+        if kind == "dot" and wheel_id not in (None, ""):
+            parent_key = f"wheel:{wheel_id}"
+        elif kind in ("dot", "wheel") and chakra_id not in (None, ""):
+            parent_key = f"chakra:{chakra_id}"
+        else:
+            parent_key = None
+        parent.append(encode(parent_key))
+    return np.array(own), np.array(parent)
+
+def _bucket_links(links: Iterable[Tuple[int, int]], block_size: int) -> Dict[Tuple[int, int], Tuple[np.ndarray, np.ndarray]]:
+    buckets: Dict[Tuple[int, int], List[Tuple[int, int]]] = {}
+    for a, b in links:
+        i, j = (a, b) if a < b else (b, a)
+        if i != j:
+            buckets.setdefault((i // block_size, j // block_size), []).append((i % block_size, j % block_size))
+    return {key: (np.array([p[0] for p in pairs]), np.array([p[1] for p in pairs])) for key, pairs in buckets.items()}
+
+def _merge_top_k(best_sims: np.ndarray, best_idx: np.ndarray, sims: np.ndarray, offset: int, k: int):
+    """Fold a block of similarities into the running per-row top-k (in place)"""
+    take = min(k, sims.shape[1])
+    if take < sims.shape[1]:
+        cols = np.argpartition(-sims, take - 1, axis=1)[:, :take]
+    else:
+        cols = np.broadcast_to(np.arange(sims.shape[1]), sims.shape)
+    cand_sims = np.concatenate([best_sims, np.take_along_axis(sims, cols, axis=1)], axis=1)
+    cand_idx = np.concatenate([best_idx, cols + offset], axis=1)
+    keep = np.argpartition(-cand_sims, k - 1, axis=1)[:, :k]
+    best_sims[:] = np.take_along_axis(cand_sims, keep, axis=1)
+    best_idx[:] = np.take_along_axis(cand_idx, keep, axis=1)
+
+def blocked_top_k_pairs(vectors, metadata: List[Dict[str, Any]] = None, k: int = SPARK_TOP_K,
+                        block_size: int = SPARK_BLOCK_SIZE, min_similarity: float = SPARK_MIN_SIMILARITY,
+                        linked: Iterable[Tuple[int, int]] = ()) -> List[Tuple[int, int, float]]:
+    """Top-k most similar unlinked partners per item, as unique (i, j, similarity) pairs.
+
+    Only the upper triangle is computed, one block_size x block_size float32
+    tile at a time, so peak memory is O(block_size^2 + n*k) instead of O(n^2).
+    """
+    X = as_unit_matrix(vectors)
+    n = X.shape[0]
+    if n < 2:
+        return []
+    metadata = metadata or [{} for _ in range(n)]
+    own, parent = _structure_keys(metadata)
+    link_buckets = _bucket_links(linked, block_size)
+
+    best_sims = np.full((n, k), -np.inf, dtype=np.float32)
+    best_idx = np.full((n, k), -1, dtype=np.int64)
+
+    for i0 in range(0, n, block_size):
+        i1 = min(i0 + block_size, n)
+        for j0 in range(i0, n, block_size):
+            j1 = min(j0 + block_size, n)
+            sims = X[i0:i1] @ X[j0:j1].T
+
+            # Drop self/duplicate pairs, weak pairs and anything already connected
+            if i0 == j0:
+                sims[np.tril_indices(i1 - i0, m=j1 - j0)] = -np.inf
+            related = (parent[i0:i1, None] == parent[None, j0:j1]) & (parent[i0:i1, None] >= 0)
+            related |= (own[i0:i1, None] == parent[None, j0:j1]) & (own[i0:i1, None] >= 0)
+            related |= (parent[i0:i1, None] == own[None, j0:j1]) & (parent[i0:i1, None] >= 0)
+            sims[related] = -np.inf
+            bucket = link_buckets.get((i0 // block_size, j0 // block_size))
+            if bucket is not None:
+                sims[bucket] = -np.inf
+            sims[sims < min_similarity] = -np.inf
+
+            _merge_top_k(best_sims[i0:i1], best_idx[i0:i1], sims, j0, k)
+            _merge_top_k(best_sims[j0:j1], best_idx[j0:j1], sims.T, i0, k)
+
+    rows, slots = np.nonzero(np.isfinite(best_sims))
+    partners = best_idx[rows, slots]
+    low, high = np.minimum(rows, partners), np.maximum(rows, partners)
+    _, first = np.unique(low * n + high, return_index=True)
+    pairs = [(int(low[f]), int(high[f]), float(best_sims[rows[f], slots[f]])) for f in first]
+    return sorted(pairs, key=lambda p: -p[2])
+
+def _spark_record(ids: List[str], metadata: List[Dict[str, Any]], pair: Tuple[int, int, float]) -> Dict[str, Any]:
+    i, j, similarity = pair
+    return {
+        "source": ids[i],
+        "target": ids[j],
+        "similarity": round(similarity, 4),
+        "source_summary": str(metadata[i].get("summary") or metadata[i].get("content", ""))[:200],
+        "target_summary": str(metadata[j].get("summary") or metadata[j].get("content", ""))[:200],
+        "kinds": [metadata[i].get("contentType") or metadata[i].get("type", "dot"),
+                  metadata[j].get("contentType") or metadata[j].get("type", "dot")]
+    }
+
+def run_spark_job(user_id: str, index, namespace: str = None,
+                  linked_ids: Iterable[Tuple[str, str]] = (),
+                  structure_namespace: str = STRUCTURE_NAMESPACE) -> Dict[str, Any]:
+    """Batch job: find unconnected-but-similar pairs across a user's stored vectors: their
+    Dot/Wheel/Chakra vectors from the shared structure namespace (whose contentId /
+    wheelId / chakraId metadata rules out already-connected pairs) plus their
+    conversation memories"""
+    started = time.time()
+    ids, values, metadata = [], [], []
+    sources = (iter_user_structure_vectors(index, user_id, structure_namespace),
+               iter_namespace_vectors(index, namespace or user_id))
+    for batch_ids, batch_values, batch_meta in (batch for source in sources for batch in source):
+        ids.extend(batch_ids)
+        values.extend(batch_values)
+        metadata.extend(batch_meta)
+
+    # Linkage graph keys are vector ids, or "wheel:<heading>" / "chakra:<heading>"
+    position = {vid: i for i, vid in enumerate(ids)}
+    for i, meta in enumerate(metadata):
+        if meta.get("contentType") in ("wheel", "chakra") and meta.get("heading"):
+            position.setdefault(structure_key(meta["contentType"], str(meta["heading"])), i)
+    linked = [(position[a], position[b]) for a, b in linked_ids if a in position and b in position]
+    pairs = blocked_top_k_pairs(values, metadata, linked=linked)[:MAX_STORED_SPARKS]
+
+    result = {
+        "user_id": user_id,
+        "items_scanned": len(ids),
+        "candidates": [_spark_record(ids, metadata, p) for p in pairs],
+        "generated_at": time.time(),
+        "runtime_seconds": round(time.time() - started, 3)
+    }
+    path = store_path("sparks", user_id, ".json")
+    with file_lock(path):
+        write_json_atomic(path, result)
+    return result
+
+def load_spark_candidates(user_id: str, limit: int = 10) -> List[Dict[str, Any]]:
+    """Precomputed spark candidates for a user, strongest first"""
+    return read_json(store_path("sparks", user_id, ".json"), {}).get("candidates", [])[:limit]
+
+def format_spark_candidates(candidates: List[Dict[str, Any]], limit: int = 3) -> str:
+    if not candidates:
+        return ""
+    lines = [f"- \"{c['source_summary'][:80]}\" <-> \"{c['target_summary'][:80]}\" ({c['similarity']:.2f})"
+             for c in candidates[:limit]]
+    return "UNCONNECTED BUT SIMILAR THOUGHTS (spark candidates):\n" + "\n".join(lines)
+
+def run_benchmark(sizes: List[int], dim: int = 1536, k: int = SPARK_TOP_K):
+    """Compare the blocked engine with a full n x n matmul and a pure-Python pair loop"""
+    rng = np.random.default_rng(42)
+    print(f"{'items':>7} {'python loop':>12} {'full matmul':>12} {'blocked':>10} {'block MB':>9} {'full MB':>9}")
+    for n in sizes:
+        X = as_unit_matrix(rng.standard_normal((n, dim), dtype=np.float32))
+
+        loop_time = "-"
+        if n <= 500:
+            rows = X.tolist()
+            start = time.perf_counter()
+            for a in range(n):
+                for b in range(a + 1, n):
+                    sum(x * y for x, y in zip(rows[a], rows[b]))
+            loop_time = f"{time.perf_counter() - start:.2f}s"
+
+        start = time.perf_counter()
+        full = X @ X.T
+        np.fill_diagonal(full, -np.inf)
+        np.argpartition(-full, k, axis=1)[:, :k]
+        full_time = time.perf_counter() - start
+        full_mb = full.nbytes / 1e6
+        del full
+
+        start = time.perf_counter()
+        blocked_top_k_pairs(X, k=k, min_similarity=-1.0)
+        blocked_time = time.perf_counter() - start
+        block_mb = min(n, SPARK_BLOCK_SIZE) ** 2 * 4 / 1e6
+
+        print(f"{n:>7} {loop_time:>12} {full_time:>11.2f}s {blocked_time:>9.2f}s {block_mb:>9.1f} {full_mb:>9.1f}")
+
+# CLI: batch job and benchmark
+if __name__ == "__main__":
+    import sys
+    import json
+
+    if len(sys.argv) >= 3 and sys.argv[1] == "run":
+        from pinecone import Pinecone
+        from dotspark_linkage import load_linked_pairs
+        pinecone_index = Pinecone(api_key=os.getenv("PINECONE_API_KEY")).Index("dotspark-vectors")
+        summary = run_spark_job(sys.argv[2], pinecone_index, sys.argv[3] if len(sys.argv) > 3 else None,
+                                linked_ids=load_linked_pairs(sys.argv[2]))
+        print(json.dumps({k: v for k, v in summary.items() if k != "candidates"}, indent=2))
+    elif len(sys.argv) >= 2 and sys.argv[1] == "bench":
+        run_benchmark([int(n) for n in sys.argv[2:]] or [500, 1000, 2000, 4000, 8000])
+    else:
+        print("Usage: python dotspark_sparks.py run <user_id> [namespace] | bench [sizes...]")
+        sys.exit(1)
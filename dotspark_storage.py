@@ -0,0 +1,95 @@
+import os
+import re
+import sys
+import json
+import fcntl
+import tempfile
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Optional
+
+import numpy as np
+
+# Root directory for per-user local state (hot memory tier, indexes, caches)
+DATA_DIR = os.getenv("DOTSPARK_DATA_DIR", os.path.join(os.getcwd(), ".dotspark"))
+
+_UNSAFE_CHARS = re.compile(r"[^A-Za-z0-9_.-]")
+
+def safe_key(key: str) -> str:
+    """Make a user id / namespace safe to use as a file name"""
+    cleaned = _UNSAFE_CHARS.sub("_", str(key))
+    return cleaned or "_"
+
+def store_path(kind: str, key: str, suffix: str) -> str:
+    """Path of the local file holding `kind` state for `key`, creating its directory"""
+    directory = os.path.join(DATA_DIR, kind)
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, f"{safe_key(key)}{suffix}")
+
+def read_json(path: str, default: Any = None) -> Any:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return default
+
+def _write_atomic(path: str, mode: str, write: Callable[[Any], None], suffix: str = ""):
+    """Write via a temp file in the same directory + rename so readers never see a partial file"""
+    directory = os.path.dirname(path) or "."
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-", suffix=suffix)
+    try:
+        with os.fdopen(fd, mode, **({"encoding": "utf-8"} if "b" not in mode else {})) as f:
+            write(f)
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+def write_json_atomic(path: str, data: Any):
+    _write_atomic(path, "w", lambda f: json.dump(data, f, separators=(",", ":")))
+
+def write_npz_atomic(path: str, **arrays: np.ndarray):
+    """np.savez via temp file + rename: lock-free readers (tiered_search, expand_context)
+    see either the previous file or the new one, never a half-written archive"""
+    _write_atomic(path, "wb", lambda f: np.savez(f, **arrays), suffix=".npz")
+
+@contextmanager
+def file_lock(path: str):
+    """Exclusive advisory lock shared by every worker process on this host"""
+    lock_path = f"{path}.lock"
+    os.makedirs(os.path.dirname(lock_path) or ".", exist_ok=True)
+    with open(lock_path, "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+# === Shared metrics files: <kind>/_stats.json, updated under the file lock ===
+
+STATS_KEY = "_stats"
+
+def stats_path(kind: str) -> str:
+    return store_path(kind, STATS_KEY, ".json")
+
+def read_stats(kind: str) -> Dict[str, Any]:
+    return read_json(stats_path(kind), {})
+
+def update_stats(kind: str, update: Callable[[Dict[str, Any]], None]):
+    """Apply `update` to the kind's stats in place; metrics never fail the caller"""
+    path = stats_path(kind)
+    try:
+        with file_lock(path):
+            stats = read_json(path, {})
+            update(stats)
+            write_json_atomic(path, stats)
+    except Exception as e:
+        print(f"Stats update failed for {kind}: {e}", file=sys.stderr)
+
+def record_stats(kind: str, section: Optional[str] = None, **increments: float):
+    """Add to counters in the kind's stats, optionally under one section (provider, breaker, source)"""
+    def apply(stats: Dict[str, Any]):
+        entry = stats.setdefault(section, {}) if section else stats
+        for name, value in increments.items():
+            entry[name] = round(entry.get(name, 0) + value, 4)
+    update_stats(kind, apply)
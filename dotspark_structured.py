@@ -0,0 +1,275 @@
+import os
+import json
+from dataclasses import dataclass, fields
+from typing import Any, Dict, List, Optional, Tuple
+
+from dotspark_storage import read_stats, record_stats
+
+def extract_json_object(text: str) -> Optional[Dict[str, Any]]:
+    """Parse the outermost {...} block of a model response, or None if there is no valid object"""
+    if not text or "{" not in text or "}" not in text:
+        return None
+    try:
+        parsed = json.loads(text[text.find("{"):text.rfind("}") + 1])
+    except json.JSONDecodeError:
+        return None
+    return parsed if isinstance(parsed, dict) else None
+
+# === Organized Dot/Wheel/Chakra structures ===
+# Slotted so parsed responses held in memory (bulk runs, linkage extraction) stay
+# small; to_dict() is the JSON edge. Fields the model left out stay None and are
+# omitted again on output.
+
+@dataclass(slots=True)
+class Dot:
+    summary: Optional[str] = None
+    context: Optional[str] = None
+    pulse: Optional[str] = None
+
+@dataclass(slots=True)
+class Wheel:
+    heading: Optional[str] = None
+    summary: Optional[str] = None
+    timeline: Optional[str] = None
+
+@dataclass(slots=True)
+class Chakra:
+    heading: Optional[str] = None
+    purpose: Optional[str] = None
+    timeline: Optional[str] = None
+
+_SECTIONS = {"dot": Dot, "wheel": Wheel, "chakra": Chakra}
+
+def _section(cls, value: Dict[str, Any]):
+    return cls(*(value.get(f.name) for f in fields(cls)))
+
+def _section_dict(section) -> Dict[str, Any]:
+    return {f.name: value for f in fields(section) if (value := getattr(section, f.name)) is not None}
+
+@dataclass(slots=True)
+class OrganizedThought:
+    dot: Optional[Dot] = None
+    wheel: Optional[Wheel] = None
+    chakra: Optional[Chakra] = None
+    extra: Optional[Dict[str, Any]] = None   # suggested_linkages, insights, questions, ...
+
+    @classmethod
+    def from_dict(cls, parsed: Dict[str, Any]) -> "OrganizedThought":
+        thought = cls()
+        extra = {}
+        for key, value in parsed.items():
+            if key in _SECTIONS and isinstance(value, dict):
+                setattr(thought, key, _section(_SECTIONS[key], value))
+            else:
+                extra[key] = value
+        thought.extra = extra or None
+        return thought
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = {key: _section_dict(section) for key in _SECTIONS if (section := getattr(self, key)) is not None}
+        if self.extra:
+            data.update(self.extra)
+        return data
+
+def parse_organized(text: str) -> Optional[OrganizedThought]:
+    parsed = extract_json_object(text)
+    return OrganizedThought.from_dict(parsed) if parsed is not None else None
+
+# === Schema-constrained output and local repair ===
+# Providers that support it are asked for schema/JSON-mode output; whatever comes
+# back is repaired, clamped and defaulted locally so a malformed answer never costs
+# a second generation.
+
+ORGANIZED_FIELD_LIMITS = {("dot", "summary"): 220, ("dot", "context"): 300,
+                          ("wheel", "summary"): 300, ("chakra", "purpose"): 300}
+SECTION_DEFAULTS = {"dot": {"summary": "", "context": "", "pulse": ""},
+                    "wheel": {"heading": "", "summary": "", "timeline": "short-term"},
+                    "chakra": {"heading": "", "purpose": "", "timeline": "long-term"}}
+
+# OpenAI models with json_schema support, and ones limited to plain JSON mode
+JSON_SCHEMA_MODELS = tuple(m for m in os.getenv(
+    "DOTSPARK_JSON_SCHEMA_MODELS", "gpt-4o,gpt-4.1,gpt-5").split(",") if m)
+JSON_OBJECT_MODELS = tuple(m for m in os.getenv(
+    "DOTSPARK_JSON_OBJECT_MODELS", "gpt-4-turbo,gpt-3.5-turbo").split(",") if m)
+
+def _string_property(description: str) -> Dict[str, Any]:
+    return {"type": "string", "description": description}
+
+def _section_schema(descriptions: Dict[str, str]) -> Dict[str, Any]:
+    return {"type": "object", "properties": {k: _string_property(v) for k, v in descriptions.items()},
+            "required": list(descriptions), "additionalProperties": False}
+
+def organized_schema(*list_fields: str) -> Dict[str, Any]:
+    """Dot/Wheel/Chakra schema plus the given string-list fields (linkages, insights, ...).
+
+    Strict mode ignores maxLength, so the limits are stated in descriptions and clamped locally.
+    """
+    properties = {
+        "dot": _section_schema({"summary": "Sharp insight, max 220 characters",
+                                "context": "What triggered this thought, max 300 characters",
+                                "pulse": "One-word emotion"}),
+        "wheel": _section_schema({"heading": "Goal/project name",
+                                  "summary": "Tactical approach, max 300 characters",
+                                  "timeline": "short-term"}),
+        "chakra": _section_schema({"heading": "Life purpose/identity",
+                                   "purpose": "Core meaning, max 300 characters",
+                                   "timeline": "long-term"}),
+    }
+    properties.update({name: {"type": "array", "items": {"type": "string"}} for name in list_fields})
+    return {"type": "object", "properties": properties, "required": list(properties),
+            "additionalProperties": False}
+
+# organize_thoughts output, and the thought partner's 'core'/'full' envelopes (see OUTPUT_FORMATS there)
+ORGANIZED_SCHEMA = organized_schema("suggested_linkages")
+ENVELOPE_SCHEMAS = {
+    "core": organized_schema("semantic_linkages"),
+    "full": organized_schema("intelligence_insights", "semantic_linkages", "coaching_questions"),
+}
+
+def structured_output_params(provider: str, model: str, schema: Dict[str, Any] = ORGANIZED_SCHEMA) -> Dict[str, Any]:
+    """Extra chat-completion arguments asking the provider for organized-thought JSON"""
+    if provider == "deepseek":
+        return {"response_format": {"type": "json_object"}}
+    if provider == "openai":
+        if model.startswith(JSON_SCHEMA_MODELS):
+            return {"response_format": {"type": "json_schema", "json_schema": {
+                "name": "organized_thought", "strict": True, "schema": schema}}}
+        if model.startswith(JSON_OBJECT_MODELS):
+            return {"response_format": {"type": "json_object"}}
+    return {}
+
+def _close(prefix: str, stack: List[str], in_string: bool) -> str:
+    if in_string:
+        prefix = (prefix[:-1] if prefix.endswith("\\") else prefix) + '"'
+    prefix = prefix.rstrip()
+    while prefix.endswith(","):
+        prefix = prefix[:-1].rstrip()
+    if prefix.endswith(":"):
+        prefix += " null"
+    return prefix + "".join("}" if opener == "{" else "]" for opener in reversed(stack))
+
+def _strip_trailing_comma(out: List[str]):
+    while out and out[-1].isspace():
+        out.pop()
+    if out and out[-1] == ",":
+        out.pop()
+
+def repair_json(text: str) -> Optional[Dict[str, Any]]:
+    """Best-effort parse of a damaged JSON object: code fences and prose around it,
+    trailing commas, control characters in strings, stray closers and truncation"""
+    start = text.find("{") if text else -1
+    if start < 0:
+        return None
+    out: List[str] = []
+    stack: List[str] = []
+    cuts: List[Tuple[int, List[str]]] = []   # (output length, open containers) at each comma outside strings
+    in_string = escaped = False
+    for ch in text[start:]:
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+            out.append(ch)
+            continue
+        if ch == '"':
+            in_string = True
+        elif ch in "{[":
+            stack.append(ch)
+        elif ch in "}]":
+            if not stack or stack[-1] != ("{" if ch == "}" else "["):
+                continue
+            _strip_trailing_comma(out)
+            stack.pop()
+            out.append(ch)
+            if not stack:
+                break
+            continue
+        elif ch == ",":
+            cuts.append((len(out), list(stack)))
+        out.append(ch)
+
+    if not stack:
+        candidates = ["".join(out)]
+    else:
+        # Truncated: close what is open, else drop the last incomplete member(s)
+        candidates = [_close("".join(out), stack, in_string)]
+        candidates += [_close("".join(out[:length]), opened, False) for length, opened in reversed(cuts[-3:])]
+    for candidate in candidates:
+        try:
+            parsed = json.loads(candidate, strict=False)   # tolerates raw newlines in strings
+        except json.JSONDecodeError:
+            continue
+        if isinstance(parsed, dict):
+            return parsed
+    return None
+
+def _clamp(text: str, limit: int) -> str:
+    if len(text) <= limit:
+        return text
+    cut = text[:limit - 1]
+    if " " in cut[limit // 2:]:
+        cut = cut.rsplit(" ", 1)[0]
+    return cut.rstrip(" ,;:-") + "…"
+
+def normalize_organized(thought: OrganizedThought, linkage_field: str = "suggested_linkages") -> Tuple[int, int]:
+    """Fill missing sections/fields with defaults and clamp to the prompt's length limits
+    (in place); returns (clamped fields, defaulted fields)"""
+    clamped = defaulted = 0
+    for key, defaults in SECTION_DEFAULTS.items():
+        section = getattr(thought, key)
+        if section is None:
+            section = _SECTIONS[key]()
+            setattr(thought, key, section)
+        for name, default in defaults.items():
+            value = getattr(section, name)
+            if value is None or value == "":
+                defaulted += 1
+                value = default
+            elif not isinstance(value, str):
+                value = json.dumps(value) if isinstance(value, (dict, list)) else str(value)
+            limit = ORGANIZED_FIELD_LIMITS.get((key, name))
+            if limit and len(value) > limit:
+                value = _clamp(value, limit)
+                clamped += 1
+            setattr(section, name, value)
+    extra = thought.extra or {}
+    linkages = extra.get(linkage_field)
+    if not isinstance(linkages, list):
+        extra[linkage_field] = [linkages] if isinstance(linkages, str) and linkages else []
+        defaulted += 1
+    else:
+        extra[linkage_field] = [str(link) for link in linkages if link]
+    thought.extra = extra
+    return clamped, defaulted
+
+def parse_structured(text: str, source: str = "organize",
+                     linkage_field: str = "suggested_linkages") -> Optional[OrganizedThought]:
+    """Organized thought from a model response: strict parse, then local repair,
+    then defaults/clamping; None only when no Dot/Wheel/Chakra can be recovered"""
+    parsed = extract_json_object(text)
+    repaired = parsed is None
+    if repaired:
+        parsed = repair_json(text)
+    thought = OrganizedThought.from_dict(parsed) if parsed else None
+    if thought is None or not (thought.dot or thought.wheel or thought.chakra):
+        record_stats("structured", source, responses=1, failed=1)
+        return None
+    clamped, defaulted = normalize_organized(thought, linkage_field)
+    record_stats("structured", source, responses=1, parsed=1, repaired=int(repaired),
+                  clamped_fields=clamped, defaulted_fields=defaulted)
+    return thought
+
+def structured_stats() -> Dict[str, Any]:
+    stats = read_stats("structured")
+    for entry in stats.values():
+        responses = entry.get("responses", 0)
+        entry["parse_rate"] = round(entry.get("parsed", 0) / responses, 4) if responses else 0.0
+        entry["repair_rate"] = round(entry.get("repaired", 0) / responses, 4) if responses else 0.0
+    return stats
+
+# CLI for parse/repair metrics
+if __name__ == "__main__":
+    print(json.dumps(structured_stats(), indent=2))
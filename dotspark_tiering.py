@@ -0,0 +1,57 @@
+import os
+from dataclasses import dataclass
+from typing import Any, Dict, Tuple
+
+from dotspark_router import RouteDecision
+
+# Per-request model tiering. The large model (MODEL) is reserved for deep organize
+# requests and very long inputs; everything else runs on the small tier with a lean
+# output profile. Every profile keeps a JSON envelope: Node saves dots/wheels/chakras
+# from the parsed structured response, and linkages and the profile read it too.
+LARGE_MODEL = os.getenv("MODEL", "gpt-4")        # 'gpt-4' or 'deepseek-chat'
+SMALL_MODEL = os.getenv("DOTSPARK_SMALL_MODEL",
+                        "deepseek-chat" if LARGE_MODEL.startswith("deepseek") else "gpt-4o-mini")
+DEEP_MIN_WORDS = int(os.getenv("DOTSPARK_DEEP_MIN_WORDS", "30"))       # organize turns at least this long are 'deep'
+LONG_INPUT_WORDS = int(os.getenv("DOTSPARK_LONG_INPUT_WORDS", "150"))  # any turn this long gets the large model
+REASONING_MODEL_PREFIXES = ("gpt-5", "o1", "o3", "o4")
+
+# Stop if the model starts writing the user's next turn
+_STOP_NEXT_TURN = ("\nUser:", "\nUSER:")
+
+@dataclass(slots=True)
+class OutputProfile:
+    name: str
+    max_tokens: int
+    stop: Tuple[str, ...]
+    envelope: str        # JSON the prompt asks for: 'full' or 'core' (dot/wheel/chakra only)
+
+OUTPUT_PROFILES: Dict[str, OutputProfile] = {
+    "chat": OutputProfile("chat", int(os.getenv("DOTSPARK_MAX_TOKENS_CHAT", "450")), _STOP_NEXT_TURN, "core"),
+    "organize": OutputProfile("organize", int(os.getenv("DOTSPARK_MAX_TOKENS_ORGANIZE", "600")), _STOP_NEXT_TURN, "core"),
+    "deep": OutputProfile("deep", int(os.getenv("DOTSPARK_MAX_TOKENS_DEEP", "1200")), _STOP_NEXT_TURN, "full"),
+}
+
+@dataclass(slots=True)
+class ModelChoice:
+    provider: str
+    model: str
+    tier: str            # 'small' or 'large'
+    profile: OutputProfile
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"provider": self.provider, "model": self.model, "tier": self.tier,
+                "profile": self.profile.name, "max_tokens": self.profile.max_tokens}
+
+def provider_for(model: str) -> str:
+    return "deepseek" if model.startswith("deepseek") else "openai"
+
+def select_model(user_input: str, mode: str, decision: RouteDecision) -> ModelChoice:
+    """Model and output profile for one turn from its length, mode and routed intent"""
+    words = len((user_input or "").split())
+    if words >= LONG_INPUT_WORDS or (mode == "organize" and decision.route == "full" and words >= DEEP_MIN_WORDS):
+        model, tier, profile = LARGE_MODEL, "large", OUTPUT_PROFILES["deep"]
+    elif mode == "organize" and decision.route == "full":
+        model, tier, profile = SMALL_MODEL, "small", OUTPUT_PROFILES["organize"]
+    else:
+        model, tier, profile = SMALL_MODEL, "small", OUTPUT_PROFILES["chat"]
+    return ModelChoice(provider_for(model), model, tier, profile)
@@ -0,0 +1,147 @@
+import os
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Sequence, Tuple
+
+import numpy as np
+
+def to_epoch(value: Any, default: float = 0.0) -> float:
+    """Normalize stored timestamps (epoch seconds/ms or ISO strings) to epoch seconds"""
+    if value is None or value == "":
+        return default
+    if isinstance(value, (int, float)):
+        # Node writes Date.now() style milliseconds in some paths
+        return float(value) / 1000.0 if value > 1e11 else float(value)
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        pass
+    try:
+        return datetime.fromisoformat(str(value).replace("Z", "+00:00")).timestamp()
+    except ValueError:
+        return default
+
+def as_unit_matrix(vectors: Sequence[Sequence[float]]) -> np.ndarray:
+    """Stack vectors into a float32 matrix with L2-normalized rows"""
+    matrix = np.asarray(vectors, dtype=np.float32)
+    if matrix.size == 0:
+        return np.zeros((0, matrix.shape[-1] if matrix.ndim == 2 else 0), dtype=np.float32)
+    if matrix.ndim == 1:
+        matrix = matrix.reshape(1, -1)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+def recency_weights(timestamps: np.ndarray, half_life_days: float, now: float = None) -> np.ndarray:
+    """Exponential decay in [0, 1]: 1.0 for brand-new memories, 0.5 after one half-life"""
+    now = time.time() if now is None else now
+    age_days = np.maximum(now - np.asarray(timestamps, dtype=np.float64), 0.0) / 86400.0
+    if half_life_days <= 0:
+        return np.ones_like(age_days)
+    return np.power(0.5, age_days / half_life_days)
+
+def blend_scores(similarities: np.ndarray, timestamps: np.ndarray, recency_weight: float,
+                 half_life_days: float, now: float = None) -> np.ndarray:
+    """Blend cosine similarity with recency decay in a single vectorized pass"""
+    similarities = np.asarray(similarities, dtype=np.float64)
+    decay = recency_weights(timestamps, half_life_days, now)
+    return similarities * ((1.0 - recency_weight) + recency_weight * decay)
+
+# Namespace server/vector-integration.ts writes Dot/Wheel/Chakra vectors to (shared by
+# all users, ids '<contentType>_<contentId>_<userId>'); conversation memories live in
+# a per-user namespace instead
+STRUCTURE_NAMESPACE = os.getenv("DOTSPARK_STRUCTURE_NAMESPACE", "")
+STRUCTURE_KINDS = ("dot", "wheel", "chakra")
+
+def _fetch_batches(index, namespace: str, batch_size: int, keep_id: Callable[[str], bool],
+                   keep: Callable[[Dict[str, Any]], bool]):
+    for page in index.list(namespace=namespace, limit=batch_size):
+        ids = [vid for vid in page if keep_id(vid)]
+        if not ids:
+            continue
+        fetched = index.fetch(ids=ids, namespace=namespace).vectors
+        found = [vid for vid in ids if vid in fetched and keep(fetched[vid].metadata or {})]
+        if not found:
+            continue
+        yield (
+            found,
+            [fetched[vid].values for vid in found],
+            [dict(fetched[vid].metadata or {}) for vid in found]
+        )
+
+def iter_namespace_vectors(index, namespace: str, batch_size: int = 100, include_chunks: bool = False):
+    """Yield (ids, values, metadata) batches for every vector stored in a Pinecone namespace.
+
+    Chunk vectors of long memories (see dotspark_chunking) are skipped unless
+    include_chunks is set, so batch jobs see each memory once.
+    """
+    return _fetch_batches(index, namespace, batch_size, lambda vid: True,
+                          lambda metadata: include_chunks or "parent_id" not in metadata)
+
+def _same_user(value: Any, user_id: str) -> bool:
+    # Pinecone returns numeric metadata as floats (userId 7 comes back as 7.0)
+    try:
+        return int(float(value)) == int(float(user_id))
+    except (TypeError, ValueError):
+        return str(value) == str(user_id)
+
+def _user_structure_filters(user_id: str) -> Tuple[Callable[[str], bool], Callable[[Dict[str, Any]], bool]]:
+    suffix = f"_{user_id}"
+    return (
+        lambda vid: vid.endswith(suffix) and vid.split("_", 1)[0] in STRUCTURE_KINDS,
+        lambda metadata: metadata.get("contentType") in STRUCTURE_KINDS and _same_user(metadata.get("userId"), user_id)
+    )
+
+def iter_user_structure_vectors(index, user_id: str, namespace: str = STRUCTURE_NAMESPACE,
+                                batch_size: int = 100):
+    """Yield (ids, values, metadata) batches of one user's Dot/Wheel/Chakra vectors.
+
+    Ids are matched on their user suffix before anything is fetched, and the
+    userId metadata is checked again after, so other users' vectors never mix in.
+    """
+    return _fetch_batches(index, namespace, batch_size, *_user_structure_filters(user_id))
+
+def fetch_user_structure_vectors(index, user_id: str, vector_ids: Sequence[str],
+                                 namespace: str = STRUCTURE_NAMESPACE):
+    """(ids, values, metadata) of the given Dot/Wheel/Chakra vectors of one user, with
+    the same checks as iter_user_structure_vectors"""
+    keep_id, keep = _user_structure_filters(user_id)
+    ids = [vid for vid in vector_ids if keep_id(vid)]
+    fetched = index.fetch(ids=ids, namespace=namespace).vectors if ids else {}
+    found = [vid for vid in ids if vid in fetched and keep(fetched[vid].metadata or {})]
+    return found, [fetched[vid].values for vid in found], [dict(fetched[vid].metadata or {}) for vid in found]
+
+def mmr_select(query_vector: Sequence[float], candidate_vectors: Sequence[Sequence[float]], k: int,
+               lambda_: float = 0.7, groups: Sequence[Any] = None, group_quota: int = None,
+               redundancy_cutoff: float = 0.95) -> List[int]:
+    """Maximal marginal relevance: greedily pick candidates that are relevant but not redundant.
+
+    Each step scores lambda * sim(query) - (1 - lambda) * max sim(already picked).
+    Candidates from a group (wheel/chakra) that already filled its quota are skipped,
+    and near-duplicates of a picked item (>= redundancy_cutoff) are dropped outright,
+    so fewer than k indices may come back.
+    """
+    C = as_unit_matrix(candidate_vectors)
+    if C.shape[0] == 0 or k <= 0:
+        return []
+    relevance = C @ as_unit_matrix(query_vector)[0]
+    pairwise = C @ C.T
+    max_redundancy = np.full(C.shape[0], -np.inf, dtype=np.float32)
+    available = np.ones(C.shape[0], dtype=bool)
+    group_counts: Dict[Any, int] = {}
+    selected: List[int] = []
+
+    while len(selected) < k and available.any():
+        redundancy = np.where(np.isfinite(max_redundancy), max_redundancy, 0.0)
+        scores = np.where(available, lambda_ * relevance - (1.0 - lambda_) * redundancy, -np.inf)
+        pick = int(np.argmax(scores))
+        available[pick] = False
+        group = groups[pick] if groups is not None else None
+        if group_quota and group not in (None, ""):
+            if group_counts.get(group, 0) >= group_quota:
+                continue
+            group_counts[group] = group_counts.get(group, 0) + 1
+        selected.append(pick)
+        max_redundancy = np.maximum(max_redundancy, pairwise[:, pick])
+        available &= max_redundancy < redundancy_cutoff
+    return selected
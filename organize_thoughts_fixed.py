@@ -1,11 +1,18 @@
 import os
-import json
 from dotenv import load_dotenv
 from openai import OpenAI
 from pinecone import Pinecone
 import requests
 from datetime import datetime
 
+from dotspark_rate_limit import (rate_limited, estimate_tokens, retry_after_header, ProviderRateLimited,
+                                 COMPLETION_TOKEN_RESERVE, RATE_LIMIT_MAX_WAIT)
+from dotspark_chunking import embed_text
+from dotspark_deadline import Deadline, RETRIEVAL_BUDGET_SHARE
+from dotspark_circuit import guarded
+from dotspark_records import SavedDot
+from dotspark_structured import parse_structured, structured_output_params
+
 # Load environment variables
 load_dotenv()
 
@@ -26,6 +33,12 @@ except Exception as e:
 DEEPSEEK_API_KEY = os.getenv("DEEPSEEK_API_KEY")
 DEEPSEEK_API_URL = "https://api.deepseek.com/chat/completions"
 
+# OpenAI model when the caller does not name one; must support json_schema output
+ORGANIZE_MODEL = os.getenv("DOTSPARK_ORGANIZE_MODEL", "gpt-4o")
+
+# Set by the Node admission controller under load: skip memory retrieval
+DEGRADED_MODE = os.getenv("DOTSPARK_DEGRADED", "0") == "1"
+
 # === DotSpark System Prompt ===
 def get_organize_prompt():
     return """
@@ -74,11 +87,7 @@ Respond in this JSON format only:
 # === OpenAI Embedding ===
 def get_openai_embedding(text):
     try:
-        response = openai_client.embeddings.create(
-            input=[text],
-            model="text-embedding-3-small"
-        )
-        return response.data[0].embedding
+        return embed_text(openai_client, text, "text-embedding-3-small")
     except Exception as e:
         print(f"Embedding error: {e}")
         return None
@@ -94,24 +103,28 @@ def fetch_user_memory(user_id, query_text):
         return []
         
     try:
-        results = index.query(vector=query_vector, top_k=10, include_metadata=True)
-
-        memories = []
-        for match in results.get('matches', []):
-            meta = match.get('metadata', {})
-            if str(meta.get('user_id')) == str(user_id):
-                memories.append(meta)
-        return memories
+        results = guarded("pinecone", lambda: index.query(vector=query_vector, top_k=10, include_metadata=True))
+
+        return [
+            SavedDot.from_metadata(match.get('metadata', {}))
+            for match in results.get('matches', [])
+            if str(match.get('metadata', {}).get('user_id')) == str(user_id)
+        ]
     except Exception as e:
         print(f"Memory fetch error: {e}")
         return []
 
 # === Build Message Context for GPT/DeepSeek ===
-def build_conversation_context(user_input, user_id):
-    prior_memories = fetch_user_memory(user_id, user_input)
+def build_conversation_context(user_input, user_id, deadline=None):
+    deadline = deadline or Deadline()
+    # Past its share of the budget, organize without prior memories
+    prior_memories = [] if DEGRADED_MODE else deadline.run(
+        "retrieval", lambda: fetch_user_memory(user_id, user_input),
+        deadline.share(RETRIEVAL_BUDGET_SHARE), []
+    )
 
     memory_context = "\n".join([
-        f"- Dot: {m.get('summary')} (Wheel: {m.get('wheel_id')}, Chakra: {m.get('chakra')})"
+        f"- Dot: {m.summary} (Wheel: {m.wheel}, Chakra: {m.chakra})"
         for m in prior_memories
     ]) if prior_memories else "No previous thoughts found."
 
@@ -124,7 +137,7 @@ def build_conversation_context(user_input, user_id):
     ]
 
 # === DeepSeek Chat Call ===
-def call_deepseek(messages):
+def call_deepseek(messages, timeout=None):
     if not DEEPSEEK_API_KEY:
         return "DeepSeek API key not configured"
         
@@ -135,11 +148,23 @@ def call_deepseek(messages):
 
     payload = {
         "model": "deepseek-chat",
-        "messages": messages
+        "messages": messages,
+        **structured_output_params("deepseek", "deepseek-chat")
     }
 
     try:
-        response = requests.post(DEEPSEEK_API_URL, headers=headers, json=payload)
+        def post():
+            res = requests.post(DEEPSEEK_API_URL, headers=headers, json=payload, timeout=timeout)
+            if res.status_code == 429:
+                raise ProviderRateLimited(retry_after_header(res.headers))
+            return res
+
+        max_wait = timeout if timeout is not None else RATE_LIMIT_MAX_WAIT
+        response = guarded(
+            "deepseek_chat",
+            lambda: rate_limited("deepseek", "deepseek-chat", estimate_tokens(messages, COMPLETION_TOKEN_RESERVE), post, max_wait),
+            is_failure=lambda res: res.status_code >= 500
+        )
         if response.status_code == 200:
             return response.json()['choices'][0]['message']['content']
         else:
@@ -148,39 +173,38 @@ def call_deepseek(messages):
         return f"DeepSeek connection error: {e}"
 
 # === Unified Organizer ===
-def organize_thoughts(user_input, user_id, model_type="gpt-4"):
-    messages = build_conversation_context(user_input, user_id)
+def organize_thoughts(user_input, user_id, model_type=ORGANIZE_MODEL, deadline=None):
+    deadline = deadline or Deadline()
+    messages = build_conversation_context(user_input, user_id, deadline)
 
-    if model_type == "gpt-4":
+    if model_type.startswith(("gpt", "o1", "o3", "o4")):
         try:
-            response = openai_client.chat.completions.create(
-                model="gpt-4",
-                messages=messages
-            )
+            # The model call gets whatever budget retrieval left
+            timeout = deadline.timeout()
+            response = guarded("openai_chat", lambda: rate_limited(
+                "openai", model_type, estimate_tokens(messages, COMPLETION_TOKEN_RESERVE),
+                lambda: openai_client.with_options(timeout=timeout).chat.completions.create(
+                    model=model_type, messages=messages, **structured_output_params("openai", model_type)),
+                timeout
+            ))
             return response.choices[0].message.content
         except Exception as e:
             return f"OpenAI API Error: {e}"
 
     elif model_type == "deepseek":
-        return call_deepseek(messages)
+        return call_deepseek(messages, timeout=deadline.timeout())
 
     else:
-        return "Invalid model_type. Choose 'gpt-4' or 'deepseek'."
+        return "Invalid model_type. Choose an OpenAI model (e.g. 'gpt-4o') or 'deepseek'."
 
 # === Parse and Validate JSON Response ===
 def parse_organized_response(response_text):
-    try:
-        # Try to extract JSON from response
-        if '{' in response_text and '}' in response_text:
-            start = response_text.find('{')
-            end = response_text.rfind('}') + 1
-            json_text = response_text[start:end]
-            parsed = json.loads(json_text)
-            return parsed
-        else:
-            return {"error": "No valid JSON found in response", "raw_response": response_text}
-    except json.JSONDecodeError as e:
-        return {"error": f"JSON parsing failed: {e}", "raw_response": response_text}
+    # Malformed or truncated JSON is repaired locally and fields are clamped/defaulted,
+    # so only output with no recoverable structure comes back as an error
+    thought = parse_structured(response_text, source="organize")
+    if thought is None:
+        return {"error": "No recoverable JSON structure in response", "raw_response": response_text}
+    return thought.to_dict()
 
 # === Example Usage ===
 if __name__ == "__main__":
@@ -188,7 +212,7 @@ if __name__ == "__main__":
     
     user_input = "I want to build a new revenue stream outside my job."
     user_id = "user_001"
-    model = "gpt-4"  # or "deepseek"
+    model = ORGANIZE_MODEL  # or "deepseek"
     
     print(f"User Input: {user_input}")
     print(f"Model: {model}")
@@ -0,0 +1,265 @@
+/**
+ * Admission control and priority scheduling for the Python agents spawned per request.
+ *
+ * At most DOTSPARK_AGENT_MAX_CONCURRENT agents run at once; further requests wait
+ * in a bounded queue. When the queue is full, or a request has waited longer
+ * than DOTSPARK_AGENT_MAX_WAIT_MS, it is rejected immediately with a retry-after
+ * hint instead of piling up more processes. Once the queue is deeper than
+ * DOTSPARK_AGENT_DEGRADE_DEPTH, admitted requests run in degraded mode
+ * (DOTSPARK_DEGRADED=1: no retrieval, no memory write) so the backlog drains faster.
+ *
+ * Requests carry a priority class (interactive chat, standard organize, bulk jobs).
+ * Waiters are served by weighted fair queuing, bulk never takes the slots reserved
+ * for interactive work, and a full queue sheds queued bulk before anything else.
+ */
+
+export type PriorityClass = 'interactive' | 'standard' | 'bulk';
+
+const MAX_CONCURRENT = parseInt(process.env.DOTSPARK_AGENT_MAX_CONCURRENT || '4', 10);
+const MAX_QUEUE = parseInt(process.env.DOTSPARK_AGENT_MAX_QUEUE || '32', 10);
+const MAX_WAIT_MS = parseInt(process.env.DOTSPARK_AGENT_MAX_WAIT_MS || '10000', 10);
+const DEGRADE_DEPTH = parseInt(process.env.DOTSPARK_AGENT_DEGRADE_DEPTH || String(Math.ceil(MAX_QUEUE / 2)), 10);
+// Slots bulk work can never occupy, so a live chat turn always finds capacity quickly
+const INTERACTIVE_RESERVE = parseInt(process.env.DOTSPARK_AGENT_INTERACTIVE_RESERVE || '1', 10);
+const CLASS_WEIGHTS: Record<PriorityClass, number> = { interactive: 8, standard: 3, bulk: 1 };
+const PRIORITY_CLASSES: PriorityClass[] = ['interactive', 'standard', 'bulk'];
+const LATENCY_WINDOW = 256;
+const EWMA_ALPHA = 0.2;
+
+export class AdmissionRejectedError extends Error {
+  constructor(
+    public reason: 'queue_full' | 'wait_timeout' | 'preempted',
+    public retryAfterSeconds: number
+  ) {
+    super(`DotSpark agents are saturated (${reason}); retry after ${retryAfterSeconds}s`);
+    this.name = 'AdmissionRejectedError';
+  }
+}
+
+export interface AdmissionTicket {
+  priority: PriorityClass;
+  degraded: boolean;
+  waitedMs: number;
+  release: () => void;
+}
+
+interface Waiter {
+  priority: PriorityClass;
+  finishTag: number;
+  enqueuedAt: number;
+  timer: NodeJS.Timeout;
+  resolve: (ticket: AdmissionTicket) => void;
+  reject: (error: AdmissionRejectedError) => void;
+}
+
+/**
+ * Rolling latency samples for one priority class
+ */
+class LatencyWindow {
+  private waits: number[] = [];
+  private totals: number[] = [];
+
+  record(waitMs: number, totalMs: number) {
+    this.waits.push(waitMs);
+    this.totals.push(totalMs);
+    if (this.waits.length > LATENCY_WINDOW) {
+      this.waits.shift();
+      this.totals.shift();
+    }
+  }
+
+  summary() {
+    return {
+      samples: this.totals.length,
+      waitP50Ms: percentile(this.waits, 0.5),
+      waitP99Ms: percentile(this.waits, 0.99),
+      latencyP50Ms: percentile(this.totals, 0.5),
+      latencyP99Ms: percentile(this.totals, 0.99)
+    };
+  }
+}
+
+function percentile(values: number[], q: number): number {
+  if (values.length === 0) return 0;
+  const sorted = [...values].sort((a, b) => a - b);
+  return Math.round(sorted[Math.min(sorted.length - 1, Math.floor(q * sorted.length))]);
+}
+
+export class AgentAdmission {
+  private inFlight = 0;
+  private inFlightByClass: Record<PriorityClass, number> = { interactive: 0, standard: 0, bulk: 0 };
+  private queue: Waiter[] = [];
+  // Weighted fair queuing: virtual time advances with the finish tag of each dispatched waiter
+  private virtualTime = 0;
+  private lastFinish: Record<PriorityClass, number> = { interactive: 0, standard: 0, bulk: 0 };
+  private latency: Record<PriorityClass, LatencyWindow> = {
+    interactive: new LatencyWindow(),
+    standard: new LatencyWindow(),
+    bulk: new LatencyWindow()
+  };
+  private avgServiceMs = 2000;
+  private avgWaitMs = 0;
+  private counters = {
+    admitted: 0,
+    degraded: 0,
+    rejectedQueueFull: 0,
+    rejectedWaitTimeout: 0,
+    preemptedBulk: 0,
+    maxQueueDepth: 0
+  };
+
+  constructor(
+    private maxConcurrent = MAX_CONCURRENT,
+    private maxQueue = MAX_QUEUE,
+    private maxWaitMs = MAX_WAIT_MS,
+    private degradeDepth = DEGRADE_DEPTH,
+    private interactiveReserve = INTERACTIVE_RESERVE
+  ) {}
+
+  /**
+   * Wait for an agent slot. Rejects with AdmissionRejectedError when saturated.
+   */
+  admit(priority: PriorityClass = 'standard'): Promise<AdmissionTicket> {
+    if (this.queue.length >= this.maxQueue && !(priority !== 'bulk' && this.preemptQueuedBulk())) {
+      this.counters.rejectedQueueFull++;
+      return Promise.reject(new AdmissionRejectedError('queue_full', this.retryAfterSeconds()));
+    }
+
+    return new Promise<AdmissionTicket>((resolve, reject) => {
+      const finishTag = Math.max(this.virtualTime, this.lastFinish[priority]) + 1 / CLASS_WEIGHTS[priority];
+      this.lastFinish[priority] = finishTag;
+      const waiter: Waiter = {
+        priority,
+        finishTag,
+        enqueuedAt: Date.now(),
+        resolve,
+        reject,
+        timer: setTimeout(() => {
+          if (this.remove(waiter)) {
+            this.counters.rejectedWaitTimeout++;
+            reject(new AdmissionRejectedError('wait_timeout', this.retryAfterSeconds()));
+          }
+        }, this.maxWaitMs)
+      };
+      this.queue.push(waiter);
+      // Dispatches immediately when a slot is free for this class
+      this.next();
+      this.counters.maxQueueDepth = Math.max(this.counters.maxQueueDepth, this.queue.length);
+    });
+  }
+
+  /**
+   * Run `task` inside an admitted slot; `task` receives the ticket (priority, degraded flag).
+   */
+  async run<T>(task: (ticket: AdmissionTicket) => Promise<T>, priority: PriorityClass = 'standard'): Promise<T> {
+    const ticket = await this.admit(priority);
+    try {
+      return await task(ticket);
+    } finally {
+      ticket.release();
+    }
+  }
+
+  metrics() {
+    const queuedByClass: Record<PriorityClass, number> = { interactive: 0, standard: 0, bulk: 0 };
+    this.queue.forEach(waiter => queuedByClass[waiter.priority]++);
+    return {
+      ...this.counters,
+      inFlight: this.inFlight,
+      queued: this.queue.length,
+      maxConcurrent: this.maxConcurrent,
+      maxQueue: this.maxQueue,
+      maxWaitMs: this.maxWaitMs,
+      degradeDepth: this.degradeDepth,
+      avgWaitMs: Math.round(this.avgWaitMs),
+      avgServiceMs: Math.round(this.avgServiceMs),
+      classes: Object.fromEntries(PRIORITY_CLASSES.map(priority => [priority, {
+        weight: CLASS_WEIGHTS[priority],
+        inFlight: this.inFlightByClass[priority],
+        queued: queuedByClass[priority],
+        ...this.latency[priority].summary()
+      }]))
+    };
+  }
+
+  private hasSlotFor(priority: PriorityClass): boolean {
+    const limit = priority === 'bulk' ? this.maxConcurrent - this.interactiveReserve : this.maxConcurrent;
+    return this.inFlight < Math.max(1, limit);
+  }
+
+  private grant(priority: PriorityClass, enqueuedAt: number): AdmissionTicket {
+    const startedAt = Date.now();
+    const waitedMs = startedAt - enqueuedAt;
+    const degraded = this.queue.length >= this.degradeDepth;
+    this.inFlight++;
+    this.inFlightByClass[priority]++;
+    this.counters.admitted++;
+    if (degraded) this.counters.degraded++;
+    this.avgWaitMs += EWMA_ALPHA * (waitedMs - this.avgWaitMs);
+
+    let released = false;
+    return {
+      priority,
+      degraded,
+      waitedMs,
+      release: () => {
+        if (released) return;
+        released = true;
+        const finishedAt = Date.now();
+        this.inFlight--;
+        this.inFlightByClass[priority]--;
+        this.avgServiceMs += EWMA_ALPHA * (finishedAt - startedAt - this.avgServiceMs);
+        this.latency[priority].record(waitedMs, finishedAt - enqueuedAt);
+        this.next();
+      }
+    };
+  }
+
+  private next() {
+    while (this.queue.length > 0) {
+      // Smallest finish tag among waiters that may use a free slot right now
+      let best: Waiter | undefined;
+      for (const waiter of this.queue) {
+        if (this.hasSlotFor(waiter.priority) && (!best || waiter.finishTag < best.finishTag)) {
+          best = waiter;
+        }
+      }
+      if (!best) return;
+      this.remove(best);
+      this.virtualTime = Math.max(this.virtualTime, best.finishTag);
+      best.resolve(this.grant(best.priority, best.enqueuedAt));
+    }
+  }
+
+  /**
+   * Drop the most recently queued bulk waiter to make room for higher-priority work
+   */
+  private preemptQueuedBulk(): boolean {
+    for (let i = this.queue.length - 1; i >= 0; i--) {
+      const waiter = this.queue[i];
+      if (waiter.priority === 'bulk') {
+        this.remove(waiter);
+        this.counters.preemptedBulk++;
+        waiter.reject(new AdmissionRejectedError('preempted', this.retryAfterSeconds()));
+        return true;
+      }
+    }
+    return false;
+  }
+
+  private remove(waiter: Waiter): boolean {
+    const position = this.queue.indexOf(waiter);
+    if (position === -1) return false;
+    this.queue.splice(position, 1);
+    clearTimeout(waiter.timer);
+    return true;
+  }
+
+  private retryAfterSeconds(): number {
+    // Time for the current backlog to drain at the observed service rate
+    const backlog = this.queue.length + this.inFlight;
+    return Math.max(1, Math.ceil((backlog * this.avgServiceMs) / this.maxConcurrent / 1000));
+  }
+}
+
+export const agentAdmission = new AgentAdmission();
@@ -1,6 +1,8 @@
 import OpenAI from 'openai';
 import { spawn } from 'child_process';
 import { promisify } from 'util';
+import { agentAdmission, AdmissionRejectedError, PriorityClass } from './agent-admission';
+import { SingleFlight, flightKey } from './single-flight';
 
 const openai = new OpenAI({
   apiKey: process.env.OPENAI_API_KEY!,
@@ -31,37 +33,43 @@ interface DotSparkResponse {
     timestamp: string;
     processingTime: number;
     userId?: string;
+    degraded?: boolean;
+    coalesced?: boolean;
   };
 }
 
-/**
- * Run Python DotSpark core logic for advanced cognitive processing
- */
-export async function runDotSparkCore(
-  userInput: string, 
-  userId: string = 'default', 
-  modelType: 'gpt-5' | 'deepseek' = 'gpt-5'
-): Promise<DotSparkResponse> {
-  const startTime = Date.now();
+// End-to-end budget for one agent request; the Python side gets what is left after queueing
+const REQUEST_BUDGET_MS = parseInt(process.env.DOTSPARK_REQUEST_BUDGET_MS || '30000', 10);
+const MIN_AGENT_BUDGET_MS = 2000;
 
-  try {
-    // Use enhanced v2 Python intelligence agent with full model specification
-    const pythonArgs = [
-      'dotspark_intelligence_agent_v2.py',
-      'chat',
-      userId,
-      userInput.replace(/"/g, '\\"')
-    ];
+// Duplicate in-flight requests (double-taps, webhook retries) share one agent run
+export const agentFlights = new SingleFlight<DotSparkResponse>();
 
-    // Execute enhanced Python intelligence agent with full environment
-    const pythonProcess = spawn('python3', pythonArgs, {
+async function coalesce(key: string, fn: () => Promise<DotSparkResponse>): Promise<DotSparkResponse> {
+  const { value, coalesced } = await agentFlights.do(key, fn);
+  return coalesced ? { ...value, metadata: { ...value.metadata, coalesced: true } } : value;
+}
+
+/**
+ * Spawn a Python agent once admitted and parse the JSON it prints.
+ * Under pressure the agent runs degraded (DOTSPARK_DEGRADED=1: no retrieval, no memory write).
+ */
+async function runPythonAgent(
+  args: string[],
+  env: Record<string, string | undefined> = {},
+  priority: PriorityClass = 'standard'
+): Promise<{ result: any; degraded: boolean }> {
+  return agentAdmission.run(async (ticket) => {
+    const pythonProcess = spawn('python3', args, {
       cwd: process.cwd(),
-      env: { 
-        ...process.env, 
-        MODEL: modelType === 'deepseek' ? 'deepseek-chat' : 'gpt-5',
-        OPENAI_API_KEY: process.env.OPENAI_API_KEY,
-        DEEPSEEK_API_KEY: process.env.DEEPSEEK_API_KEY,
-        PINECONE_API_KEY: process.env.PINECONE_API_KEY
+      env: {
+        ...process.env,
+        ...env,
+        DOTSPARK_DEGRADED: ticket.degraded ? '1' : '0',
+        // Lets the Python rate limiter keep provider headroom for interactive turns
+        DOTSPARK_PRIORITY: ticket.priority,
+        // Embedding, retrieval, model call and memory write share this deadline
+        DOTSPARK_DEADLINE_MS: String(Math.max(MIN_AGENT_BUDGET_MS, REQUEST_BUDGET_MS - ticket.waitedMs))
       }
     });
 
@@ -91,6 +99,55 @@ export async function runDotSparkCore(
       });
     });
 
+    return { result: pythonResult, degraded: ticket.degraded };
+  }, priority);
+}
+
+/**
+ * Run Python DotSpark core logic for advanced cognitive processing
+ */
+export async function runDotSparkCore(
+  userInput: string, 
+  userId: string = 'default', 
+  modelType: 'gpt-5' | 'deepseek' = 'gpt-5',
+  priority: PriorityClass = 'interactive',
+  sessionId?: string
+): Promise<DotSparkResponse> {
+  // Turns of different sessions are never coalesced: each one extends its own session state
+  return coalesce(
+    flightKey(userId, sessionId ? `chat:${sessionId}` : 'chat', modelType, userInput),
+    () => executeDotSparkCore(userInput, userId, modelType, priority, sessionId)
+  );
+}
+
+async function executeDotSparkCore(
+  userInput: string,
+  userId: string,
+  modelType: 'gpt-5' | 'deepseek',
+  priority: PriorityClass,
+  sessionId?: string
+): Promise<DotSparkResponse> {
+  const startTime = Date.now();
+
+  try {
+    // Use enhanced v2 Python intelligence agent with full model specification
+    const pythonArgs = [
+      'dotspark_intelligence_agent_v2.py',
+      'chat',
+      userId,
+      userInput.replace(/"/g, '\\"'),
+      // Optional: lets the agent keep a rolling window + summary of this conversation
+      ...(sessionId ? [sessionId] : [])
+    ];
+
+    // Execute enhanced Python intelligence agent with full environment (admission-controlled)
+    const { result: pythonResult, degraded } = await runPythonAgent(pythonArgs, {
+      MODEL: modelType === 'deepseek' ? 'deepseek-chat' : 'gpt-5',
+      OPENAI_API_KEY: process.env.OPENAI_API_KEY,
+      DEEPSEEK_API_KEY: process.env.DEEPSEEK_API_KEY,
+      PINECONE_API_KEY: process.env.PINECONE_API_KEY
+    }, priority);
+
     const processingTime = Date.now() - startTime;
 
     // Process enhanced v2 response format
@@ -123,6 +180,7 @@ export async function runDotSparkCore(
         timestamp: new Date().toISOString(),
         processingTime,
         userId,
+        degraded,
         enhanced: true,
         intelligenceLayers: pythonResult.intelligence_layers || {},
         contextMetadata: pythonResult.context_metadata || {},
@@ -138,6 +196,8 @@ export async function runDotSparkCore(
     };
 
   } catch (error) {
+    // Shed load: a fallback OpenAI call would only add to the pressure
+    if (error instanceof AdmissionRejectedError) throw error;
     console.error('DotSpark Core processing error:', error);
     
     // Fallback to direct OpenAI call
@@ -152,7 +212,20 @@ export async function runDotSparkCore(
 export async function organizeThoughts(
   userInput: string,
   userId: string = 'default',
-  modelType: 'gpt-5' | 'deepseek' = 'gpt-5'
+  modelType: 'gpt-5' | 'deepseek' = 'gpt-5',
+  priority: PriorityClass = 'standard'
+): Promise<DotSparkResponse> {
+  return coalesce(
+    flightKey(userId, 'organize', modelType, userInput),
+    () => executeOrganizeThoughts(userInput, userId, modelType, priority)
+  );
+}
+
+async function executeOrganizeThoughts(
+  userInput: string,
+  userId: string,
+  modelType: 'gpt-5' | 'deepseek',
+  priority: PriorityClass
 ): Promise<DotSparkResponse> {
   const startTime = Date.now();
 
@@ -164,7 +237,7 @@ import os
 import json
 sys.path.append('${process.cwd()}')
 
-from organize_thoughts_fixed import organize_thoughts
+from organize_thoughts_fixed import organize_thoughts, parse_organized_response
 
 try:
     user_input = """${userInput.replace(/"/g, '\\"')}"""
@@ -173,9 +246,9 @@ try:
     
     response = organize_thoughts(user_input, user_id, model_type)
     
-    # Try to parse as JSON for structured output
-    try:
-        structured_data = json.loads(response)
+    # Parse (repairing malformed/truncated JSON locally) for structured output
+    structured_data = parse_organized_response(response)
+    if "error" not in structured_data:
         result = {
             "success": True,
             "response": "I've organized your thoughts into a structured format.",
@@ -186,8 +259,8 @@ try:
                 "user_id": user_id
             }
         }
-    except:
-        # If not JSON, treat as regular response
+    else:
+        # Nothing recoverable, treat as regular response
         result = {
             "success": True,
             "response": response,
@@ -214,37 +287,8 @@ except Exception as e:
     print(json.dumps(error_result))
 `;
 
-    // Execute Python script
-    const pythonProcess = spawn('python3', ['-c', pythonScript], {
-      cwd: process.cwd(),
-      env: { ...process.env }
-    });
-
-    let pythonOutput = '';
-    let pythonError = '';
-
-    pythonProcess.stdout.on('data', (data) => {
-      pythonOutput += data.toString();
-    });
-
-    pythonProcess.stderr.on('data', (data) => {
-      pythonError += data.toString();
-    });
-
-    const pythonResult = await new Promise<any>((resolve, reject) => {
-      pythonProcess.on('close', (code) => {
-        if (code === 0) {
-          try {
-            const result = JSON.parse(pythonOutput.trim());
-            resolve(result);
-          } catch (parseError) {
-            reject(new Error(`Failed to parse Python output: ${pythonOutput}`));
-          }
-        } else {
-          reject(new Error(`Python process failed with code ${code}: ${pythonError}`));
-        }
-      });
-    });
+    // Execute Python script (admission-controlled)
+    const { result: pythonResult, degraded } = await runPythonAgent(['-c', pythonScript], {}, priority);
 
     const processingTime = Date.now() - startTime;
 
@@ -256,7 +300,8 @@ except Exception as e:
           model: modelType,
           timestamp: new Date().toISOString(),
           processingTime,
-          userId
+          userId,
+          degraded
         }
       };
     } else {
@@ -265,6 +310,7 @@ except Exception as e:
     }
 
   } catch (error) {
+    if (error instanceof AdmissionRejectedError) throw error;
     console.error('Thought organization error:', error);
     
     // Fallback to structured processing
@@ -1,5 +1,6 @@
 import { Request, Response } from 'express';
-import { runDotSparkCore, organizeThoughts } from '../intelligent-dotspark-core';
+import { runDotSparkCore, organizeThoughts, agentFlights } from '../intelligent-dotspark-core';
+import { agentAdmission, AdmissionRejectedError } from '../agent-admission';
 
 interface AuthenticatedRequest extends Request {
   user?: any;
@@ -8,6 +9,18 @@ interface AuthenticatedRequest extends Request {
   };
 }
 
+/**
+ * 503 + Retry-After when the agent admission queue sheds the request
+ */
+function sendAdmissionRejected(res: Response, error: AdmissionRejectedError) {
+  res.set('Retry-After', String(error.retryAfterSeconds));
+  return res.status(503).json({
+    error: 'DotSpark is busy, please retry shortly',
+    reason: error.reason,
+    retryAfter: error.retryAfterSeconds
+  });
+}
+
 /**
  * Advanced DotSpark conversational interface
  * Uses Python backend logic for sophisticated cognitive processing
@@ -29,11 +42,12 @@ export async function advancedDotSparkChat(req: AuthenticatedRequest, res: Respo
     ) || action === 'save_structure';
 
     // Use Python DotSpark core for advanced processing
-    const result = await runDotSparkCore(message, userId, model);
+    const result = await runDotSparkCore(message, userId, model, 'interactive', sessionId);
 
     // If user wants to save and we have structured output, save to database
     let savedItem = null;
-    if (wantsSave && result.structuredOutput && userId !== 'anonymous') {
+    // A coalesced duplicate (double-tap / retry) must not save the same structure twice
+    if (wantsSave && result.structuredOutput && userId !== 'anonymous' && !result.metadata.coalesced) {
       try {
         const { db } = await import('@db');
         const { entries, wheels } = await import('@shared/schema');
@@ -125,6 +139,9 @@ export async function advancedDotSparkChat(req: AuthenticatedRequest, res: Respo
     });
 
   } catch (error) {
+    if (error instanceof AdmissionRejectedError) {
+      return sendAdmissionRejected(res, error);
+    }
     console.error('Advanced DotSpark chat error:', error);
     res.status(500).json({ 
       error: 'Failed to process with advanced DotSpark intelligence',
@@ -165,6 +182,9 @@ export async function organizeUserThoughts(req: AuthenticatedRequest, res: Respo
     });
 
   } catch (error) {
+    if (error instanceof AdmissionRejectedError) {
+      return sendAdmissionRejected(res, error);
+    }
     console.error('Thought organization error:', error);
     res.status(500).json({ 
       error: 'Failed to organize thoughts with DotSpark intelligence',
@@ -189,7 +209,8 @@ export async function multiModelDotSpark(req: AuthenticatedRequest, res: Respons
     // Process with multiple models for comparison
     const results = await Promise.allSettled(
       models.map(async (model: 'gpt-4' | 'deepseek') => {
-        const result = await runDotSparkCore(message, userId, model);
+        // Comparison runs are not a live turn; don't compete with interactive chat
+        const result = await runDotSparkCore(message, userId, model, 'standard');
         return { model, ...result };
       })
     );
@@ -248,6 +269,8 @@ export async function getDotSparkStatus(req: AuthenticatedRequest, res: Response
       version: '2.0.0',
       timestamp: new Date().toISOString(),
       capabilities,
+      admission: agentAdmission.metrics(),
+      singleFlight: agentFlights.metrics(),
       endpoints: {
         chat: '/api/dotspark/chat',
         organize: '/api/dotspark/organize',
@@ -0,0 +1,60 @@
+import crypto from 'crypto';
+
+/**
+ * Single-flight coalescing for agent requests.
+ *
+ * Identical requests (same user, mode, model and normalized input) that arrive
+ * while one is already running share that execution instead of spawning their
+ * own embed/query/LLM/memory-write pipeline. The settled result lingers for
+ * DOTSPARK_SINGLE_FLIGHT_LINGER_MS so a double-tap or webhook retry landing just
+ * after completion is coalesced too.
+ */
+
+const LINGER_MS = parseInt(process.env.DOTSPARK_SINGLE_FLIGHT_LINGER_MS || '1000', 10);
+
+export interface FlightResult<T> {
+  value: T;
+  coalesced: boolean;
+}
+
+export function flightKey(userId: string, mode: string, model: string, input: string): string {
+  const normalized = input.trim().toLowerCase().replace(/\s+/g, ' ');
+  const inputHash = crypto.createHash('sha1').update(normalized).digest('hex');
+  return `${userId}:${mode}:${model}:${inputHash}`;
+}
+
+export class SingleFlight<T> {
+  private flights = new Map<string, Promise<T>>();
+  private counters = { executions: 0, coalesced: 0 };
+
+  async do(key: string, fn: () => Promise<T>): Promise<FlightResult<T>> {
+    const existing = this.flights.get(key);
+    if (existing) {
+      this.counters.coalesced++;
+      return { value: await existing, coalesced: true };
+    }
+
+    this.counters.executions++;
+    const flight = fn();
+    this.flights.set(key, flight);
+    const forget = () => {
+      setTimeout(() => {
+        if (this.flights.get(key) === flight) this.flights.delete(key);
+      }, LINGER_MS);
+    };
+    flight.then(forget, () => {
+      // Failures are not cached beyond the in-flight window
+      if (this.flights.get(key) === flight) this.flights.delete(key);
+    });
+    return { value: await flight, coalesced: false };
+  }
+
+  metrics() {
+    const total = this.counters.executions + this.counters.coalesced;
+    return {
+      ...this.counters,
+      inFlight: this.flights.size,
+      coalesceRate: total ? Number((this.counters.coalesced / total).toFixed(4)) : 0
+    };
+  }
+}
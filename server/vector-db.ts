@@ -3,6 +3,7 @@ import OpenAI from 'openai';
 import { db } from '../db';
 import { vectorEmbeddings, insertVectorEmbeddingSchema } from '@shared/schema';
 import { eq, and } from 'drizzle-orm';
+import { bumpVectorGeneration } from './vector-generation';
 
 // Initialize Pinecone client (only if API key is available)
 let pinecone: Pinecone | null = null;
@@ -156,6 +157,7 @@ export async function storeVectorEmbedding(
     });
 
     await db.insert(vectorEmbeddings).values(embeddingData);
+    bumpVectorGeneration(userId);
 
     console.log(`Stored vector embedding for ${contentType} ${contentId}`);
     return vectorId;
@@ -307,6 +309,7 @@ export async function updateVectorEmbedding(
           updatedAt: new Date()
         })
         .where(eq(vectorEmbeddings.id, existing.id));
+      bumpVectorGeneration(existing.userId);
 
       console.log(`Updated vector embedding for ${contentType} ${contentId}`);
     } else {
@@ -0,0 +1,46 @@
+import fs from 'fs';
+import path from 'path';
+
+// Shared with the Python agents (dotspark_storage.DATA_DIR)
+const DATA_DIR = process.env.DOTSPARK_DATA_DIR || path.join(process.cwd(), '.dotspark');
+
+/**
+ * Invalidate cached retrieval results for a user after their vectors change.
+ * The Python query cache (dotspark_query_cache.py) only serves entries recorded
+ * under the current generation token, so replacing the token is enough.
+ */
+export function bumpVectorGeneration(userId: number | string | undefined): void {
+  if (userId === undefined || userId === null) return;
+
+  try {
+    const directory = path.join(DATA_DIR, 'generations');
+    fs.mkdirSync(directory, { recursive: true });
+    const key = String(userId).replace(/[^A-Za-z0-9_.-]/g, '_') || '_';
+    const target = path.join(directory, `${key}.json`);
+    const tmp = `${target}.${process.pid}.tmp`;
+    // Nanosecond-scale token like Python's time.time_ns(); it only has to change
+    const generation = (BigInt(Date.now()) * BigInt(1000000) + BigInt(Math.floor(Math.random() * 1000000))).toString();
+    fs.writeFileSync(tmp, `{"generation":${generation}}`);
+    fs.renameSync(tmp, target);
+  } catch (error) {
+    console.warn('Failed to bump vector generation:', error);
+  }
+}
+
+/**
+ * Hand a newly saved Dot/Wheel/Chakra vector to the Python agents: the user's next
+ * full turn folds it into their clusters and profile
+ * (dotspark_clustering.drain_new_structures reads and clears this file).
+ */
+export function queueStructureVector(userId: number | string | undefined, vectorId: string): void {
+  if (userId === undefined || userId === null) return;
+
+  try {
+    const directory = path.join(DATA_DIR, 'structures');
+    fs.mkdirSync(directory, { recursive: true });
+    const key = String(userId).replace(/[^A-Za-z0-9_.-]/g, '_') || '_';
+    fs.appendFileSync(path.join(directory, `${key}.pending`), `${vectorId}\n`);
+  } catch (error) {
+    console.warn('Failed to queue structure vector:', error);
+  }
+}
@@ -3,6 +3,7 @@ import OpenAI from 'openai';
 import { db } from "@db";
 import { dots, wheels, chakras, vectorEmbeddings } from "@shared/schema";
 import { eq } from "drizzle-orm";
+import { bumpVectorGeneration, queueStructureVector } from "./vector-generation";
 
 // Initialize OpenAI for embeddings
 const openai = new OpenAI({
@@ -46,6 +47,8 @@ export interface VectorContent {
     timeline?: string;
     sourceType: string;
     captureMode?: string;
+    wheelId?: number;
+    chakraId?: number;
     createdAt: string;
   };
 }
@@ -106,6 +109,9 @@ export async function storeDotInVector(dotId: number, userId: number): Promise<b
       pulse: dot.pulse,
       sourceType: dot.sourceType,
       captureMode: dot.captureMode,
+      // Parent links enable Chakra -> Wheel -> Dot retrieval (Pinecone rejects null metadata)
+      ...(dot.wheelId ? { wheelId: dot.wheelId } : {}),
+      ...(dot.chakraId ? { chakraId: dot.chakraId } : {}),
       createdAt: dot.createdAt.toISOString(),
     };
 
@@ -126,6 +132,8 @@ export async function storeDotInVector(dotId: number, userId: number): Promise<b
       metadata: JSON.stringify(metadata)
     }).onConflictDoNothing();
 
+    bumpVectorGeneration(userId);
+    queueStructureVector(userId, vectorId);
     console.log(`Dot ${dotId} stored in vector database with ID: ${vectorId}`);
     return true;
   } catch (error) {
@@ -172,6 +180,7 @@ export async function storeWheelInVector(wheelId: number, userId: number): Promi
       goals: wheel.goals,
       timeline: wheel.timeline,
       sourceType: wheel.sourceType,
+      ...(wheel.chakraId ? { chakraId: wheel.chakraId } : {}),
       createdAt: wheel.createdAt.toISOString(),
     };
 
@@ -192,6 +201,8 @@ export async function storeWheelInVector(wheelId: number, userId: number): Promi
       metadata: JSON.stringify(metadata)
     }).onConflictDoNothing();
 
+    bumpVectorGeneration(userId);
+    queueStructureVector(userId, vectorId);
     console.log(`Wheel ${wheelId} stored in vector database with ID: ${vectorId}`);
     return true;
   } catch (error) {
@@ -258,6 +269,8 @@ export async function storeChakraInVector(chakraId: number, userId: number): Pro
       metadata: JSON.stringify(metadata)
     }).onConflictDoNothing();
 
+    bumpVectorGeneration(userId);
+    queueStructureVector(userId, vectorId);
     console.log(`Chakra ${chakraId} stored in vector database with ID: ${vectorId}`);
     return true;
   } catch (error) {
@@ -335,6 +348,7 @@ export async function deleteFromVector(contentType: 'dot' | 'wheel' | 'chakra',
     await db.delete(vectorEmbeddings)
       .where(eq(vectorEmbeddings.vectorId, vectorId));
 
+    bumpVectorGeneration(userId);
     console.log(`Deleted ${contentType} ${contentId} from vector database`);
     return true;
   } catch (error) {
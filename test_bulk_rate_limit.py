@@ -0,0 +1,40 @@
+import os
+import time
+
+# Same environment a bulk run sets up before anything reads it
+import dotspark_bulk  # noqa: F401
+import dotspark_storage
+import dotspark_rate_limit as rate_limit
+from dotspark_deadline import Deadline
+
+def test_backlogged_bucket_paces_bulk_work(tmp_path, monkeypatch):
+    """A bulk call behind a drained bucket waits for capacity within its own deadline
+    (the interactive 25s budget would have raised RateLimitTimeout)"""
+    monkeypatch.setattr(dotspark_storage, "DATA_DIR", str(tmp_path))
+    monkeypatch.setattr(rate_limit, "RATE_LIMIT_BURST_SECONDS", 1.0)
+    # 600 TPM over a 1s burst: a 10-token bucket refilling at 10 tokens/s
+    monkeypatch.setenv("DOTSPARK_RATE_LIMIT_OPENAI_GPT_4", "6000,600")
+    rate_limit.acquire("openai", "gpt-4", 10, priority="interactive")
+
+    deadline = Deadline()
+    assert deadline.budget > 25.0
+    started = time.time()
+    waited = rate_limit.acquire("openai", "gpt-4", 4, max_wait=deadline.timeout(), priority="bulk")
+    assert waited > 0.5
+    assert time.time() - started < deadline.budget
+
+def test_backlogged_bucket_times_out_past_max_wait(tmp_path, monkeypatch):
+    monkeypatch.setattr(dotspark_storage, "DATA_DIR", str(tmp_path))
+    monkeypatch.setattr(rate_limit, "RATE_LIMIT_BURST_SECONDS", 1.0)
+    monkeypatch.setenv("DOTSPARK_RATE_LIMIT_OPENAI_GPT_4", "6000,600")
+    rate_limit.acquire("openai", "gpt-4", 10, priority="interactive")
+
+    try:
+        rate_limit.acquire("openai", "gpt-4", 4, max_wait=0.1, priority="bulk")
+    except rate_limit.RateLimitTimeout:
+        return
+    raise AssertionError("a drained bucket admitted a bulk call without waiting")
+
+if __name__ == "__main__":
+    import pytest
+    raise SystemExit(pytest.main([os.path.abspath(__file__), "-q"]))